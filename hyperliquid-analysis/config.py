@@ -22,7 +22,23 @@ DATA_DIR = 'data'
 RAW_DIR = f'{DATA_DIR}/raw'
 PROCESSED_DIR = f'{DATA_DIR}/processed'
 CACHE_DIR = f'{DATA_DIR}/cache'
+ARCHIVE_DIR = f'{DATA_DIR}/archive'  # Parquet snapshot archive
+SNAPSHOT_DB = f'{DATA_DIR}/snapshots.db'  # SQLite users/positions store
+BLOB_DIR = f'{DATA_DIR}/blobs'  # Content-addressed account states
+ADDRESS_REGISTRY = f'{DATA_DIR}/address_registry'  # Address -> int ID table
+USER_REGISTRY_DIR = f'{DATA_DIR}/user_registry'  # Lifetime per-builder user stats
+TIMESERIES_DIR = f'{DATA_DIR}/timeseries'  # Per-coin aggregate history
+FEATURES_DIR = f'{DATA_DIR}/features'  # Per-user x coin x day fill features
+SKETCH_DIR = f'{DATA_DIR}/sketches'  # Per-day mergeable fill sketches
+KNOWN_USERS_DIR = f'{DATA_DIR}/known_users'  # Per-builder known-address Bloom filters
+
+# Write position dumps as LZ4-framed .json.lz4 streams
+COMPRESS_DUMPS = True
 
 # CSV scraping settings
 DAYS_TO_FETCH = 50  # Fetch last 50 days (back to ~Oct 12)
+CSV_DOWNLOAD_WORKERS = 8  # Concurrent day-file downloads
+FILL_CACHE_NEGATIVE_TTL = 6 * 3600  # Seconds before a 404'd day is retried
+KNOWN_USERS_CAPACITY = 100_000  # Initial known-address Bloom filter size (grows as needed)
+CSV_CHUNK_ROWS = 200_000  # Fill rows parsed per chunk
 
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Archive Builder Fills
+Converts builder_fills day files into the partitioned Parquet fill archive
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import config
+from src.csv_scraper import CSVScraper
+from src.fill_archive import FillArchive
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive builder fills as partitioned Parquet')
+    parser.add_argument(
+        'builder',
+        choices=list(config.BUILDERS.keys()),
+        help='Builder name'
+    )
+    parser.add_argument(
+        '--days',
+        type=int,
+        default=config.DAYS_TO_FETCH,
+        help=f'Days to archive when the archive is empty or rebuilt (default: {config.DAYS_TO_FETCH})'
+    )
+    parser.add_argument(
+        '--rebuild',
+        action='store_true',
+        help='Re-archive the last --days even if already archived'
+    )
+
+    args = parser.parse_args()
+
+    archive = FillArchive(args.builder)
+    archived = archive.days(args.builder)
+
+    # Only days after the high-water mark (the last day with no failed day
+    # before it), unless rebuilding; without a mark, the last --days
+    since = archive.high_water_mark(args.builder) if not args.rebuild else None
+
+    scraper = CSVScraper(config.BUILDERS[args.builder], args.builder)
+    scraper.fetch_historical_users(days_back=args.days, since=since, consumers=[archive])
+    archive.flush()
+
+    days = archive.days(args.builder)
+    print(f"\n📦 {args.builder} fill archive: {len(days)} days"
+          + (f" ({days[0]} to {days[-1]}), {len(days) - len(archived):+d} this run" if days else ""))
+    print(f"   {archive.base}")
+
+
+if __name__ == '__main__':
+    main()
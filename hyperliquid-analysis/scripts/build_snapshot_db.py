@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Build Snapshot Database
+Loads existing user lists and position snapshots (JSON/CSV history) into the
+SQLite snapshot database
+"""
+
+import sys
+import csv
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.dump_io import load_dump, open_dump
+from src.snapshot_archive import parse_snapshot_name
+from src.snapshot_db import SnapshotDB
+
+
+def load_users(db, builder_name, users_dir):
+    """Load every <builder>_users_final*.json, oldest first"""
+    total = 0
+    for path in sorted(users_dir.glob(f'{builder_name}_users_final*.json*')):
+        data = load_dump(path)
+        total += db.write_users(builder_name, data.get('users', []))
+        print(f"✅ {builder_name} users: {len(data.get('users', [])):,} from {path.name}")
+    return total
+
+
+def load_positions(db, builder_name, positions_dir):
+    """Load each snapshot, preferring positions_summary_* JSON over CSVs"""
+    snapshots = {}
+    for path in sorted(positions_dir.iterdir()):
+        parsed = parse_snapshot_name(path.name)
+        if parsed is None:
+            continue
+        for prefix, kind in (('positions_summary_', 'summary'), ('users_summary_', 'accounts'), ('positions_detail_', 'positions')):
+            if path.name.startswith(prefix):
+                snapshots.setdefault(parsed, {})[kind] = path
+
+    loaded = 0
+    for (market, date_str), files in sorted(snapshots.items()):
+        if 'summary' in files:
+            counts = db.write_snapshot(builder_name, market, date_str, load_dump(files['summary']).get('users', []))
+        elif 'accounts' in files:
+            with open_dump(files['accounts'], 'rt') as accounts_file:
+                if 'positions' in files:
+                    with open_dump(files['positions'], 'rt') as positions_file:
+                        counts = db.write_snapshot_rows(
+                            builder_name, market, date_str,
+                            csv.DictReader(accounts_file), csv.DictReader(positions_file)
+                        )
+                else:
+                    counts = db.write_snapshot_rows(builder_name, market, date_str, csv.DictReader(accounts_file), [])
+        else:
+            continue
+        loaded += 1
+        print(f"✅ {builder_name} {market} {date_str}: {counts['accounts']:,} accounts, {counts['positions']:,} positions")
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load JSON/CSV history into the snapshot database')
+    parser.add_argument(
+        '--builder',
+        type=str,
+        nargs='+',
+        help='Builders to load (default: every builder under data/processed)'
+    )
+    parser.add_argument(
+        '--db',
+        type=str,
+        help='Database path (default: data/snapshots.db)'
+    )
+
+    args = parser.parse_args()
+
+    processed_dir = Path(__file__).parent.parent / 'data' / 'processed'
+    builders = args.builder or sorted(p.name for p in processed_dir.iterdir() if p.is_dir())
+
+    print("=" * 60)
+    print("BUILD SNAPSHOT DATABASE")
+    print("=" * 60)
+
+    with SnapshotDB(args.db) as db:
+        print(f"Database: {db.db_path}")
+        print()
+        users = 0
+        snapshots = 0
+        for builder_name in builders:
+            users_dir = processed_dir / builder_name / 'source' / 'users'
+            positions_dir = processed_dir / builder_name / 'source' / 'positions'
+            if users_dir.is_dir():
+                users += load_users(db, builder_name, users_dir)
+            if positions_dir.is_dir():
+                snapshots += load_positions(db, builder_name, positions_dir)
+
+    print()
+    print(f"💾 Loaded {users:,} user records and {snapshots} snapshots")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Compare Archived Snapshots
+Historical position comparison between two snapshot dates, read from the
+Parquet archive
+"""
+
+import sys
+import argparse
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.snapshot_archive import SnapshotArchive
+
+
+def snapshot_metrics(accounts, positions):
+    """Headline metrics for one snapshot's account and position rows"""
+    with_positions = accounts[accounts['has_positions']]
+    longs = int((positions['direction'] == 'LONG').sum())
+    shorts = int((positions['direction'] == 'SHORT').sum())
+    return {
+        'users_with_positions': len(with_positions),
+        'total_positions': len(positions),
+        'total_account_value': float(with_positions['account_value'].sum()),
+        'total_position_value': float(positions['position_value'].sum()),
+        'longs': longs,
+        'shorts': shorts,
+        'long_short_ratio': longs / shorts if shorts else float('inf'),
+        'avg_leverage': float(positions['leverage_value'].mean()) if len(positions) else 0,
+        'risk': positions['risk_level'].value_counts().to_dict(),
+        'coins': positions['coin'].value_counts().to_dict(),
+        'addresses': set(with_positions['address'])
+    }
+
+
+def format_change(old, new):
+    change = new - old
+    pct = f" ({change / old * 100:+.1f}%)" if old else ""
+    return f"{change:+,.2f}{pct}" if isinstance(change, float) else f"{change:+,}{pct}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two archived position snapshots')
+    parser.add_argument('builder', type=str, help='Builder name')
+    parser.add_argument('date_from', type=str, help='Earlier snapshot date (YYYYMMDD)')
+    parser.add_argument('date_to', type=str, help='Later snapshot date (YYYYMMDD)')
+    parser.add_argument(
+        '--market',
+        type=str,
+        default='hypercore',
+        help='Market partition (default: hypercore)'
+    )
+    parser.add_argument(
+        '--archive-dir',
+        type=str,
+        help='Archive directory (default: data/archive)'
+    )
+
+    args = parser.parse_args()
+
+    archive = SnapshotArchive(args.archive_dir)
+    dates = [args.date_from, args.date_to]
+
+    start_time = time.time()
+    scope = {'builders': [args.builder], 'dates': dates, 'markets': [args.market]}
+    accounts = archive.read('accounts', columns=['date', 'address', 'has_positions', 'account_value'], **scope)
+    positions = archive.read(
+        'positions',
+        columns=['date', 'coin', 'direction', 'position_value', 'leverage_value', 'risk_level'],
+        **scope
+    )
+
+    metrics = {}
+    for date in dates:
+        if not (accounts['date'] == date).any():
+            print(f"❌ No archived {args.market} snapshot for {args.builder} on {date}")
+            return
+        metrics[date] = snapshot_metrics(accounts[accounts['date'] == date], positions[positions['date'] == date])
+    elapsed_time = time.time() - start_time
+
+    before, after = metrics[args.date_from], metrics[args.date_to]
+
+    print("=" * 60)
+    print(f"{args.builder.upper()} SNAPSHOT COMPARISON: {args.date_from} → {args.date_to}")
+    print("=" * 60)
+    print()
+    for label, key in (
+        ('Users with positions', 'users_with_positions'),
+        ('Total positions', 'total_positions'),
+        ('Total account value', 'total_account_value'),
+        ('Total position value', 'total_position_value'),
+        ('Longs', 'longs'),
+        ('Shorts', 'shorts'),
+        ('Long/short ratio', 'long_short_ratio'),
+        ('Avg leverage', 'avg_leverage')
+    ):
+        old, new = before[key], after[key]
+        if isinstance(old, float):
+            print(f"{label:<24}{old:>16,.2f}{new:>16,.2f}   {format_change(old, new)}")
+        else:
+            print(f"{label:<24}{old:>16,}{new:>16,}   {format_change(old, new)}")
+
+    retained = before['addresses'] & after['addresses']
+    print()
+    print("👥 Retention:")
+    print(f"   Still holding positions: {len(retained):,}")
+    print(f"   No longer holding:       {len(before['addresses'] - retained):,}")
+    print(f"   New with positions:      {len(after['addresses'] - retained):,}")
+
+    print()
+    print("⚠️  Risk levels:")
+    for level in ['CRITICAL', 'HIGH', 'MODERATE', 'LOW', 'UNKNOWN']:
+        old, new = before['risk'].get(level, 0), after['risk'].get(level, 0)
+        print(f"   {level:<10}{old:>8,}{new:>8,}   {new - old:+,}")
+
+    print()
+    print("🪙 Coins with most change:")
+    coins = set(before['coins']) | set(after['coins'])
+    changes = sorted(coins, key=lambda c: abs(after['coins'].get(c, 0) - before['coins'].get(c, 0)), reverse=True)
+    for coin in changes[:10]:
+        old, new = before['coins'].get(coin, 0), after['coins'].get(coin, 0)
+        print(f"   {coin:<14}{old:>8,}{new:>8,}   {new - old:+,}")
+
+    print()
+    print(f"⏱️  Read and compared in {elapsed_time:.2f} seconds")
+
+
+if __name__ == '__main__':
+    main()
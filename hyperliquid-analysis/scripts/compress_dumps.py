@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Compress Position Dumps
+Converts existing positions_raw_*/positions_summary_*/positions_by_category_*
+JSON files to LZ4-framed .json.lz4
+"""
+
+import sys
+import os
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.dump_io import compress_file, dump_path, load_dump
+
+DUMP_PREFIXES = ('positions_raw_', 'positions_summary_', 'positions_by_category_')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compress JSON position dumps to .json.lz4')
+    parser.add_argument(
+        'paths',
+        nargs='*',
+        help='Files or directories to compress (default: data/processed)'
+    )
+    parser.add_argument(
+        '--keep',
+        action='store_true',
+        help='Keep the uncompressed files'
+    )
+
+    args = parser.parse_args()
+
+    roots = [Path(p) for p in args.paths] or [Path(__file__).parent.parent / 'data' / 'processed']
+    files = []
+    for root in roots:
+        if root.is_file():
+            files.append(root)
+        else:
+            files.extend(p for p in sorted(root.rglob('*.json')) if p.name.startswith(DUMP_PREFIXES))
+
+    saved = 0
+    for path in files:
+        target = dump_path(path)
+        compress_file(path, target)
+        # Check the stream round-trips before dropping the original
+        load_dump(target)
+        before, after = path.stat().st_size, target.stat().st_size
+        saved += before - after
+        print(f"✅ {path.name}: {before / 1e6:,.1f} MB → {after / 1e6:,.1f} MB ({before / max(after, 1):.1f}x)")
+        if not args.keep:
+            os.remove(path)
+
+    print()
+    print(f"💾 Compressed {len(files)} files, saved {saved / 1e6:,.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,6 @@ Converts positions_summary JSON files to CSV format
 """
 
 import sys
-import json
 import csv
 import argparse
 from pathlib import Path
@@ -17,6 +16,9 @@ sys.path.append(str(Path(__file__).parent.parent))
 import csv
 from datetime import datetime
 
+from src.catalog import Catalog
+from src.dump_io import atomic_open, dump_stem, load_dump, resolve_dump
+
 
 def export_to_csv(processed_results, output_dir, date_str, builder_name):
     """
@@ -83,7 +85,7 @@ def export_to_csv(processed_results, output_dir, date_str, builder_name):
         fieldnames = ['address', 'fetched_at', 'has_positions', 'num_positions',
                      'account_value', 'total_margin_used', 'total_unrealized_pnl',
                      'total_position_value', 'error']
-        with open(users_csv_file, 'w', newline='') as f:
+        with atomic_open(users_csv_file, 'wt') as f:
             writer = csv.DictWriter(f, fieldnames=fieldnames)
             writer.writeheader()
             writer.writerows(users_data)
@@ -96,7 +98,7 @@ def export_to_csv(processed_results, output_dir, date_str, builder_name):
                      'entry_price', 'liquidation_price', 'position_value',
                      'unrealized_pnl', 'pnl_percent', 'leverage_type', 'leverage_value',
                      'margin_used', 'distance_to_liq_pct', 'distance_to_liq_usd', 'risk_level']
-        with open(positions_csv_file, 'w', newline='') as f:
+        with atomic_open(positions_csv_file, 'wt') as f:
             writer = csv.DictWriter(f, fieldnames=fieldnames)
             writer.writeheader()
             writer.writerows(positions_data)
@@ -113,7 +115,7 @@ def convert_json_to_csv(json_file_path, output_dir=None):
         json_file_path: Path to positions_summary JSON file
         output_dir: Optional output directory (defaults to same directory as JSON file)
     """
-    json_path = Path(json_file_path)
+    json_path = resolve_dump(json_file_path)
     
     if not json_path.exists():
         print(f"❌ File not found: {json_path}")
@@ -121,8 +123,7 @@ def convert_json_to_csv(json_file_path, output_dir=None):
     
     print(f"📂 Loading JSON from: {json_path.name}")
     
-    with open(json_path, 'r') as f:
-        data = json.load(f)
+    data = load_dump(json_path)
     
     # Extract users data
     processed_results = data.get('users', [])
@@ -145,7 +146,7 @@ def convert_json_to_csv(json_file_path, output_dir=None):
     date_str = data.get('fetch_date', '')
     if not date_str:
         # Try to extract from filename
-        filename = json_path.stem
+        filename = dump_stem(json_path)
         if 'hypercore_' in filename:
             parts = filename.split('hypercore_')
             if len(parts) > 1:
@@ -165,6 +166,14 @@ def convert_json_to_csv(json_file_path, output_dir=None):
         processed_results, output_dir, date_str, builder_name
     )
     
+    if builder_name != 'unknown':
+        catalog = Catalog(builder_name)
+        if users_csv_file.exists():
+            catalog.register(users_csv_file, 'users_summary_hypercore', date_str, len(processed_results), parents=[json_path])
+        if positions_csv_file.exists():
+            num_positions = sum(u.get('num_positions', 0) for u in processed_results if u.get('has_positions'))
+            catalog.register(positions_csv_file, 'positions_detail_hypercore', date_str, num_positions, parents=[json_path])
+    
     print()
     print("=" * 60)
     print("CONVERSION COMPLETE")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Diff Position Snapshots
+Emits position change events (opened, closed, increased, reduced, flipped,
+liquidated-suspected, risk-tier changed) between two snapshots plus
+per-coin net flows
+"""
+
+import sys
+import argparse
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.dump_io import dump_stem, write_dump
+from src.snapshot_diff import SnapshotDiff, EVENT_TYPES
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Diff two position snapshots')
+    parser.add_argument(
+        'old_snapshot',
+        type=str,
+        help='Earlier positions_summary_* JSON or positions_detail_* CSV'
+    )
+    parser.add_argument(
+        'new_snapshot',
+        type=str,
+        help='Later positions_summary_* JSON or positions_detail_* CSV'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        help='Events file (default: position_diff_<old>_<new>.ndjson beside the later snapshot)'
+    )
+    parser.add_argument(
+        '--format',
+        choices=['ndjson', 'parquet'],
+        default='ndjson',
+        help='Events file format (default: ndjson)'
+    )
+    parser.add_argument(
+        '--run-size',
+        type=int,
+        default=200_000,
+        help='Positions sorted in memory before spilling to disk (default: 200000)'
+    )
+
+    args = parser.parse_args()
+
+    old_path = Path(args.old_snapshot)
+    new_path = Path(args.new_snapshot)
+    for path in (old_path, new_path):
+        if not path.exists():
+            print(f"❌ File not found: {path}")
+            return
+
+    if args.output:
+        output_path = Path(args.output)
+    else:
+        old_tag = dump_stem(old_path).rsplit('_', 1)[-1]
+        new_tag = dump_stem(new_path).rsplit('_', 1)[-1]
+        extension = 'ndjson' if args.format == 'ndjson' else 'parquet'
+        output_path = new_path.parent / f'position_diff_{old_tag}_{new_tag}.{extension}'
+    flows_path = output_path.with_name(f'{output_path.stem}_flows.json')
+
+    print(f"📂 {old_path.name} → {new_path.name}")
+    start_time = time.time()
+    result = SnapshotDiff(run_size=args.run_size).run(str(old_path), str(new_path), str(output_path), args.format)
+    elapsed_time = time.time() - start_time
+
+    write_dump(flows_path, {
+        'old_snapshot': old_path.name,
+        'new_snapshot': new_path.name,
+        'counts': result['counts'],
+        'coin_flows': result['coin_flows']
+    })
+
+    print(f"✅ Diffed in {elapsed_time:.1f} seconds")
+    print()
+    print("📊 Events:")
+    for kind in EVENT_TYPES:
+        print(f"   {kind:<22}{result['counts'][kind]:>8,}")
+
+    flows = result['coin_flows']
+    if flows:
+        print()
+        print("💸 Largest net notional flows:")
+        ranked = sorted(flows.items(), key=lambda x: abs(x[1]['net_notional_flow']), reverse=True)[:10]
+        for coin, coin_flows in ranked:
+            print(f"   {coin:<14}${coin_flows['net_notional_flow']:>16,.2f}  "
+                  f"(longs ${coin_flows['long_notional_flow']:,.2f}, shorts ${coin_flows['short_notional_flow']:,.2f})")
+
+    print()
+    print(f"💾 Events saved to: {output_path}")
+    print(f"💾 Coin flows saved to: {flows_path}")
+
+
+if __name__ == '__main__':
+    main()
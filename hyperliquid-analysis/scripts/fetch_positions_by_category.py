@@ -7,7 +7,6 @@ Groups results by category for sentiment analysis
 
 import sys
 import csv
-import json
 import argparse
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -19,7 +18,9 @@ from datetime import datetime
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
+import config
 from src.api_client import HyperliquidClient
+from src.dump_io import dump_path, write_dump
 from src.position_processor import PositionProcessor
 
 
@@ -68,7 +69,7 @@ def main():
     parser.add_argument(
         '--output',
         type=str,
-        help='Output JSON file path (default: positions_by_category_YYYYMMDD.json)'
+        help='Output JSON file path (default: positions_by_category_YYYYMMDD.json.lz4)'
     )
     parser.add_argument(
         '--workers',
@@ -188,6 +189,7 @@ def main():
                     'position_value': round(pos['position_value'], 2),
                     'unrealized_pnl': round(pos['unrealized_pnl'], 2),
                     'entry_price': pos['entry_price'],
+                    'liquidation_price': pos['liquidation_price'],
                     'risk_level': pos.get('risk_level', 'UNKNOWN')
                 })
         
@@ -243,11 +245,10 @@ def main():
     else:
         output_dir = Path(__file__).parent.parent / 'data' / 'processed' / 'custom'
         output_dir.mkdir(parents=True, exist_ok=True)
-        output_path = output_dir / f'positions_by_category_{date_str}.json'
+        output_path = dump_path(output_dir / f'positions_by_category_{date_str}.json', config.COMPRESS_DUMPS)
     
     # Save output
-    with open(output_path, 'w') as f:
-        json.dump(output, f, indent=2)
+    write_dump(output_path, output)
     
     # Print summary
     print()
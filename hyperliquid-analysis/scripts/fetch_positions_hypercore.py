@@ -6,7 +6,6 @@ Supports: insilico, basedapp, mirrorly
 """
 
 import sys
-import json
 import csv
 import argparse
 from pathlib import Path
@@ -18,8 +17,16 @@ from datetime import datetime
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
+import config
 from src.api_client import HyperliquidClient
+from src.blob_store import BlobStore, MemoizedPositionProcessor
+from src.catalog import Catalog
+from src.dump_io import dump_path, load_dump, open_dump, write_dump
+from src.json_stream import iter_addresses
 from src.position_processor import PositionProcessor
+from src.parallel_processor import ParallelPositionProcessor
+from src.snapshot_archive import SnapshotArchive
+from src.snapshot_db import SnapshotDB
 
 
 def fetch_hypercore_only(client, address, delay=0.1):
@@ -61,10 +68,36 @@ def main():
         choices=[1, 10, 20],
         help='Number of parallel workers (default: 10)'
     )
+    parser.add_argument(
+        '--process-workers',
+        type=int,
+        default=1,
+        help='Worker processes for processing the raw dump (default: 1, serial; not used with --dedupe)'
+    )
+    parser.add_argument(
+        '--archive',
+        action='store_true',
+        help='Also write the snapshot to the Parquet archive (data/archive)'
+    )
+    parser.add_argument(
+        '--no-db',
+        action='store_true',
+        help='Skip writing the snapshot to the SQLite snapshot database'
+    )
+    parser.add_argument(
+        '--dedupe',
+        action='store_true',
+        help='Store account states in the blob store and write a refs file instead of the raw dump'
+    )
     
     args = parser.parse_args()
     builder_name = args.builder
     
+    if args.dedupe and args.process_workers > 1:
+        # Memoized processing shares one blob store cache, so it runs serially
+        print(f"⚠️  --process-workers {args.process_workers} is ignored with --dedupe; processing serially")
+        args.process_workers = 1
+    
     # Generate date string for filenames
     date_str = datetime.utcnow().strftime('%Y%m%d')
     
@@ -73,6 +106,8 @@ def main():
     print("=" * 60)
     print()
     
+    catalog = Catalog(builder_name)
+    
     # Determine input file
     if args.input_file:
         input_file = Path(args.input_file)
@@ -87,18 +122,19 @@ def main():
                 print(f"❌ Mirrorly CSV not found at expected location")
                 return
         else:
-            # Auto-detect: try active users first, then fall back to final users
-            active_file = Path(__file__).parent.parent / 'data' / 'processed' / builder_name / 'active_users_7days.json'
-            final_file = Path(__file__).parent.parent / 'data' / 'processed' / builder_name / 'source' / 'users' / f'{builder_name}_users_final_*.json'
+            # Auto-detect: latest cataloged active users, then latest final users
+            active_file = catalog.latest('active_users') or catalog.directory / 'active_users_7days.json'
             
             if active_file.exists():
                 input_file = active_file
                 print(f"📂 Using active users file")
             else:
-                # Find most recent final users file
-                final_files = list(Path(__file__).parent.parent / 'data' / 'processed' / builder_name / 'source' / 'users').glob(f'{builder_name}_users_final_*.json')
-                if final_files:
-                    input_file = max(final_files, key=lambda p: p.stat().st_mtime)
+                input_file = catalog.latest('users_final')
+                if input_file is None:
+                    # Users files written before the catalog existed
+                    final_files = list((catalog.directory / 'source' / 'users').glob(f'{builder_name}_users_final_*.json'))
+                    input_file = max(final_files, key=lambda p: p.stat().st_mtime) if final_files else None
+                if input_file is not None:
                     print(f"📂 Using most recent users file: {input_file.name}")
                 else:
                     print(f"❌ No user files found. Please run fetch_users.py first or specify --input-file")
@@ -106,22 +142,18 @@ def main():
     
     print(f"📂 Loading user addresses from: {input_file.name}")
     
-    with open(input_file, 'r') as f:
-        if builder_name == 'mirrorly':
-            # Parse CSV file for Mirrorly
+    if builder_name == 'mirrorly':
+        # Parse CSV file for Mirrorly
+        with open_dump(input_file, 'rt') as f:
             reader = csv.DictReader(f)
             addresses = [row['Address'] for row in reader if row['Address']]
-        else:
-            # Parse JSON for other builders
-            data = json.load(f)
-            # Handle different file structures
-            if 'addresses' in data:
-                addresses = data['addresses']
-            elif 'users' in data:
-                addresses = [user['address'] if isinstance(user, dict) else user for user in data['users']]
-            else:
-                print(f"❌ Invalid file format. Expected 'addresses' or 'users' key.")
-                return
+    else:
+        # Stream addresses from JSON for other builders
+        try:
+            addresses = list(iter_addresses(input_file))
+        except ValueError as e:
+            print(f"❌ {e}")
+            return
     
     print(f"✅ Loaded {len(addresses)} addresses")
     print()
@@ -192,48 +224,61 @@ def main():
     output_dir = Path(__file__).parent.parent / 'data' / 'processed' / builder_name / 'source' / 'positions'
     output_dir.mkdir(parents=True, exist_ok=True)
     
-    # Save raw results
-    raw_output_file = output_dir / f'positions_raw_hypercore_{date_str}.json'
-    print(f"💾 Saving raw data to: {raw_output_file.name}")
+    # Save raw results (with --dedupe, states go to the blob store during processing)
+    if args.dedupe:
+        store = BlobStore()
+        print(f"📦 Account states will be stored in: {store.root}")
+    else:
+        raw_output_file = dump_path(output_dir / f'positions_raw_hypercore_{date_str}.json', config.COMPRESS_DUMPS)
+        print(f"💾 Saving raw data to: {raw_output_file.name}")
     
-    with open(raw_output_file, 'w') as f:
-        json.dump({
+        write_dump(raw_output_file, {
             'fetched_at': raw_results[0]['fetched_at'] if raw_results else None,
             'fetch_date': date_str,
             'total_users': len(raw_results),
             'markets': 'HyperCore only',
             'builder': builder_name,
             'users': raw_results
-        }, f, indent=2)
+        })
     
     print()
     
     # Process positions
     print("📊 Processing position data...")
-    processor = PositionProcessor()
-    
-    processed_results = []
-    users_with_positions = 0
-    total_positions = 0
-    errors = 0
+    processed_output_file = dump_path(output_dir / f'positions_summary_hypercore_{date_str}.json', config.COMPRESS_DUMPS)
     
-    for raw_data in raw_results:
-        processed = processor.process_user_positions(raw_data)
-        processed_results.append(processed)
+    if args.process_workers > 1 and not args.dedupe:
+        # Workers read the saved raw dump directly and write the summary
+        print(f"   Using {args.process_workers} worker processes")
+        parallel = ParallelPositionProcessor(workers=args.process_workers)
+        aggregate = parallel.process_raw_file(str(raw_output_file), str(processed_output_file))['aggregate']
+        users_with_positions = aggregate['users_with_positions']
+        total_positions = aggregate['total_positions']
+        errors = aggregate['errors']
+        print(f"💾 Saved processed data to: {processed_output_file.name}")
+    else:
+        processor = MemoizedPositionProcessor(store) if args.dedupe else PositionProcessor()
         
-        if processed['has_positions']:
-            users_with_positions += 1
-            total_positions += processed['num_positions']
+        processed_results = []
+        users_with_positions = 0
+        total_positions = 0
+        errors = 0
         
-        if processed.get('error'):
-            errors += 1
-    
-    # Save processed results
-    processed_output_file = output_dir / f'positions_summary_hypercore_{date_str}.json'
-    print(f"💾 Saving processed data to: {processed_output_file.name}")
-    
-    with open(processed_output_file, 'w') as f:
-        json.dump({
+        for raw_data in raw_results:
+            processed = processor.process_user_positions(raw_data)
+            processed_results.append(processed)
+        
+            if processed['has_positions']:
+                users_with_positions += 1
+                total_positions += processed['num_positions']
+        
+            if processed.get('error'):
+                errors += 1
+        
+        # Save processed results
+        print(f"💾 Saving processed data to: {processed_output_file.name}")
+        
+        write_dump(processed_output_file, {
             'fetched_at': raw_results[0]['fetched_at'] if raw_results else None,
             'fetch_date': date_str,
             'total_users_queried': len(addresses),
@@ -243,7 +288,38 @@ def main():
             'markets': 'HyperCore only',
             'builder': builder_name,
             'users': processed_results
-        }, f, indent=2)
+        })
+    
+    if args.dedupe:
+        # The snapshot keeps only address -> state hash references
+        raw_output_file = dump_path(output_dir / f'positions_refs_hypercore_{date_str}.json', config.COMPRESS_DUMPS)
+        write_dump(raw_output_file, {
+            'fetched_at': raw_results[0]['fetched_at'] if raw_results else None,
+            'fetch_date': date_str,
+            'total_users': len(raw_results),
+            'markets': 'HyperCore only',
+            'builder': builder_name,
+            'users': processor.refs
+        })
+        print(f"💾 Saved state references to: {raw_output_file.name}")
+        print(f"   States: {store.stats['states_written']:,} new, {store.stats['states_reused']:,} unchanged")
+        print(f"   Processing: {processor.hits:,} memoized, {processor.misses:,} processed")
+    
+    raw_type = 'positions_refs_hypercore' if args.dedupe else 'positions_raw_hypercore'
+    catalog.register(raw_output_file, raw_type, date_str, len(raw_results), parents=[input_file])
+    catalog.register(processed_output_file, 'positions_summary_hypercore', date_str, len(raw_results), parents=[raw_output_file])
+    
+    if (args.archive or not args.no_db) and args.process_workers > 1 and not args.dedupe:
+        processed_results = load_dump(processed_output_file)['users']
+    
+    if args.archive:
+        counts = SnapshotArchive().write_snapshot(builder_name, date_str, 'hypercore', processed_results)
+        print(f"📦 Archived {counts['accounts']:,} accounts, {counts['positions']:,} positions")
+    
+    if not args.no_db:
+        with SnapshotDB() as db:
+            counts = db.write_snapshot(builder_name, 'hypercore', date_str, processed_results)
+        print(f"💾 Wrote {counts['accounts']:,} accounts, {counts['positions']:,} positions to snapshot database")
     
     print()
     print("=" * 60)
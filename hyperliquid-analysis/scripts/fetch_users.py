@@ -16,7 +16,15 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
 from src.referral_scraper import ReferralScraper
 from src.csv_scraper import CSVScraper
+from src.user_registry import UserRegistry
+from src.address_registry import AddressRegistry
+from src.catalog import Catalog
 from src.data_validator import DataValidator
+from src.fill_features import FillFeatures
+from src.fill_sketches import FillSketches
+from src.new_users import NewUserDetector
+from src.snapshot_db import SnapshotDB
+from src.top_k import TopK
 
 
 def main():
@@ -32,6 +40,22 @@ def main():
         default=30,
         help='Days to fetch for CSV method (default: 30)'
     )
+    parser.add_argument(
+        '--csv-workers',
+        type=int,
+        default=config.CSV_DOWNLOAD_WORKERS,
+        help=f'Concurrent CSV day downloads (default: {config.CSV_DOWNLOAD_WORKERS})'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Download every CSV day instead of reusing the local fill cache'
+    )
+    parser.add_argument(
+        '--rebuild-registry',
+        action='store_true',
+        help='Discard the lifetime user registry and rebuild it from the last --days'
+    )
     
     args = parser.parse_args()
     
@@ -77,8 +101,44 @@ def main():
     print("METHOD 2: Historical CSV")
     print("=" * 60)
     
-    csv_scraper = CSVScraper(builder_address, builder_name)
-    csv_users = csv_scraper.fetch_historical_users(days_back=days_to_fetch)
+    csv_scraper = CSVScraper(builder_address, builder_name, workers=args.csv_workers,
+                             use_cache=not args.no_cache)
+    
+    # Only days after the registry's high-water mark are fetched; the first
+    # run (or --rebuild-registry) backfills the last --days
+    user_registry = UserRegistry(builder_name)
+    if args.rebuild_registry:
+        user_registry.reset()
+    # One address registry shared by features, the detector and validation;
+    # each save merges with other writers under the registry lock
+    address_registry = AddressRegistry.default()
+    features = FillFeatures(builder_name, registry=address_registry)
+    sketches = FillSketches(builder_name)
+    # Known addresses start from the registry; a backfill with no history
+    # only seeds them, since every address would look new
+    detector = NewUserDetector(builder_name, registry=address_registry)
+    if not len(detector):
+        detector.seed(user_registry.table.addresses)
+        detector.bootstrapping = user_registry.high_water_mark is None
+    csv_scraper.fetch_historical_users(
+        days_back=days_to_fetch, since=user_registry.high_water_mark,
+        consumers=[user_registry, features, sketches, detector]
+    )
+    features.flush()
+    sketches.flush()
+    detector.save()
+    address_registry.save()
+    user_registry.save()
+    print(f"  📚 User registry: {len(user_registry)} users through {user_registry.high_water_mark}")
+    
+    new_users_file = os.path.join(output_dir, f"{builder_name}_users_new_{date_str}.json")
+    detector.save_new_users(new_users_file)
+    print(f"  🆕 New users: {len(detector.new_users)} "
+          f"({len(detector)} known, {detector.exact_lookups}/{detector.checked} checks confirmed exactly)")
+    
+    # The CSV users file carries lifetime stats from the registry
+    csv_scraper.users_data = user_registry.users()
+    csv_users = list(csv_scraper.users_data.values())
     
     csv_file = os.path.join(output_dir, f"{builder_name}_users_csv_{date_str}.json")
     csv_scraper.save_to_file(csv_file)
@@ -92,7 +152,7 @@ def main():
     print("VALIDATION & MERGE")
     print("=" * 60)
     
-    validator = DataValidator()
+    validator = DataValidator(registry=address_registry)
     
     # Load both datasets
     validator.load_referral_data(referral_file)
@@ -112,6 +172,22 @@ def main():
     report_file = os.path.join(output_dir, f"validation_report_{date_str}.json")
     validator.save_report(report_file)
     
+    # Record the day's artifacts in the builder catalog
+    catalog = Catalog(builder_name)
+    catalog.register(referral_file, 'users_referral', date_str, len(referral_users))
+    catalog.register(csv_file, 'users_csv', date_str, len(csv_users))
+    catalog.register(final_file, 'users_final', date_str, len(merged_users), parents=[referral_file, csv_file])
+    catalog.register(report_file, 'validation_report', date_str, parents=[referral_file, csv_file])
+    catalog.register(new_users_file, 'users_new', date_str, len(detector.new_users))
+    
+    # Persist address IDs assigned during validation
+    validator.registry.save()
+    
+    # Record users in the snapshot database
+    with SnapshotDB() as db:
+        db.write_users(builder_name, merged_users)
+    print(f"💾 Users written to {config.SNAPSHOT_DB}")
+    
     # ========================================
     # SUMMARY
     # ========================================
@@ -131,11 +207,9 @@ def main():
     
     if merged_users:
         # Show top 5 by trade count
-        sorted_users = sorted(
-            [u for u in merged_users if 'total_trades' in u],
-            key=lambda x: x.get('total_trades', 0),
-            reverse=True
-        )
+        sorted_users = TopK(5, key=lambda x: x.get('total_trades', 0)).extend(
+            u for u in merged_users if 'total_trades' in u
+        ).results()
         if sorted_users:
             print(f"\n🏆 Top 5 Most Active Users:")
             for i, user in enumerate(sorted_users[:5], 1):
@@ -147,6 +221,11 @@ def main():
     print(f"  {csv_file}")
     print(f"  {final_file}")
     print(f"  {report_file}")
+    print(f"  {new_users_file}")
+    
+    if detector.new_users:
+        print(f"\n🆕 Fetch positions of the {len(detector.new_users)} new users:")
+        print(f"  python scripts/fetch_positions_hypercore.py {builder_name} --input-file {new_users_file}")
     
     print(f"\n✅ Done! {builder_name} user extraction complete.")
 
@@ -3,20 +3,32 @@
 Filter BasedApp users by activity recency
 Shows distribution of users by last trade date
 """
-import json
+import sys
 from datetime import datetime, timedelta
 from collections import Counter
+from pathlib import Path
 
-# Load BasedApp users
-with open('data/processed/basedapp/basedapp_users_final.json', 'r') as f:
-    data = json.load(f)
+sys.path.append(str(Path(__file__).parent.parent))
 
-users = data['users']
-print(f"Total users: {len(users)}")
+from src.catalog import Catalog
+from src.dump_io import write_dump
+from src.json_stream import iter_users
+
+catalog = Catalog('basedapp')
+
+# Stream the latest BasedApp users file, keeping only the fields used here
+users_file = catalog.latest('users_final') or 'data/processed/basedapp/basedapp_users_final.json'
+total_users = 0
+csv_users = []
+for u in iter_users(users_file, fields=('address', 'last_trade_date')):
+    total_users += 1
+    # Users with CSV data (have last_trade_date)
+    if 'last_trade_date' in u:
+        csv_users.append(u)
+
+print(f"Total users: {total_users}")
 print()
 
-# Filter users with CSV data (have last_trade_date)
-csv_users = [u for u in users if 'last_trade_date' in u]
 print(f"Users with trade history: {len(csv_users)}")
 print()
 
@@ -47,7 +59,7 @@ print("Active User Counts by Time Window:")
 print("-" * 50)
 for days in [1, 3, 7, 14, 30]:
     active = filter_by_days(csv_users, days)
-    pct = len(active) / len(users) * 100
+    pct = len(active) / total_users * 100
     print(f"Last {days:2d} days: {len(active):5d} users ({pct:5.1f}% of total)")
 
 print()
@@ -57,19 +69,19 @@ recommended_days = 7
 active_users = filter_by_days(csv_users, recommended_days)
 print(f"✅ Recommended: Filter for last {recommended_days} days")
 print(f"   Active users: {len(active_users)}")
-print(f"   Reduction: {len(users) - len(active_users)} users ({(1 - len(active_users)/len(users))*100:.1f}% reduction)")
+print(f"   Reduction: {total_users - len(active_users)} users ({(1 - len(active_users)/total_users)*100:.1f}% reduction)")
 print()
 
 # Save filtered addresses
-output_file = 'data/processed/basedapp/active_users_7days.json'
+output_file = catalog.directory / 'active_users_7days.json'
 active_addresses = [u['address'] for u in active_users]
 
-with open(output_file, 'w') as f:
-    json.dump({
-        'filtered_at': datetime.now().isoformat(),
-        'filter_criteria': f'last_trade_date >= {recommended_days} days ago',
-        'total_active_users': len(active_addresses),
-        'addresses': active_addresses
-    }, f, indent=2)
+write_dump(output_file, {
+    'filtered_at': datetime.now().isoformat(),
+    'filter_criteria': f'last_trade_date >= {recommended_days} days ago',
+    'total_active_users': len(active_addresses),
+    'addresses': active_addresses
+})
+catalog.register(output_file, 'active_users', datetime.now().strftime("%Y%m%d"), len(active_addresses), parents=[users_file])
 
 print(f"💾 Saved active user addresses to: {output_file}")
@@ -5,7 +5,6 @@ Processes positions_summary_hypercore JSON and generates webapp-ready summary
 """
 
 import sys
-import json
 import argparse
 from pathlib import Path
 from datetime import datetime
@@ -14,6 +13,13 @@ from collections import defaultdict
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
+from src.catalog import Catalog
+from src.coin_series import CoinSeries, snapshot_timestamp
+from src.dump_io import load_dump, resolve_dump, write_dump
+from src.liquidation_index import LiquidationIndex
+from src.snapshot_archive import parse_snapshot_name
+from src.top_k import TopK
+
 
 def generate_summary(json_file_path, output_path=None):
     """
@@ -23,7 +29,7 @@ def generate_summary(json_file_path, output_path=None):
         json_file_path: Path to positions_summary_hypercore JSON file
         output_path: Optional output path (defaults to app/data/basedapp_positions_summary.json)
     """
-    json_path = Path(json_file_path)
+    json_path = resolve_dump(json_file_path)
     
     if not json_path.exists():
         print(f"❌ File not found: {json_path}")
@@ -31,8 +37,7 @@ def generate_summary(json_file_path, output_path=None):
     
     print(f"📂 Loading JSON from: {json_path.name}")
     
-    with open(json_path, 'r') as f:
-        data = json.load(f)
+    data = load_dump(json_path)
     
     users = data.get('users', [])
     fetch_date = data.get('fetch_date', '')
@@ -51,6 +56,8 @@ def generate_summary(json_file_path, output_path=None):
         'total_value': 0,
         'longs': 0,
         'shorts': 0,
+        'longs_value': 0,
+        'shorts_value': 0,
         'longs_total_size': 0,
         'shorts_total_size': 0,
         'longs_unrealized_pnl': 0,
@@ -62,8 +69,8 @@ def generate_summary(json_file_path, output_path=None):
     # Risk distribution
     risk_distribution = defaultdict(int)
     
-    # Collect all positions for top positions
-    all_positions = []
+    # Track the largest positions without keeping every position
+    top_positions = TopK(50, key=lambda x: abs(x['position_value']))
     
     for user in users:
         if not user.get('has_positions', False):
@@ -86,18 +93,20 @@ def generate_summary(json_file_path, output_path=None):
             
             if direction == 'LONG':
                 coin_stats[coin]['longs'] += 1
+                coin_stats[coin]['longs_value'] += position_value
                 coin_stats[coin]['longs_total_size'] += position_size
                 coin_stats[coin]['longs_unrealized_pnl'] += unrealized_pnl
             elif direction == 'SHORT':
                 coin_stats[coin]['shorts'] += 1
+                coin_stats[coin]['shorts_value'] += position_value
                 coin_stats[coin]['shorts_total_size'] += position_size
                 coin_stats[coin]['shorts_unrealized_pnl'] += unrealized_pnl
             
             # Risk distribution
             risk_distribution[risk_level] += 1
             
-            # Collect for top positions
-            all_positions.append({
+            # Offer to top positions
+            top_positions.push({
                 'user_address': user['address'],
                 'coin': coin,
                 'direction': direction,
@@ -109,6 +118,9 @@ def generate_summary(json_file_path, output_path=None):
                 'margin_used': margin_used
             })
     
+    # Liquidation levels per coin (cached beside the snapshot)
+    liquidation_index = LiquidationIndex.for_snapshot(str(json_path), users)
+    
     # Calculate long/short ratios
     by_coin = []
     for coin, stats in sorted(coin_stats.items(), key=lambda x: x[1]['total_value'], reverse=True):
@@ -136,22 +148,16 @@ def generate_summary(json_file_path, output_path=None):
             'longs_unrealized_pnl': round(stats['longs_unrealized_pnl'], 2),
             'shorts_unrealized_pnl': round(stats['shorts_unrealized_pnl'], 2),
             'total_unrealized_pnl': round(stats['total_unrealized_pnl'], 2),
-            'total_margin_used': round(stats['total_margin_used'], 2)
+            'total_margin_used': round(stats['total_margin_used'], 2),
+            'liquidation_ladder': liquidation_index.book(coin).ladder() if liquidation_index.book(coin) else None
         })
     
     # Calculate total position value
     total_position_value = sum(coin['total_value'] for coin in by_coin)
     
-    # Top positions (by position value)
-    top_positions = sorted(
-        all_positions,
-        key=lambda x: abs(x['position_value']),
-        reverse=True
-    )[:50]  # Top 50
-    
-    # Format top positions
+    # Format top positions (top 50 by position value)
     formatted_top_positions = []
-    for pos in top_positions:
+    for pos in top_positions.results():
         formatted_top_positions.append({
             'user_address': pos['user_address'],
             'coin': pos['coin'],
@@ -193,8 +199,15 @@ def generate_summary(json_file_path, output_path=None):
     output_file.parent.mkdir(parents=True, exist_ok=True)
     
     # Write output
-    with open(output_file, 'w') as f:
-        json.dump(summary_data, f, indent=2)
+    write_dump(output_file, summary_data)
+    Catalog('basedapp').register(output_file, 'webapp_summary', fetch_date or None, total_users, parents=[json_path])
+    
+    # Keep this snapshot's per-coin aggregates for trend charts
+    if fetched_at or fetch_date:
+        market = (parse_snapshot_name(json_path.name) or ('hypercore', None))[0]
+        appended = CoinSeries('basedapp', market).append(snapshot_timestamp(fetched_at, fetch_date), coin_stats)
+        if appended:
+            print(f"📈 Appended {appended} coin aggregates to the {market} time series")
     
     print(f"✅ Summary generated successfully!")
     print(f"📁 Output: {output_file}")
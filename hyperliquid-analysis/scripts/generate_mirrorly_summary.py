@@ -5,7 +5,6 @@ Merges CSV trader metadata with current position data
 """
 
 import sys
-import json
 import csv
 import argparse
 from pathlib import Path
@@ -15,6 +14,14 @@ from collections import defaultdict
 # Add parent directory to path
 sys.path.append(str(Path(__file__).parent.parent))
 
+from src.address_registry import AddressRegistry
+from src.catalog import Catalog
+from src.coin_series import CoinSeries, coin_aggregates, snapshot_timestamp
+from src.dump_io import load_dump, resolve_dump, write_dump
+from src.liquidation_index import LiquidationIndex
+from src.snapshot_archive import parse_snapshot_name
+from src.top_k import TopK
+
 
 def parse_categories(category_string):
     """Parse comma-separated category string into list"""
@@ -75,7 +82,7 @@ def generate_summary(csv_file_path, positions_json_path, output_path=None):
         output_path: Optional output path
     """
     csv_path = Path(csv_file_path)
-    json_path = Path(positions_json_path)
+    json_path = resolve_dump(positions_json_path)
     
     if not csv_path.exists():
         print(f"❌ CSV file not found: {csv_path}")
@@ -89,27 +96,28 @@ def generate_summary(csv_file_path, positions_json_path, output_path=None):
     print(f"📂 Loading positions from: {json_path.name}")
     print()
     
-    # Load CSV trader metadata
-    traders_by_address = {}
+    # Load CSV trader metadata, keyed by address ID
     with open(csv_path, 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            address = row['Address'].lower()
-            traders_by_address[address] = {
-                'name': row['Name'],
-                'address': row['Address'],  # Keep original case
-                'categories': parse_categories(row['Category']),
-                'win_rate': parse_number(row['Win Rate']),
-                'wins': int(row['Win']) if row['Win'] else None,
-                'losses': int(row['Loss']) if row['Loss'] else None,
-                'total_profit': parse_number(row['Total Profit'])
-            }
+        rows = list(csv.DictReader(f))
+    
+    # Private in-memory registry: building a summary must not grow the shared one
+    registry = AddressRegistry()
+    traders_by_address = {}
+    for address_id, row in zip(registry.ids([row['Address'] for row in rows]).tolist(), rows):
+        traders_by_address[address_id] = {
+            'name': row['Name'],
+            'address': row['Address'],  # Keep original case
+            'categories': parse_categories(row['Category']),
+            'win_rate': parse_number(row['Win Rate']),
+            'wins': int(row['Win']) if row['Win'] else None,
+            'losses': int(row['Loss']) if row['Loss'] else None,
+            'total_profit': parse_number(row['Total Profit'])
+        }
     
     print(f"✅ Loaded {len(traders_by_address)} traders from CSV")
     
     # Load position data
-    with open(json_path, 'r') as f:
-        positions_data = json.load(f)
+    positions_data = load_dump(json_path)
     
     fetch_date = positions_data.get('fetch_date', '')
     fetched_at = positions_data.get('fetched_at', '')
@@ -118,18 +126,18 @@ def generate_summary(csv_file_path, positions_json_path, output_path=None):
     print(f"✅ Loaded position data for {len(users)} addresses")
     print()
     
+    user_ids = registry.lookup_many([user['address'] for user in users]).tolist()
+    
     # Merge data
     merged_traders = []
     category_counts = defaultdict(int)
     
-    for user in users:
-        address = user['address'].lower()
-        
-        if address not in traders_by_address:
+    for address_id, user in zip(user_ids, users):
+        if address_id not in traders_by_address:
             print(f"⚠️  Warning: Address {user['address']} not found in CSV")
             continue
         
-        trader = traders_by_address[address].copy()
+        trader = traders_by_address[address_id].copy()
         
         # Add position data
         trader['has_positions'] = user.get('has_positions', False)
@@ -143,16 +151,12 @@ def generate_summary(csv_file_path, positions_json_path, output_path=None):
         unrealized_pnl = 0
         top_coins = []
         if trader['has_positions']:
-            positions = user.get('positions', [])
-            for pos in positions:
+            # Sum PnL and track top 3 coins by position value in one pass
+            top_positions = TopK(3, key=lambda p: abs(p.get('position_value', 0)))
+            for pos in user.get('positions', []):
                 unrealized_pnl += pos.get('unrealized_pnl', 0)
-            # Get top 3 coins by position value
-            sorted_positions = sorted(
-                positions,
-                key=lambda p: abs(p.get('position_value', 0)),
-                reverse=True
-            )
-            top_coins = [p['coin'] for p in sorted_positions[:3]]
+                top_positions.push(pos)
+            top_coins = [p['coin'] for p in top_positions.results()]
         
         trader['unrealized_pnl'] = unrealized_pnl
         trader['top_coins'] = top_coins
@@ -181,6 +185,13 @@ def generate_summary(csv_file_path, positions_json_path, output_path=None):
         'avoid': [t for t in merged_traders if t['performance_tier'] == 'avoid']
     }
     
+    # Liquidation levels per coin across all tracked traders
+    liquidation_index = LiquidationIndex.for_snapshot(str(json_path), users)
+    liquidation_ladder = {
+        coin: book.ladder()
+        for coin, book in sorted(liquidation_index.books.items())
+    }
+    
     # Sort traders by total profit (descending, nulls last)
     def sort_key(trader):
         profit = trader.get('total_profit')
@@ -202,6 +213,7 @@ def generate_summary(csv_file_path, positions_json_path, output_path=None):
             'category_counts': dict(sorted(category_counts.items(), key=lambda x: x[1], reverse=True))
         },
         'traders': merged_traders,
+        'liquidation_ladder': liquidation_ladder,
         'by_performance_tier': {
             'strong': sorted(by_performance_tier['strong'], key=sort_key, reverse=True),
             'watch': sorted(by_performance_tier['watch'], key=sort_key, reverse=True),
@@ -220,8 +232,15 @@ def generate_summary(csv_file_path, positions_json_path, output_path=None):
     output_file.parent.mkdir(parents=True, exist_ok=True)
     
     # Write output
-    with open(output_file, 'w') as f:
-        json.dump(summary_data, f, indent=2)
+    write_dump(output_file, summary_data)
+    Catalog('mirrorly').register(output_file, 'webapp_summary', fetch_date or None, total_traders, parents=[csv_path, json_path])
+    
+    # Keep this snapshot's per-coin aggregates for trend charts
+    if fetched_at or fetch_date:
+        market = (parse_snapshot_name(json_path.name) or ('hypercore', None))[0]
+        appended = CoinSeries('mirrorly', market).append(snapshot_timestamp(fetched_at, fetch_date), coin_aggregates(users))
+        if appended:
+            print(f"📈 Appended {appended} coin aggregates to the {market} time series")
     
     print(f"✅ Summary generated successfully!")
     print(f"📁 Output: {output_file}")
@@ -252,8 +271,7 @@ def main():
     parser.add_argument(
         '--positions',
         type=str,
-        default='hyperliquid-analysis/data/processed/mirrorly/source/positions/positions_summary_hypercore_20260209.json',
-        help='Path to positions summary JSON'
+        help='Path to positions summary JSON (default: latest mirrorly snapshot)'
     )
     parser.add_argument(
         '--output',
@@ -263,7 +281,20 @@ def main():
     
     args = parser.parse_args()
     
-    generate_summary(args.csv, args.positions, args.output)
+    positions = args.positions
+    if positions is None:
+        catalog = Catalog('mirrorly')
+        positions = catalog.latest('positions_summary_hypercore')
+        if positions is None:
+            # Snapshots written before the catalog existed (dated names sort by date)
+            summaries = sorted((catalog.directory / 'source' / 'positions').glob('positions_summary_hypercore_*.json*'))
+            positions = summaries[-1] if summaries else None
+        if positions is None:
+            print("❌ No mirrorly positions_summary_hypercore snapshot found")
+            print("   Fetch one with: python scripts/fetch_positions_hypercore.py mirrorly, or pass --positions")
+            return
+    
+    generate_summary(args.csv, positions, args.output)
 
 
 if __name__ == '__main__':
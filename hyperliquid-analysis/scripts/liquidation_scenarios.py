@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Liquidation Scenarios
+Answers "what gets liquidated if COIN trades at X?" from a snapshot's
+liquidation index
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.liquidation_index import LiquidationIndex
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query liquidation levels for a position snapshot')
+    parser.add_argument(
+        'json_file',
+        type=str,
+        help='Path to positions_summary JSON file'
+    )
+    parser.add_argument(
+        'coin',
+        type=str,
+        help='Coin to query (e.g. ETH)'
+    )
+    parser.add_argument(
+        '--price',
+        type=float,
+        nargs='+',
+        help='Price(s) to shock the coin to from mark'
+    )
+    parser.add_argument(
+        '--range',
+        type=float,
+        nargs=2,
+        metavar=('LOW', 'HIGH'),
+        help='Report positions with liquidation price between LOW and HIGH'
+    )
+    parser.add_argument(
+        '--nearest',
+        type=int,
+        default=10,
+        help='Number of nearest liquidation levels to mark to list (default: 10)'
+    )
+
+    args = parser.parse_args()
+
+    json_path = Path(args.json_file)
+    if not json_path.exists():
+        print(f"❌ File not found: {json_path}")
+        return
+
+    index = LiquidationIndex.for_snapshot(str(json_path))
+    book = index.book(args.coin)
+    if book is None:
+        print(f"❌ No positions with a liquidation price for {args.coin}")
+        return
+
+    print(f"📊 {args.coin}: {len(book.long_prices):,} longs / {len(book.short_prices):,} shorts with liquidation prices")
+    print(f"   Mark price: {book.mark_price:,.4f}")
+    print()
+
+    for price in args.price or []:
+        hit = book.liquidated_at(price)
+        move = (price / book.mark_price - 1) * 100
+        print(f"💥 At {price:,.4f} ({move:+.1f}%): {hit['positions']:,} {hit['direction'].lower()}s, ${hit['notional']:,.2f} liquidated")
+
+    if args.range:
+        hit = book.liquidated_between(*args.range)
+        print(f"📏 Liquidation price in [{hit['low']:,.4f}, {hit['high']:,.4f}]:")
+        print(f"   Longs:  {hit['longs']:,} (${hit['long_notional']:,.2f})")
+        print(f"   Shorts: {hit['shorts']:,} (${hit['short_notional']:,.2f})")
+
+    if args.nearest:
+        print()
+        print(f"🎯 Nearest {args.nearest} liquidation levels to mark:")
+        for level in index.nearest_levels(args.coin, args.nearest):
+            print(f"   {level['liquidation_price']:>14,.4f}  {level['direction']:<5}  "
+                  f"${level['position_value']:>14,.2f}  {level['distance_pct']:>6.2f}%  {level['address']}")
+    print()
+
+
+if __name__ == '__main__':
+    main()
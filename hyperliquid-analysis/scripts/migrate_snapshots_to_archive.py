@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Migrate Snapshots to Parquet Archive
+Copies positions_summary_* JSON and users_summary_*/positions_detail_* CSV
+history into the partitioned snapshot archive
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.dump_io import is_compressed, load_dump
+from src.snapshot_archive import SnapshotArchive, parse_snapshot_name
+
+
+def _compression(path):
+    return {'method': 'lz4'} if is_compressed(path) else None
+
+
+def find_snapshots(positions_dir):
+    """
+    Group a builder's snapshot files by (market, date)
+
+    Returns:
+        Dict of (market, date) -> {'summary', 'accounts', 'positions'} paths
+    """
+    snapshots = {}
+    for path in sorted(positions_dir.iterdir()):
+        parsed = parse_snapshot_name(path.name)
+        if parsed is None:
+            continue
+        if path.name.startswith('positions_summary_'):
+            kind = 'summary'
+        elif path.name.startswith('users_summary_'):
+            kind = 'accounts'
+        elif path.name.startswith('positions_detail_'):
+            kind = 'positions'
+        else:
+            continue
+        snapshots.setdefault(parsed, {})[kind] = path
+    return snapshots
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate JSON/CSV position history into the Parquet archive')
+    parser.add_argument(
+        '--builder',
+        type=str,
+        nargs='+',
+        help='Builders to migrate (default: every builder under data/processed)'
+    )
+    parser.add_argument(
+        '--archive-dir',
+        type=str,
+        help='Archive directory (default: data/archive)'
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Re-archive snapshots that are already in the archive'
+    )
+
+    args = parser.parse_args()
+
+    processed_dir = Path(__file__).parent.parent / 'data' / 'processed'
+    archive = SnapshotArchive(args.archive_dir)
+
+    builders = args.builder or sorted(p.name for p in processed_dir.iterdir() if p.is_dir())
+
+    print("=" * 60)
+    print("MIGRATE SNAPSHOTS TO ARCHIVE")
+    print("=" * 60)
+    print(f"Archive: {archive.root}")
+    print()
+
+    migrated = 0
+    skipped = 0
+    for builder_name in builders:
+        positions_dir = processed_dir / builder_name / 'source' / 'positions'
+        if not positions_dir.is_dir():
+            continue
+
+        for (market, date_str), files in sorted(find_snapshots(positions_dir).items()):
+            if not args.force and archive.has_partition('accounts', builder_name, date_str, market):
+                skipped += 1
+                continue
+
+            if 'summary' in files:
+                # The JSON summary is the complete record; prefer it over CSVs
+                data = load_dump(files['summary'])
+                counts = archive.write_snapshot(builder_name, date_str, market, data.get('users', []))
+                source = files['summary'].name
+            elif 'accounts' in files:
+                accounts = pd.read_csv(files['accounts'], dtype=str, keep_default_na=False, compression=_compression(files['accounts']))
+                positions = pd.read_csv(files['positions'], dtype=str, keep_default_na=False, compression=_compression(files['positions'])) if 'positions' in files else None
+                counts = archive.write_frames(builder_name, date_str, market, accounts, positions)
+                source = ', '.join(files[k].name for k in ('accounts', 'positions') if k in files)
+            else:
+                print(f"⚠️  {builder_name} {market} {date_str}: positions CSV without users CSV, skipping")
+                continue
+
+            migrated += 1
+            print(f"✅ {builder_name} {market} {date_str}: {counts.get('accounts', 0):,} accounts, "
+                  f"{counts.get('positions', 0):,} positions ({source})")
+
+    print()
+    print(f"📦 Migrated {migrated} snapshots ({skipped} already archived)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Process Raw Position Dumps
+Re-processes a saved positions_raw_* file into a positions_summary_* file
+using worker processes (positions_refs_* files are expanded from the blob store)
+"""
+
+import sys
+import argparse
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.blob_store import BlobStore, MemoizedPositionProcessor
+from src.catalog import Catalog
+from src.dump_io import load_dump, write_dump
+from src.parallel_processor import ChunkAggregate, ParallelPositionProcessor
+from src.snapshot_archive import parse_snapshot_name
+from src.snapshot_db import SnapshotDB
+
+
+def process_refs_file(refs_path: Path, output_path: Path) -> dict:
+    """Process a positions_refs_* file serially, reusing memoized results"""
+    refs_data = load_dump(refs_path)
+    processor = MemoizedPositionProcessor(BlobStore())
+    aggregate = ChunkAggregate()
+    processed_results = []
+    for ref in refs_data['users']:
+        processed = processor.process_ref(ref)
+        aggregate.add(processed)
+        processed_results.append(processed)
+
+    header = {k: v for k, v in refs_data.items() if k != 'users'}
+    write_dump(output_path, {
+        'fetched_at': header.get('fetched_at'),
+        'fetch_date': header.get('fetch_date'),
+        'total_users_queried': aggregate.users,
+        'users_with_positions': aggregate.users_with_positions,
+        'total_positions': aggregate.total_positions,
+        'errors': aggregate.errors,
+        'markets': header.get('markets'),
+        'builder': header.get('builder'),
+        'users': processed_results
+    })
+    print(f"   {processor.hits:,} memoized, {processor.misses:,} processed")
+
+    return {
+        'header': header,
+        'aggregate': aggregate.to_dict(),
+        'output_path': str(output_path)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Process a raw position dump in parallel')
+    parser.add_argument(
+        'raw_file',
+        type=str,
+        help='Path to positions_raw_* or positions_refs_* JSON (or .json.lz4) file'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Worker processes (default: CPU count)'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        help='Output JSON path (default: positions_summary_* beside the raw file)'
+    )
+    parser.add_argument(
+        '--no-db',
+        action='store_true',
+        help='Skip writing the snapshot to the SQLite snapshot database'
+    )
+
+    args = parser.parse_args()
+
+    raw_path = Path(args.raw_file)
+    if not raw_path.exists():
+        print(f"❌ File not found: {raw_path}")
+        return
+
+    if args.output:
+        output_path = Path(args.output)
+    else:
+        output_path = raw_path.with_name(
+            raw_path.name.replace('positions_raw_', 'positions_summary_', 1).replace('positions_refs_', 'positions_summary_', 1)
+        )
+        if output_path == raw_path:
+            output_path = raw_path.with_name(f'{raw_path.stem}_summary.json')
+
+    start_time = time.time()
+    if raw_path.name.startswith('positions_refs_'):
+        print(f"📂 Processing: {raw_path.name} (from blob store)")
+        result = process_refs_file(raw_path, output_path)
+    else:
+        processor = ParallelPositionProcessor(workers=args.workers)
+        print(f"📂 Processing: {raw_path.name} ({processor.workers} workers)")
+        result = processor.process_raw_file(str(raw_path), str(output_path))
+    elapsed_time = time.time() - start_time
+
+    aggregate = result['aggregate']
+    print(f"✅ Processed in {elapsed_time:.1f} seconds")
+    print()
+    print(f"Total users:             {aggregate['users']:,}")
+    print(f"Users with positions:    {aggregate['users_with_positions']:,}")
+    print(f"Total positions:         {aggregate['total_positions']:,}")
+    print(f"Errors:                  {aggregate['errors']}")
+
+    if aggregate['risk_distribution']:
+        print()
+        print("⚠️  Risk distribution:")
+        for level, count in sorted(aggregate['risk_distribution'].items()):
+            print(f"   {level}: {count:,}")
+
+    if aggregate['by_coin']:
+        print()
+        print("📊 Top coins by position count:")
+        top_coins = sorted(aggregate['by_coin'].items(), key=lambda x: x[1]['count'], reverse=True)[:10]
+        for coin, stats in top_coins:
+            print(f"   {coin}: {stats['count']:,} positions, ${stats['total_value']:,.2f}")
+
+    print()
+    print(f"💾 Saved processed data to: {output_path}")
+
+    header = result['header']
+    parsed = parse_snapshot_name(raw_path.name)
+    if header.get('builder') and parsed:
+        market, date_str = parsed
+        Catalog(header['builder']).register(
+            output_path, f'positions_summary_{market}', header.get('fetch_date') or date_str,
+            aggregate['users'], parents=[raw_path]
+        )
+    
+    if not args.no_db and header.get('builder') and parsed:
+        market, date_str = parsed
+        processed_results = load_dump(output_path)['users']
+        with SnapshotDB() as db:
+            counts = db.write_snapshot(header['builder'], market, header.get('fetch_date') or date_str, processed_results)
+        print(f"💾 Wrote {counts['accounts']:,} accounts, {counts['positions']:,} positions to snapshot database")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Query As-Of State
+Shows what addresses (or a whole builder book) held at a past moment, from
+the SQLite snapshot database
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.asof_index import AsOfIndex, book_as_of
+from src.dump_io import write_dump
+from src.json_stream import iter_addresses
+from src.snapshot_db import SnapshotDB
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Look up account and position state as of a time')
+    parser.add_argument(
+        'addresses',
+        nargs='*',
+        help='Addresses to look up'
+    )
+    parser.add_argument(
+        '--at',
+        type=str,
+        required=True,
+        help='Point in time: YYYYMMDD (end of day), ISO timestamp or epoch seconds'
+    )
+    parser.add_argument(
+        '--addresses-file',
+        type=str,
+        help="JSON file with 'addresses' or 'users' to look up in one batch"
+    )
+    parser.add_argument(
+        '--builder',
+        type=str,
+        help='Only consider this builder'
+    )
+    parser.add_argument(
+        '--market',
+        choices=['hypercore', 'hip3'],
+        help='Only consider this market'
+    )
+    parser.add_argument(
+        '--book',
+        action='store_true',
+        help='Show the full book of --builder/--market instead of addresses'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        help='Write the full result as JSON'
+    )
+
+    args = parser.parse_args()
+    at = args.at
+
+    with SnapshotDB() as db:
+        if args.book:
+            if not args.builder or not args.market:
+                print("❌ --book needs --builder and --market")
+                return
+            book = book_as_of(db, args.builder, args.market, at)
+            if book['snapshot_date'] is None:
+                print(f"❌ No {args.builder} {args.market} snapshot at or before {args.at}")
+                return
+            print(f"📘 {args.builder} {args.market} as of {args.at}: snapshot {book['snapshot_date']}, "
+                  f"{len(book['positions']):,} positions")
+            if args.output:
+                write_dump(args.output, book)
+                print(f"💾 Saved to {args.output}")
+            return
+
+        addresses = list(args.addresses)
+        if args.addresses_file:
+            addresses.extend(iter_addresses(args.addresses_file))
+        if not addresses:
+            print("❌ Give addresses, --addresses-file or --book")
+            return
+
+        index = AsOfIndex(db, args.builder, args.market)
+        states = index.as_of_many(addresses, at)
+
+    found = sum(1 for snapshots in states.values() if snapshots)
+    print(f"🔎 {found:,} of {len(states):,} addresses have a snapshot at or before {args.at}")
+    if len(states) <= 20:
+        for address, snapshots in states.items():
+            if not snapshots:
+                print(f"   {address}: no snapshot")
+            for state in snapshots:
+                coins = ', '.join(f"{p['coin']} {p['direction']}" for p in state['positions']) or 'no positions'
+                print(f"   {address} [{state['builder']} {state['market']} {state['snapshot_date']}]: "
+                      f"${state['account_value'] or 0:,.2f} — {coins}")
+
+    if args.output:
+        write_dump(args.output, states)
+        print(f"💾 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
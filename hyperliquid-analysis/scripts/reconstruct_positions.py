@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Reconstruct Positions From Fills
+Replays builder_fills day files into net builder-attributed positions at a
+date, optionally cross-checked against the API snapshot in the snapshot database
+"""
+
+import sys
+import os
+import argparse
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import config
+from src.asof_index import book_as_of
+from src.csv_scraper import CSVScraper
+from src.dump_io import atomic_open, write_dump
+from src.fill_positions import FillPositionBook
+from src.snapshot_db import SnapshotDB
+
+
+def main():
+    yesterday = (datetime.now(timezone.utc) - timedelta(days=1)).strftime('%Y%m%d')
+
+    parser = argparse.ArgumentParser(description='Reconstruct builder positions from fills (no API calls)')
+    parser.add_argument(
+        'builder',
+        choices=list(config.BUILDERS.keys()),
+        help='Builder name'
+    )
+    parser.add_argument(
+        '--at',
+        type=str,
+        default=yesterday,
+        help=f'Positions at the end of this day, YYYYMMDD (default: {yesterday})'
+    )
+    parser.add_argument(
+        '--days',
+        type=int,
+        default=config.DAYS_TO_FETCH,
+        help=f'Days of fills to replay up to --at (default: {config.DAYS_TO_FETCH})'
+    )
+    parser.add_argument(
+        '--compare',
+        choices=['hypercore', 'hip3'],
+        help='Cross-check against the latest API snapshot of this market at or before --at'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        help='Write the reconstructed positions as CSV'
+    )
+    parser.add_argument(
+        '--report',
+        type=str,
+        help='Write the cross-check report as JSON'
+    )
+
+    args = parser.parse_args()
+
+    builder_address = config.BUILDERS[args.builder]
+    book = FillPositionBook(until=args.at)
+
+    # Day files come from the local fill cache, downloading only missing days
+    scraper = CSVScraper(builder_address, args.builder)
+    scraper.fetch_historical_users(days_back=args.days, until=args.at, consumers=[book])
+    book.flush()
+
+    positions = book.positions()
+    print(f"\n📘 {args.builder} positions from fills as of {book.last_date}: "
+          f"{len(positions):,} open across {positions['address'].nunique():,} users")
+    longs = (positions['direction'] == 'LONG').sum()
+    print(f"   {longs:,} long / {len(positions) - longs:,} short, "
+          f"realized PnL ${book.state['realized_pnl'].sum():,.2f}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with atomic_open(args.output, 'wt') as f:
+            positions.to_csv(f, index=False)
+        print(f"💾 Saved to {args.output}")
+
+    if args.compare:
+        with SnapshotDB() as db:
+            snapshot = book_as_of(db, args.builder, args.compare, args.at)
+        if snapshot['snapshot_date'] is None:
+            print(f"❌ No {args.builder} {args.compare} snapshot at or before {args.at}")
+            return
+
+        report = book.compare(snapshot['positions'], market=args.compare)
+        report['snapshot_date'] = snapshot['snapshot_date']
+        counts = report['counts']
+        print(f"\n🔍 Cross-check vs {args.compare} snapshot {snapshot['snapshot_date']}:")
+        print(f"   Matched: {counts['matched']:,}")
+        print(f"   Size mismatch: {counts['size_mismatch']:,}")
+        print(f"   Direction mismatch: {counts['direction_mismatch']:,}")
+        print(f"   Only in fills: {counts['only_in_fills']:,} ({args.compare} coins only)")
+        print(f"   Only in API: {counts['only_in_api']:,} (opened without the builder or before the replay window)")
+
+        if args.report:
+            write_dump(args.report, report)
+            print(f"💾 Report saved to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
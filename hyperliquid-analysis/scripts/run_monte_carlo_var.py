@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo VaR for Builder Position Books
+Shocks processed position snapshots with correlated multi-coin price paths
+and reports VaR/ES per builder and per category
+"""
+
+import sys
+import json
+import argparse
+import time
+from pathlib import Path
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.dump_io import write_dump
+from src.monte_carlo import PositionBook, MonteCarloVaR
+
+
+def load_covariance(path):
+    """
+    Load a covariance matrix JSON file
+
+    Expected format: {"coins": ["BTC", "ETH", ...], "matrix": [[...], ...]}
+    with the covariance of log returns over the VaR horizon.
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+    return data['coins'], data['matrix']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Monte Carlo VaR over processed position snapshots')
+    parser.add_argument(
+        'snapshots',
+        nargs='+',
+        help='positions_summary_* and/or positions_by_category_* JSON files'
+    )
+    parser.add_argument(
+        '--covariance',
+        type=str,
+        help='Covariance matrix JSON file (default: uncorrelated, --default-vol per coin)'
+    )
+    parser.add_argument(
+        '--default-vol',
+        type=float,
+        default=0.05,
+        help='Horizon volatility for coins not in the covariance matrix (default: 0.05)'
+    )
+    parser.add_argument(
+        '--scenarios',
+        type=int,
+        default=100_000,
+        help='Number of scenarios (default: 100000)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Worker processes (default: CPU count)'
+    )
+    parser.add_argument(
+        '--seed',
+        type=int,
+        help='Random seed for reproducible runs'
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        help='Output JSON path (default: data/processed/custom/monte_carlo_var_YYYYMMDD.json)'
+    )
+
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("MONTE CARLO VAR")
+    print("=" * 60)
+    print()
+
+    book = PositionBook()
+    for snapshot in args.snapshots:
+        path = Path(snapshot)
+        if not path.exists():
+            print(f"❌ File not found: {path}")
+            return
+        print(f"📂 Loading snapshot: {path.name}")
+        book.load_snapshot(path)
+
+    print(f"✅ {len(book.addresses):,} accounts, {book.num_positions:,} positions, {len(book.coins)} coins")
+    print()
+
+    if book.num_positions == 0:
+        print("❌ No positions found in snapshots")
+        return
+
+    coins, matrix = load_covariance(args.covariance) if args.covariance else ([], [])
+    engine = MonteCarloVaR(book, matrix, coins, default_vol=args.default_vol)
+
+    print(f"🔄 Simulating {args.scenarios:,} scenarios...")
+    start_time = time.time()
+    report = engine.run(n_scenarios=args.scenarios, workers=args.workers, seed=args.seed)
+    elapsed_time = time.time() - start_time
+    print(f"✅ Simulation complete in {elapsed_time:.1f} seconds")
+
+    report['generated_at'] = datetime.utcnow().isoformat()
+    report['snapshots'] = [Path(s).name for s in args.snapshots]
+
+    if args.output:
+        output_path = Path(args.output)
+    else:
+        output_dir = Path(__file__).parent.parent / 'data' / 'processed' / 'custom'
+        output_path = output_dir / f"monte_carlo_var_{datetime.utcnow().strftime('%Y%m%d')}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    write_dump(output_path, report)
+
+    print()
+    print("=" * 60)
+    print("RISK SUMMARY")
+    print("=" * 60)
+    total = report['total']
+    print(f"\n📊 All accounts:")
+    print(f"   VaR 95: ${total['var_95']:,.2f}   ES 95: ${total['es_95']:,.2f}")
+    print(f"   VaR 99: ${total['var_99']:,.2f}   ES 99: ${total['es_99']:,.2f}")
+
+    for grouping, groups in report['groups'].items():
+        print(f"\n📊 By {grouping}:")
+        for label, stats in groups.items():
+            print(f"   {label}: VaR 99 ${stats['var_99']:,.2f} / ES 99 ${stats['es_99']:,.2f}")
+
+    print()
+    print("=" * 60)
+    print(f"✅ Results saved to: {output_path}")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+"""
+Address Registry
+Stable integer IDs for addresses, stored as 20-byte rows with a hash index
+"""
+import fcntl
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+ADDRESS_BYTES = 20
+
+# Hash table kept at most half full so probe chains stay short
+LOAD_FACTOR = 0.5
+
+ADDRESSES_FILE = 'addresses.npy'
+INDEX_FILE = 'index.npy'
+LOCK_FILE = '.registry.lock'
+
+
+def normalize_address(address: str) -> bytes:
+    """
+    Parse a 0x-prefixed hex address into its 20 raw bytes (case-insensitive)
+
+    Raises:
+        ValueError: If the address is not 0x followed by 40 hex digits
+    """
+    if not isinstance(address, str) or len(address) != 42 or address[:2] not in ('0x', '0X'):
+        raise ValueError(f"Invalid address: {address!r}")
+    try:
+        raw = bytes.fromhex(address[2:])
+    except ValueError:
+        raise ValueError(f"Invalid address: {address!r}")
+    if len(raw) != ADDRESS_BYTES:
+        raise ValueError(f"Invalid address: {address!r}")
+    return raw
+
+
+def format_address(raw: bytes) -> str:
+    """Lowercase 0x-prefixed hex form of 20 raw address bytes"""
+    return '0x' + bytes(raw).hex()
+
+
+def compare_ids(a: np.ndarray, b: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Set comparison of two ID arrays
+
+    Returns:
+        Dict of sorted unique ID arrays: intersection, only_a, only_b, union
+    """
+    a = np.unique(a)
+    b = np.unique(b)
+    return {
+        'intersection': np.intersect1d(a, b, assume_unique=True),
+        'only_a': np.setdiff1d(a, b, assume_unique=True),
+        'only_b': np.setdiff1d(b, a, assume_unique=True),
+        'union': np.union1d(a, b)
+    }
+
+
+def remap_ids(ids: np.ndarray, moved: Dict[int, int]) -> np.ndarray:
+    """Apply the ID changes returned by AddressRegistry.save() to an ID array"""
+    ids = np.asarray(ids, dtype=np.int64)
+    if not moved:
+        return ids
+    old = np.fromiter(moved.keys(), dtype=np.int64, count=len(moved))
+    new = np.fromiter(moved.values(), dtype=np.int64, count=len(moved))
+    order = np.argsort(old)
+    old, new = old[order], new[order]
+    position = np.minimum(np.searchsorted(old, ids), len(old) - 1)
+    return np.where(old[position] == ids, new[position], ids)
+
+
+class AddressRegistry:
+    """
+    Append-only mapping between addresses and dense int IDs (0, 1, 2, ...)
+
+    An ID is the row of the address in an (N, 20) uint8 table, so IDs stay
+    stable as the registry grows. Lookups go through an open-addressing hash
+    table keyed by the address's leading 8 bytes (addresses are hashes, so
+    these are already uniform). Both arrays are saved as .npy files and
+    memory-mapped on load.
+
+    Saving takes an exclusive file lock and merges with what other writers
+    saved meanwhile, so an address gets one ID across processes; IDs
+    registered since the last save may change then (see save()).
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: Registry directory; loaded if it exists (None keeps it in memory)
+        """
+        self.path = str(path) if path is not None else None
+        self._rows = np.zeros((0, ADDRESS_BYTES), dtype=np.uint8)
+        self._table = np.zeros(0, dtype=np.int64)
+        # Addresses added since the last save/load, not yet in the hash table
+        self._new: Dict[bytes, int] = {}
+        self._new_rows: List[bytes] = []
+
+        if self.path and os.path.exists(os.path.join(self.path, ADDRESSES_FILE)):
+            self._rows = np.load(os.path.join(self.path, ADDRESSES_FILE), mmap_mode='r')
+            self._table = np.load(os.path.join(self.path, INDEX_FILE), mmap_mode='r')
+
+    @classmethod
+    def default(cls) -> 'AddressRegistry':
+        """Registry at config.ADDRESS_REGISTRY under the project directory"""
+        project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return cls(os.path.join(project_dir, config.ADDRESS_REGISTRY))
+
+    def __len__(self) -> int:
+        return len(self._rows) + len(self._new_rows)
+
+    def __contains__(self, address: str) -> bool:
+        try:
+            return self.lookup(address) is not None
+        except ValueError:
+            return False
+
+    @staticmethod
+    def _slots(keys: np.ndarray, mask: int) -> np.ndarray:
+        # Leading 8 bytes as an integer
+        return keys[:, :8].copy().view('>u8').ravel().astype(np.int64) & mask
+
+    def _probe(self, keys: np.ndarray) -> np.ndarray:
+        """Indexed IDs of (M, 20) address rows, -1 where absent"""
+        return self._probe_table(self._rows, self._table, keys)
+
+    @classmethod
+    def _probe_table(cls, rows: np.ndarray, table: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        result = np.full(len(keys), -1, dtype=np.int64)
+        if not len(table) or not len(keys):
+            return result
+
+        mask = len(table) - 1
+        slots = cls._slots(keys, mask)
+        pending = np.arange(len(keys))
+        while len(pending):
+            entries = table[slots]
+            occupied = entries > 0
+            ids = entries[occupied] - 1
+            found = np.all(rows[ids] == keys[pending[occupied]], axis=1)
+            result[pending[occupied][found]] = ids[found]
+            # Continue probing where the slot held a different address
+            retry = np.flatnonzero(occupied)[~found]
+            pending = pending[retry]
+            slots = (slots[retry] + 1) & mask
+        return result
+
+    def _to_rows(self, addresses: Sequence[str]) -> np.ndarray:
+        if not len(addresses):
+            return np.zeros((0, ADDRESS_BYTES), dtype=np.uint8)
+        raw = b''.join(normalize_address(a) for a in addresses)
+        return np.frombuffer(raw, dtype=np.uint8).reshape(-1, ADDRESS_BYTES)
+
+    def lookup(self, address: str) -> Optional[int]:
+        """ID of an address, or None if not registered"""
+        found = self.lookup_many([address])[0]
+        return None if found < 0 else int(found)
+
+    def lookup_many(self, addresses: Sequence[str]) -> np.ndarray:
+        """
+        IDs of many addresses without registering new ones
+
+        Returns:
+            int64 array with -1 for unregistered addresses
+        """
+        keys = self._to_rows(addresses)
+        result = self._probe(keys)
+        if self._new:
+            for i in np.flatnonzero(result < 0):
+                result[i] = self._new.get(keys[i].tobytes(), -1)
+        return result
+
+    def id(self, address: str) -> int:
+        """ID of an address, registering it if new"""
+        return int(self.ids([address])[0])
+
+    def ids(self, addresses: Sequence[str]) -> np.ndarray:
+        """
+        IDs of many addresses, registering any new ones
+
+        Args:
+            addresses: 0x-prefixed hex addresses (any case)
+
+        Returns:
+            int64 array aligned with addresses
+        """
+        keys = self._to_rows(addresses)
+        result = self._probe(keys)
+        base = len(self._rows)
+        for i in np.flatnonzero(result < 0):
+            raw = keys[i].tobytes()
+            address_id = self._new.get(raw)
+            if address_id is None:
+                address_id = base + len(self._new_rows)
+                self._new[raw] = address_id
+                self._new_rows.append(raw)
+            result[i] = address_id
+        return result
+
+    def address(self, address_id: int) -> str:
+        """Lowercase address for an ID"""
+        return self.addresses([address_id])[0]
+
+    def addresses(self, ids: Iterable[int]) -> List[str]:
+        """Lowercase addresses for many IDs"""
+        ids = np.asarray(list(ids) if not isinstance(ids, np.ndarray) else ids, dtype=np.int64)
+        base = len(self._rows)
+        if not len(ids):
+            return []
+        if ids.min() < 0 or ids.max() >= len(self):
+            raise KeyError("Address ID out of range")
+        return [
+            format_address(self._rows[i]) if i < base else format_address(self._new_rows[i - base])
+            for i in ids
+        ]
+
+    def _build_table(self, rows: np.ndarray, table: Optional[np.ndarray] = None) -> np.ndarray:
+        """Hash table of rows; extends a table of the leading rows when it has room"""
+        size = 1
+        while size * LOAD_FACTOR < max(len(rows), 1):
+            size *= 2
+        if table is not None and len(table) == size:
+            table = np.array(table)
+            start = int((table > 0).sum())
+        else:
+            table = np.zeros(size, dtype=np.int64)
+            start = 0
+        mask = size - 1
+        slots = self._slots(rows[start:], mask)
+        # Insert in ID order, linear probing on collision
+        for address_id, slot in enumerate(slots.tolist(), start):
+            while table[slot]:
+                slot = (slot + 1) & mask
+            table[slot] = address_id + 1
+        return table
+
+    def _save_array(self, name: str, array: np.ndarray):
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix='.npy.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(temp_path, os.path.join(self.path, name))
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, LOCK_FILE), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def save(self, path: Optional[str] = None) -> Dict[int, int]:
+        """
+        Persist the registry and reopen it memory-mapped
+
+        Under the lock, the registry on disk is reloaded and only addresses
+        it does not hold yet are appended, so concurrent writers never give
+        one ID to two addresses. IDs of addresses registered since the last
+        save change when another writer saved first.
+
+        Args:
+            path: Directory to save to (default: the path it was opened with)
+
+        Returns:
+            {old ID: new ID} for IDs that changed (apply with remap_ids)
+        """
+        self.path = str(path) if path is not None else self.path
+        if self.path is None:
+            raise ValueError("No registry path to save to")
+
+        moved: Dict[int, int] = {}
+        with self._locked():
+            rows_path = os.path.join(self.path, ADDRESSES_FILE)
+            if os.path.exists(rows_path):
+                rows = np.load(rows_path, mmap_mode='r')
+                table = np.load(os.path.join(self.path, INDEX_FILE), mmap_mode='r')
+            else:
+                rows = np.zeros((0, ADDRESS_BYTES), dtype=np.uint8)
+                table = None
+
+            if self._new_rows:
+                base = len(self._rows)
+                new_rows = np.frombuffer(b''.join(self._new_rows), dtype=np.uint8).reshape(-1, ADDRESS_BYTES)
+                # Rows only grow, so IDs below base are the same on disk
+                found = self._probe_table(rows, table, new_rows) if table is not None else \
+                    np.full(len(new_rows), -1, dtype=np.int64)
+                missing = found < 0
+                found[missing] = len(rows) + np.arange(int(missing.sum()))
+                moved = {base + i: int(found[i]) for i in np.flatnonzero(found != base + np.arange(len(found)))}
+
+                if missing.any():
+                    rows = np.concatenate([np.asarray(rows), new_rows[missing]])
+                    table = self._build_table(rows, table)
+                    # Rows first: rows only grow, so an older index still resolves against them
+                    self._save_array(ADDRESSES_FILE, rows)
+                    self._save_array(INDEX_FILE, table)
+            elif not os.path.exists(rows_path):
+                self._save_array(ADDRESSES_FILE, rows)
+                self._save_array(INDEX_FILE, self._build_table(rows))
+
+            self._rows = np.load(rows_path, mmap_mode='r')
+            self._table = np.load(os.path.join(self.path, INDEX_FILE), mmap_mode='r')
+        self._new = {}
+        self._new_rows = []
+        return moved
@@ -0,0 +1,235 @@
+"""
+As-Of Index
+Point-in-time lookups of account and position state over the snapshot database
+"""
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .coin_series import snapshot_timestamp
+from .snapshot_db import SnapshotDB
+
+
+# Composite sort key: segment number in the high bits, epoch seconds below
+TS_BITS = 34
+
+# Numeric times at or above this are epoch milliseconds (year 5138 in seconds)
+MILLIS_THRESHOLD = 10 ** 11
+
+# Addresses per IN (...) clause when fetching matched rows
+QUERY_CHUNK = 500
+
+TimeLike = Union[int, float, str, datetime]
+
+
+def to_timestamp(value: TimeLike) -> int:
+    """
+    Epoch seconds (UTC) from epoch seconds, a datetime, 'YYYYMMDD', 'YYYY-MM-DD'
+    or an ISO timestamp
+
+    Dates without a time mean the end of that day, so a date matches
+    snapshots taken during it. Numbers of MILLIS_THRESHOLD or more are read
+    as epoch milliseconds.
+    """
+    if isinstance(value, str) and value.isdigit() and len(value) != 8:
+        value = int(value)
+    if isinstance(value, (int, float)):
+        return int(value // 1000 if value >= MILLIS_THRESHOLD else value)
+    if isinstance(value, datetime):
+        moment = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+        return int(moment.timestamp())
+    if value.isdigit():
+        return snapshot_timestamp(fetch_date=value) + 86399
+    if len(value) == 10:
+        return snapshot_timestamp(fetch_date=value.replace('-', '')) + 86399
+    return snapshot_timestamp(fetched_at=value)
+
+
+def book_as_of(db: SnapshotDB, builder: str, market: str, at: TimeLike) -> Dict:
+    """
+    The builder's latest full snapshot at or before a time
+
+    Reads only per-date snapshot completion times, so no index is needed.
+
+    Returns:
+        Dict with snapshot_date (None if there is none yet) and its positions
+    """
+    ts = to_timestamp(at)
+    # A snapshot counts once its last account was fetched
+    snapshots = db.conn.execute(
+        'SELECT snapshot_date, MAX(fetched_at) FROM account_snapshots '
+        'WHERE builder = ? AND market = ? GROUP BY snapshot_date ORDER BY snapshot_date',
+        (builder, market)
+    ).fetchall()
+    dates = [date for date, _ in snapshots]
+    completed = [snapshot_timestamp(fetched_at, date) for date, fetched_at in snapshots]
+    i = int(np.searchsorted(completed, ts, side='right')) - 1
+    if i < 0:
+        return {'builder': builder, 'market': market, 'snapshot_date': None, 'positions': []}
+    return {
+        'builder': builder,
+        'market': market,
+        'snapshot_date': dates[i],
+        'positions': db.positions(snapshot_date=dates[i], builder=builder, market=market)
+    }
+
+
+class AsOfIndex:
+    """
+    Sorted snapshot times per (address, builder, market)
+
+    Built from account_snapshots metadata only (no positions are read). Each
+    (address, builder, market) is a segment of one sorted array of
+    (segment, time) keys, so an as-of lookup is one binary search, and a
+    batch of addresses is one vectorized np.searchsorted. Matching rows are
+    then fetched from the database by primary key.
+    """
+
+    def __init__(self, db: SnapshotDB, builder: Optional[str] = None, market: Optional[str] = None):
+        """
+        Args:
+            db: Snapshot database
+            builder: Only index this builder (default: all)
+            market: Only index this market (default: all)
+        """
+        self.db = db
+        self.builder = builder
+        self.market = market
+        self.refresh()
+
+    def refresh(self):
+        """Rebuild the index (after new snapshots were written)"""
+        clauses, params = [], []
+        if self.builder:
+            clauses.append('builder = ?')
+            params.append(self.builder)
+        if self.market:
+            clauses.append('market = ?')
+            params.append(self.market)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self.db.conn.execute(
+            f'SELECT address, builder, market, snapshot_date, fetched_at FROM account_snapshots{where}', params
+        ).fetchall()
+
+        segment_ids: Dict[Tuple[str, str, str], int] = {}
+        segments = np.empty(len(rows), dtype=np.int64)
+        times = np.empty(len(rows), dtype=np.int64)
+        dates = []
+        for i, (address, builder, market, snapshot_date, fetched_at) in enumerate(rows):
+            segments[i] = segment_ids.setdefault((address, builder, market), len(segment_ids))
+            times[i] = snapshot_timestamp(fetched_at, snapshot_date)
+            dates.append(snapshot_date)
+
+        keys = (segments << TS_BITS) | times
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._times = times[order]
+        self._dates = np.array(dates, dtype=object)[order] if dates else np.array([], dtype=object)
+        self._segments = list(segment_ids)
+        self._starts = np.searchsorted(self._keys, np.arange(len(segment_ids), dtype=np.int64) << TS_BITS)
+
+        # Address -> its segments (one per builder x market it appears in)
+        self._by_address: Dict[str, List[int]] = defaultdict(list)
+        for segment, (address, _, _) in enumerate(self._segments):
+            self._by_address[address].append(segment)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def history(self, address: str) -> List[Dict]:
+        """Indexed snapshot times of an address, oldest first"""
+        entries = []
+        for segment in self._by_address.get(address.lower(), []):
+            _, builder, market = self._segments[segment]
+            start = self._starts[segment]
+            end = self._starts[segment + 1] if segment + 1 < len(self._starts) else len(self._keys)
+            for i in range(start, end):
+                entries.append({'builder': builder, 'market': market, 'snapshot_date': self._dates[i], 'ts': int(self._times[i])})
+        return sorted(entries, key=lambda e: e['ts'])
+
+    def locate_many(self, addresses: Sequence[str], at: TimeLike) -> Dict[str, List[Tuple[str, str, str]]]:
+        """
+        Snapshot keys holding each address's latest state at or before a time
+
+        Args:
+            addresses: User addresses
+            at: Point in time
+
+        Returns:
+            {lowercased address: [(builder, market, snapshot_date), ...]} (one per
+            builder x market with a snapshot at or before at; empty if none)
+        """
+        ts = to_timestamp(at)
+        lowered = [address.lower() for address in addresses]
+        located = {address: [] for address in lowered}
+        if ts < 0:
+            return located
+        # Keep ts inside its bits so the key cannot spill into the next segment
+        ts = min(ts, (1 << TS_BITS) - 1)
+        wanted = np.array(
+            [segment for address in lowered for segment in self._by_address.get(address, [])],
+            dtype=np.int64
+        )
+        if not len(wanted):
+            return located
+
+        # Last key <= (segment, ts), valid if still inside the segment
+        positions = np.searchsorted(self._keys, (wanted << TS_BITS) | ts, side='right') - 1
+        valid = positions >= self._starts[wanted]
+        valid[valid] = (self._keys[positions[valid]] >> TS_BITS) == wanted[valid]
+        for segment, position in zip(wanted[valid].tolist(), positions[valid].tolist()):
+            address, builder, market = self._segments[segment]
+            located[address].append((builder, market, self._dates[position]))
+        return located
+
+    def _fetch(self, table: str, keys: Dict[Tuple[str, str, str], List[str]]) -> List[Dict]:
+        rows = []
+        for (builder, market, snapshot_date), addresses in keys.items():
+            for i in range(0, len(addresses), QUERY_CHUNK):
+                chunk = addresses[i:i + QUERY_CHUNK]
+                rows.extend(dict(row) for row in self.db.conn.execute(
+                    f"SELECT * FROM {table} WHERE builder = ? AND market = ? AND snapshot_date = ? "
+                    f"AND address IN ({', '.join('?' * len(chunk))})",
+                    [builder, market, snapshot_date, *chunk]
+                ))
+        return rows
+
+    def as_of_many(self, addresses: Sequence[str], at: TimeLike) -> Dict[str, List[Dict]]:
+        """
+        Account state (with positions) of many addresses as of a time
+
+        Args:
+            addresses: User addresses
+            at: Point in time (epoch seconds, datetime, 'YYYYMMDD' or ISO string)
+
+        Returns:
+            {lowercased address: [account snapshot dict with 'positions', ...]}, one
+            entry per builder x market the address had been seen in by then
+        """
+        located = self.locate_many(addresses, at)
+        keys = defaultdict(list)
+        for address, snapshots in located.items():
+            for snapshot in snapshots:
+                keys[snapshot].append(address)
+
+        positions = defaultdict(list)
+        for row in self._fetch('positions', keys):
+            positions[(row['builder'], row['market'], row['snapshot_date'], row['address'])].append(row)
+
+        states = {address: [] for address in located}
+        for account in self._fetch('account_snapshots', keys):
+            account['positions'] = positions.get(
+                (account['builder'], account['market'], account['snapshot_date'], account['address']), []
+            )
+            states[account['address']].append(account)
+        return states
+
+    def as_of(self, address: str, at: TimeLike) -> List[Dict]:
+        """Account state (with positions) of one address as of a time"""
+        return self.as_of_many([address], at)[address.lower()]
+
+    def book_as_of(self, builder: str, market: str, at: TimeLike) -> Dict:
+        """The builder's latest full snapshot at or before a time (see book_as_of())"""
+        return book_as_of(self.db, builder, market, at)
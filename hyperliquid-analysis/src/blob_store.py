@@ -0,0 +1,215 @@
+"""
+Blob Store
+Content-addressed storage of account states and memoized processing
+"""
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from typing import Dict, List, Optional, Sequence
+
+from .position_processor import PositionProcessor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+# Raw record keys holding a clearinghouseState
+STATE_KEYS = ('hypercore', 'hip3_xyz')
+
+# Bump when PositionProcessor output changes, so stale memos are ignored
+MEMO_VERSION = 1
+
+
+def _canonical(value) -> bytes:
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+class BlobStore:
+    """
+    Git-style object store keyed by SHA-256 of content
+
+    Layout under root:
+        objects/ab/cdef...json     account states (minus the volatile 'time')
+        memo/v<N>/ab/cdef...json   processed results keyed by state hashes
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        """
+        Args:
+            root: Store directory (default: config.BLOB_DIR under the project)
+        """
+        if root is None:
+            project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            root = os.path.join(project_dir, config.BLOB_DIR)
+        self.root = str(root)
+        self._known = set()
+        self.stats = {'states_written': 0, 'states_reused': 0}
+
+    def _path(self, kind: str, digest: str) -> str:
+        return os.path.join(self.root, kind, digest[:2], f'{digest[2:]}.json')
+
+    def _write(self, path: str, data: bytes):
+        # Write-then-rename so concurrent writers never expose a partial blob
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _read(self, path: str):
+        with open(path, 'rb') as f:
+            return json.loads(f.read())
+
+    @staticmethod
+    def hash_state(state: Dict) -> str:
+        """SHA-256 of a clearinghouseState, ignoring its 'time' field"""
+        return hashlib.sha256(_canonical({k: v for k, v in state.items() if k != 'time'})).hexdigest()
+
+    def put_state(self, state: Dict) -> str:
+        """
+        Store an account state if new
+
+        Returns:
+            Content hash
+        """
+        digest = self.hash_state(state)
+        if digest in self._known:
+            self.stats['states_reused'] += 1
+            return digest
+
+        path = self._path('objects', digest)
+        if os.path.exists(path):
+            self.stats['states_reused'] += 1
+        else:
+            body = {k: v for k, v in state.items() if k != 'time'}
+            self._write(path, json.dumps(body, separators=(',', ':')).encode('utf-8'))
+            self.stats['states_written'] += 1
+        self._known.add(digest)
+        return digest
+
+    def get_state(self, digest: str) -> Dict:
+        return self._read(self._path('objects', digest))
+
+    def to_ref(self, raw_data: Dict) -> Dict:
+        """
+        Replace each clearinghouseState in a raw record with its hash
+
+        The state's 'time' is kept beside the hash as '<key>_time' so
+        from_ref() restores the original record exactly.
+        """
+        ref = {}
+        for key, value in raw_data.items():
+            if key in STATE_KEYS and isinstance(value, dict):
+                ref[key] = self.put_state(value)
+                if 'time' in value:
+                    ref[f'{key}_time'] = value['time']
+            else:
+                ref[key] = value
+        return ref
+
+    def from_ref(self, ref: Dict) -> Dict:
+        """Rebuild a raw record from a ref entry"""
+        raw_data = {}
+        for key, value in ref.items():
+            if key.endswith('_time') and key[:-len('_time')] in STATE_KEYS:
+                continue
+            if key in STATE_KEYS and isinstance(value, str):
+                state = self.get_state(value)
+                if f'{key}_time' in ref:
+                    state['time'] = ref[f'{key}_time']
+                raw_data[key] = state
+            else:
+                raw_data[key] = value
+        return raw_data
+
+    def expand_snapshot(self, refs_data: Dict) -> Dict:
+        """Rebuild a positions_raw_* document from a positions_refs_* document"""
+        return {
+            **{k: v for k, v in refs_data.items() if k != 'users'},
+            'users': [self.from_ref(ref) for ref in refs_data.get('users', [])]
+        }
+
+    def memo_key(self, ref: Dict, state_keys: Sequence[str] = STATE_KEYS) -> Optional[str]:
+        """Hash identifying the processing inputs of a ref entry (None if it has no state)"""
+        parts = [f'{key}={ref[key]}' for key in state_keys if key in ref and ref[key] is not None]
+        if not parts:
+            return None
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def get_memo(self, key: str) -> Optional[Dict]:
+        path = self._path(f'memo/v{MEMO_VERSION}', key)
+        return self._read(path) if os.path.exists(path) else None
+
+    def put_memo(self, key: str, value: Dict):
+        self._write(self._path(f'memo/v{MEMO_VERSION}', key), json.dumps(value, separators=(',', ':')).encode('utf-8'))
+
+
+class MemoizedPositionProcessor(PositionProcessor):
+    """
+    PositionProcessor that skips accounts whose state was already processed
+
+    Refs of every raw record processed are collected in .refs, ready to be
+    written as the snapshot's positions_refs_* file.
+    """
+
+    def __init__(self, store: BlobStore):
+        super().__init__()
+        self.store = store
+        self.refs: List[Dict] = []
+        self.hits = 0
+        self.misses = 0
+
+    def _from_memo(self, ref: Dict, memo: Dict) -> Dict:
+        self.hits += 1
+        return {
+            'address': ref['address'],
+            'fetched_at': ref['fetched_at'],
+            **memo,
+            'error': ref.get('error')
+        }
+
+    def _process_and_memoize(self, raw_data: Dict, key: Optional[str]) -> Dict:
+        self.misses += 1
+        processed = super().process_user_positions(raw_data)
+        if key:
+            self.store.put_memo(key, {
+                'has_positions': processed['has_positions'],
+                'num_positions': processed['num_positions'],
+                'account_summary': processed['account_summary'],
+                'positions': processed['positions']
+            })
+        return processed
+
+    def process_user_positions(self, raw_data: Dict) -> Dict:
+        """
+        Process one raw record, storing its states and reusing memoized results
+
+        Args:
+            raw_data: Raw response from position fetcher
+
+        Returns:
+            Processed position data (same as PositionProcessor)
+        """
+        ref = self.store.to_ref(raw_data)
+        self.refs.append(ref)
+        key = self.store.memo_key(ref)
+        memo = self.store.get_memo(key) if key else None
+        if memo is not None:
+            return self._from_memo(ref, memo)
+        return self._process_and_memoize(raw_data, key)
+
+    def process_ref(self, ref: Dict) -> Dict:
+        """
+        Process one positions_refs_* entry
+
+        States are only loaded from the store when the memo misses, so
+        unchanged accounts cost one memo lookup.
+        """
+        key = self.store.memo_key(ref)
+        memo = self.store.get_memo(key) if key else None
+        if memo is not None:
+            return self._from_memo(ref, memo)
+        return self._process_and_memoize(self.store.from_ref(ref), key)
@@ -0,0 +1,178 @@
+"""
+Snapshot Catalog
+Per-builder manifest of data artifacts with atomic updates and latest lookups
+"""
+import fcntl
+import hashlib
+import json
+import os
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from .dump_io import PathLike, write_dump
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+CATALOG_FILE = 'catalog.json'
+# {artifact type: newest path}, kept apart so lookups skip the growing manifest
+LATEST_FILE = 'latest.json'
+LOCK_FILE = '.catalog.lock'
+
+# Bytes hashed per read when checksumming artifacts
+HASH_CHUNK = 1024 * 1024
+
+
+def file_checksum(path: PathLike) -> str:
+    """SHA-256 of a file's bytes as stored on disk"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Catalog:
+    """
+    Manifest of every artifact written for one builder
+
+    Stored as data/processed/<builder>/catalog.json:
+        artifacts: {relative path: {type, date, rows, sha256, parents, registered_at}}
+        latest:    {artifact type: relative path of the newest artifact}
+
+    The latest map is also written to a small latest.json pointer file,
+    which latest() reads instead of parsing the whole manifest.
+
+    Updates take an exclusive file lock, then replace the manifest and the
+    pointer file with os.replace(), so readers never lock and always see
+    complete files. Paths are stored relative to the builder directory.
+    """
+
+    def __init__(self, builder: str, root: Optional[PathLike] = None):
+        """
+        Args:
+            builder: Builder name
+            root: Processed data directory (default: config.PROCESSED_DIR under the project)
+        """
+        if root is None:
+            project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            root = os.path.join(project_dir, config.PROCESSED_DIR)
+        self.builder = builder
+        self.directory = Path(root) / builder
+        self.manifest_path = self.directory / CATALOG_FILE
+        self.latest_path = self.directory / LATEST_FILE
+
+    def load(self) -> Dict:
+        """Current manifest (empty if none has been written)"""
+        if not self.manifest_path.exists():
+            return {'builder': self.builder, 'updated_at': None, 'artifacts': {}, 'latest': {}}
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+
+    @contextmanager
+    def _locked(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / LOCK_FILE, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _key(self, path: PathLike) -> str:
+        path = Path(path).resolve()
+        try:
+            return str(path.relative_to(self.directory.resolve()))
+        except ValueError:
+            return str(path)
+
+    def resolve(self, key: str) -> Path:
+        """Absolute path of a catalog entry key"""
+        path = Path(key)
+        return path if path.is_absolute() else self.directory / path
+
+    def register(
+        self,
+        path: PathLike,
+        artifact_type: str,
+        date: Optional[str] = None,
+        rows: Optional[int] = None,
+        parents: Sequence[PathLike] = ()
+    ) -> Dict:
+        """
+        Record a completed artifact (call after it has been written)
+
+        Args:
+            path: Artifact file
+            artifact_type: Kind of artifact, e.g. 'positions_summary_hypercore'
+            date: Snapshot date (YYYYMMDD) the artifact belongs to
+            rows: Number of records it holds
+            parents: Artifacts it was derived from
+
+        Returns:
+            The catalog entry
+        """
+        entry = {
+            'type': artifact_type,
+            'date': date,
+            'rows': rows,
+            'bytes': os.path.getsize(path),
+            'sha256': file_checksum(path),
+            'parents': [self._key(p) for p in parents if p],
+            'registered_at': datetime.now().isoformat()
+        }
+        key = self._key(path)
+
+        with self._locked():
+            manifest = self.load()
+            manifest['artifacts'][key] = entry
+
+            # Newest by snapshot date; ties go to the latest registration
+            current = manifest['latest'].get(artifact_type)
+            current_date = manifest['artifacts'].get(current, {}).get('date') or ''
+            if current is None or (date or '') >= current_date:
+                manifest['latest'][artifact_type] = key
+
+            manifest['updated_at'] = entry['registered_at']
+            write_dump(self.manifest_path, manifest)
+            write_dump(self.latest_path, manifest['latest'])
+
+        return entry
+
+    def latest(self, artifact_type: str) -> Optional[Path]:
+        """Path of the newest artifact of a type, or None"""
+        if self.latest_path.exists():
+            with open(self.latest_path, 'r') as f:
+                latest = json.load(f)
+        else:
+            # Catalogs written before the pointer file existed
+            latest = self.load()['latest']
+        key = latest.get(artifact_type)
+        return self.resolve(key) if key else None
+
+    def get(self, path: PathLike) -> Optional[Dict]:
+        """Catalog entry for an artifact path"""
+        return self.load()['artifacts'].get(self._key(path))
+
+    def artifacts(self, artifact_type: Optional[str] = None) -> List[Dict]:
+        """
+        Entries (with their 'path') ordered by date
+
+        Args:
+            artifact_type: Only this type (None for all)
+        """
+        entries = [
+            {'path': str(self.resolve(key)), **entry}
+            for key, entry in self.load()['artifacts'].items()
+            if artifact_type is None or entry['type'] == artifact_type
+        ]
+        return sorted(entries, key=lambda e: (e['date'] or '', e['registered_at']))
+
+    def verify(self, path: PathLike) -> bool:
+        """True if an artifact still matches its recorded checksum"""
+        entry = self.get(path)
+        return entry is not None and Path(path).exists() and file_checksum(path) == entry['sha256']
@@ -0,0 +1,283 @@
+"""
+Coin Series
+Append-only fixed-width time series of per-coin position aggregates
+"""
+import fcntl
+import json
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from .dump_io import write_dump
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+# One record per snapshot x coin; counts first, then USD/size sums
+RECORD_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('coin', '<u4'),
+    ('count', '<u4'),
+    ('longs', '<u4'),
+    ('shorts', '<u4'),
+    ('total_value', '<f8'),
+    ('longs_value', '<f8'),
+    ('shorts_value', '<f8'),
+    ('longs_total_size', '<f8'),
+    ('shorts_total_size', '<f8'),
+    ('longs_unrealized_pnl', '<f8'),
+    ('shorts_unrealized_pnl', '<f8'),
+    ('total_unrealized_pnl', '<f8'),
+    ('total_margin_used', '<f8'),
+])
+
+STAT_FIELDS = RECORD_DTYPE.names[2:]
+
+COINS_FILE = 'coins.json'
+
+
+def assign_coin_ids(coins_path: str, names: Sequence[str]) -> List[int]:
+    """
+    Indexes of coin names in a coins.json list, appending unknown names
+
+    The read and the append happen under an exclusive lock on a sibling
+    .lock file, so concurrent writers sharing the list never give two
+    coins one index. The list is replaced atomically; readers need no lock.
+    """
+    os.makedirs(os.path.dirname(coins_path), exist_ok=True)
+    with open(coins_path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            coins = []
+            if os.path.exists(coins_path):
+                with open(coins_path, 'r') as f:
+                    coins = json.load(f)
+            index = {coin: i for i, coin in enumerate(coins)}
+            new = [name for name in dict.fromkeys(names) if name not in index]
+            if new:
+                for name in new:
+                    index[name] = len(coins)
+                    coins.append(name)
+                write_dump(coins_path, coins, indent=None)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return [index[name] for name in names]
+
+
+def snapshot_timestamp(fetched_at: Optional[str] = None, fetch_date: Optional[str] = None) -> int:
+    """Epoch seconds (UTC) of a snapshot from its fetched_at or YYYYMMDD fetch_date"""
+    if fetched_at:
+        moment = datetime.fromisoformat(fetched_at)
+    elif fetch_date:
+        moment = datetime.strptime(fetch_date, '%Y%m%d')
+    else:
+        raise ValueError("Snapshot has neither fetched_at nor fetch_date")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+def coin_aggregates(users: Iterable[Dict]) -> Dict[str, Dict[str, float]]:
+    """
+    Per-coin stats over processed users, with the fields the series stores
+
+    Args:
+        users: Processed user records (positions_summary_* 'users')
+
+    Returns:
+        {coin: {field: value}}
+    """
+    stats = defaultdict(lambda: defaultdict(float))
+    for user in users:
+        if not user.get('has_positions', False):
+            continue
+        for position in user.get('positions', []):
+            coin = stats[position.get('coin', '')]
+            value = position.get('position_value', 0)
+            pnl = position.get('unrealized_pnl', 0)
+            coin['count'] += 1
+            coin['total_value'] += value
+            coin['total_unrealized_pnl'] += pnl
+            coin['total_margin_used'] += position.get('margin_used', 0)
+            if position.get('direction') in ('LONG', 'SHORT'):
+                side = 'longs' if position['direction'] == 'LONG' else 'shorts'
+                coin[side] += 1
+                coin[f'{side}_value'] += value
+                coin[f'{side}_total_size'] += position.get('size', 0)
+                coin[f'{side}_unrealized_pnl'] += pnl
+    return {coin: dict(fields) for coin, fields in stats.items()}
+
+
+class CoinSeries:
+    """
+    Per-coin aggregates of one builder x market, one fixed-width record per
+    snapshot x coin
+
+    Layout under <root>/<builder>/:
+        <market>.bin   RECORD_DTYPE records, append-only
+        coins.json     coin names; a record's 'coin' is an index into it
+
+    Appends are a single O_APPEND write, and readers ignore a trailing
+    partial record, so a crash mid-append never corrupts earlier data.
+    """
+
+    def __init__(self, builder: str, market: str = 'hypercore', root: Optional[str] = None):
+        """
+        Args:
+            builder: Builder name
+            market: 'hypercore' or 'hip3'
+            root: Series directory (default: config.TIMESERIES_DIR under the project)
+        """
+        if root is None:
+            project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            root = os.path.join(project_dir, config.TIMESERIES_DIR)
+        self.builder = builder
+        self.market = market
+        self.directory = os.path.join(str(root), builder)
+        self.data_path = os.path.join(self.directory, f'{market}.bin')
+        self.coins_path = os.path.join(self.directory, COINS_FILE)
+
+    def coins(self) -> List[str]:
+        """Coin names, indexed by record 'coin' ID"""
+        if not os.path.exists(self.coins_path):
+            return []
+        with open(self.coins_path, 'r') as f:
+            return json.load(f)
+
+    def _coin_ids(self, names: Sequence[str]) -> List[int]:
+        # hypercore and hip3 series of a builder share coins.json
+        return assign_coin_ids(self.coins_path, names)
+
+    def records(self) -> np.ndarray:
+        """All complete records in append order (memory-mapped)"""
+        if not os.path.exists(self.data_path):
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        count = os.path.getsize(self.data_path) // RECORD_DTYPE.itemsize
+        if count == 0:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        return np.memmap(self.data_path, dtype=RECORD_DTYPE, mode='r', shape=(count,))
+
+    def timestamps(self) -> np.ndarray:
+        """Sorted unique snapshot times stored"""
+        return np.unique(self.records()['ts'])
+
+    def append(self, ts: int, coin_stats: Dict[str, Dict[str, float]], replace: bool = False) -> int:
+        """
+        Append one snapshot's per-coin aggregates
+
+        Args:
+            ts: Snapshot time (epoch seconds, see snapshot_timestamp)
+            coin_stats: {coin: {field: value}}; missing fields are stored as 0
+            replace: Append even if this snapshot time is already stored
+                (queries keep the last records appended for a time; coins
+                stored for it but absent from coin_stats get zero records)
+
+        Returns:
+            Number of records written (0 if the snapshot was already stored)
+        """
+        if not coin_stats:
+            return 0
+        stored = self.records()
+        stored = stored['coin'][stored['ts'] == ts]
+        if len(stored) and not replace:
+            return 0
+
+        names = sorted(coin_stats)
+        ids = self._coin_ids(names)
+        # Coins of the replaced snapshot that are gone now, zeroed
+        dropped = np.setdiff1d(stored, ids)
+        rows = np.zeros(len(names) + len(dropped), dtype=RECORD_DTYPE)
+        rows['ts'] = ts
+        rows['coin'][:len(names)] = ids
+        rows['coin'][len(names):] = dropped
+        for field in STAT_FIELDS:
+            rows[field][:len(names)] = [coin_stats[name].get(field, 0) for name in names]
+
+        # Drop any partial record left by an interrupted append
+        if os.path.exists(self.data_path):
+            size = os.path.getsize(self.data_path)
+            if size % RECORD_DTYPE.itemsize:
+                os.truncate(self.data_path, size - size % RECORD_DTYPE.itemsize)
+
+        fd = os.open(self.data_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, rows.tobytes())
+        finally:
+            os.close(fd)
+        return len(rows)
+
+    def _latest_per_key(self, records: np.ndarray) -> np.ndarray:
+        # Last appended record per (ts, coin), ordered by time then coin
+        order = np.lexsort((np.arange(len(records)), records['coin'], records['ts']))
+        ordered = records[order]
+        keep = np.ones(len(ordered), dtype=bool)
+        keep[:-1] = (ordered['ts'][1:] != ordered['ts'][:-1]) | (ordered['coin'][1:] != ordered['coin'][:-1])
+        return ordered[keep]
+
+    def series(
+        self,
+        coin: str,
+        fields: Optional[Sequence[str]] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Time series of one coin, ready for charting
+
+        Args:
+            coin: Coin name
+            fields: Stat fields to return (default: all)
+            start: Earliest snapshot time (inclusive)
+            end: Latest snapshot time (inclusive)
+
+        Returns:
+            Dict with 'ts' plus one array per field, sorted by time
+        """
+        fields = list(fields or STAT_FIELDS)
+        coins = self.coins()
+        records = self.records()
+        if coin in coins:
+            records = records[records['coin'] == coins.index(coin)]
+        else:
+            records = records[:0]
+        if start is not None:
+            records = records[records['ts'] >= start]
+        if end is not None:
+            records = records[records['ts'] <= end]
+        records = self._latest_per_key(records)
+        return {'ts': records['ts'].copy(), **{field: records[field].copy() for field in fields}}
+
+    def long_short_ratio(self, coin: str, by: str = 'value') -> Dict[str, np.ndarray]:
+        """
+        Long/short ratio over time ('count' by trader count, 'value' by notional)
+
+        Returns:
+            Dict with 'ts' and 'ratio' (inf where there are no shorts)
+        """
+        longs, shorts = ('longs', 'shorts') if by == 'count' else ('longs_value', 'shorts_value')
+        data = self.series(coin, [longs, shorts])
+        ratio = np.divide(
+            data[longs], data[shorts],
+            out=np.full(len(data['ts']), np.inf), where=data[shorts] > 0
+        )
+        return {'ts': data['ts'], 'ratio': ratio}
+
+    def totals(self, fields: Optional[Sequence[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Sums across all coins per snapshot (e.g. total open interest)
+
+        Returns:
+            Dict with 'ts' plus one array per field
+        """
+        fields = list(fields or STAT_FIELDS)
+        records = self._latest_per_key(self.records())
+        times, inverse = np.unique(records['ts'], return_inverse=True)
+        return {
+            'ts': times,
+            **{field: np.bincount(inverse, weights=records[field], minlength=len(times)) for field in fields}
+        }
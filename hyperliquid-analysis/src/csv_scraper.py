@@ -4,71 +4,287 @@ Download and parse historical trade data from builder_fills CSV files
 """
 import requests
 import lz4.frame
-import json
 import sys
 import os
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Set
-from io import StringIO
+from typing import List, Dict, Any, Iterator, Optional, Sequence, Set, Tuple
+from io import BytesIO
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
+from src.dump_io import write_dump
+from src.fill_cache import FillCache
+
+
+# Fill columns read from day files (others are skipped while parsing)
+FILL_COLUMNS = ('time', 'user', 'coin', 'side', 'px', 'size', 'fee')
+
+# Compact dtypes: repeated strings become categories, prices/sizes floats
+FILL_DTYPES = {
+    'user': 'category',
+    'coin': 'category',
+    'side': 'category',
+    'px': 'float64',
+    'size': 'float64',
+    'fee': 'float64',
+}
+
+# Outcome of one day: parsed, confirmed absent (404), or failed (retry later)
+DAY_OK = 'ok'
+DAY_MISSING = 'missing'
+DAY_ERROR = 'error'
+
+
+def notify_consumers(consumers: Sequence[Any], hook: str, *args):
+    """Call an optional consumer hook (commit_day, abort_day, end_day) where defined"""
+    for consumer in consumers:
+        if hasattr(consumer, hook):
+            getattr(consumer, hook)(*args)
+
+
+class UserStatsTable:
+    """
+    Running per-user fill statistics, one column array per stat
+
+    Each day is reduced with one factorize + bincount over its fills and
+    merged into the columns by index lookup, instead of filtering the day
+    once per user.
+    """
+    
+    def __init__(self):
+        self.addresses = pd.Index([], dtype=object)
+        self.total_trades = np.zeros(0, dtype=np.int64)
+        self.total_volume = np.zeros(0, dtype=np.float64)
+        self.first_trade_date = np.zeros(0, dtype='U8')
+        self.last_trade_date = np.zeros(0, dtype='U8')
+    
+    def __len__(self) -> int:
+        return len(self.addresses)
+    
+    def add_day(self, date_str: str, df: pd.DataFrame) -> int:
+        """
+        Merge one day of fills, or one chunk of it (days must be added oldest first)
+        
+        Args:
+            date_str: Date in YYYYMMDD format
+            df: The day's fills (needs 'user'; 'size' and 'px' for volume)
+            
+        Returns:
+            Number of distinct users in df
+        """
+        codes, users = pd.factorize(df['user'])
+        valid = codes >= 0
+        codes = codes[valid]
+        trades = np.bincount(codes, minlength=len(users))
+        if 'size' in df.columns and 'px' in df.columns:
+            notional = np.abs(df['size'].to_numpy(dtype=np.float64)) * df['px'].to_numpy(dtype=np.float64)
+            volume = np.bincount(codes, weights=np.nan_to_num(notional[valid]), minlength=len(users))
+        else:
+            volume = np.zeros(len(users))
+        
+        rows = self.addresses.get_indexer(users)
+        new = rows < 0
+        if new.any():
+            count = int(new.sum())
+            rows[new] = np.arange(len(self.addresses), len(self.addresses) + count)
+            self.addresses = self.addresses.append(pd.Index(users[new], dtype=object))
+            self.total_trades = np.concatenate([self.total_trades, np.zeros(count, dtype=np.int64)])
+            self.total_volume = np.concatenate([self.total_volume, np.zeros(count)])
+            self.first_trade_date = np.concatenate([self.first_trade_date, np.full(count, date_str, dtype='U8')])
+            self.last_trade_date = np.concatenate([self.last_trade_date, np.zeros(count, dtype='U8')])
+        
+        self.total_trades[rows] += trades
+        self.total_volume[rows] += volume
+        self.last_trade_date[rows] = date_str
+        return len(users)
+    
+    def merge(self, other: 'UserStatsTable'):
+        """Add another table's stats (covering days after this table's)"""
+        if not len(other):
+            return
+        rows = self.addresses.get_indexer(other.addresses)
+        new = rows < 0
+        if new.any():
+            count = int(new.sum())
+            rows[new] = np.arange(len(self.addresses), len(self.addresses) + count)
+            self.addresses = self.addresses.append(other.addresses[new])
+            self.total_trades = np.concatenate([self.total_trades, np.zeros(count, dtype=np.int64)])
+            self.total_volume = np.concatenate([self.total_volume, np.zeros(count)])
+            self.first_trade_date = np.concatenate([self.first_trade_date, other.first_trade_date[new]])
+            self.last_trade_date = np.concatenate([self.last_trade_date, np.zeros(count, dtype='U8')])
+        
+        self.total_trades[rows] += other.total_trades
+        self.total_volume[rows] += other.total_volume
+        self.last_trade_date[rows] = other.last_trade_date
+    
+    def to_records(self) -> Dict[str, Dict[str, Any]]:
+        """{address: user dict} in the scraper's output format"""
+        return {
+            address: {
+                'address': address,
+                'total_trades': trades,
+                'first_trade_date': first,
+                'last_trade_date': last,
+                'total_volume': volume
+            }
+            for address, trades, first, last, volume in zip(
+                self.addresses, self.total_trades.tolist(), self.first_trade_date.tolist(),
+                self.last_trade_date.tolist(), self.total_volume.tolist()
+            )
+        }
 
 
 class CSVScraper:
     """Scrape user addresses from historical CSV files"""
     
-    def __init__(self, builder_address: str, builder_name: str = "unknown"):
+    def __init__(self, builder_address: str, builder_name: str = "unknown", workers: int = None,
+                 use_cache: bool = True):
+        """
+        Args:
+            builder_address: Builder address
+            builder_name: Builder name for output
+            workers: Concurrent day downloads (default: config.CSV_DOWNLOAD_WORKERS)
+            use_cache: Reuse day files and 404s from the local fill cache
+        """
         self.builder_address = builder_address.lower()  # Must be lowercase for URLs
         self.builder_name = builder_name
         self.base_url = config.BUILDER_FILLS_BASE_URL
+        self.workers = workers or config.CSV_DOWNLOAD_WORKERS
         self.users_data = {}
+        self.cache = FillCache(self.builder_address) if use_cache else None
+        self.fetch_stats = Counter()
+        # {date_str: DAY_OK / DAY_MISSING / DAY_ERROR} of the last fetch, in date order
+        self.day_status: Dict[str, str] = {}
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+    
+    def _session(self) -> requests.Session:
+        """One HTTP session (connection pool) per download thread"""
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+    
+    def _download_days(self, dates: List[str]):
+        """
+        Download days concurrently, yielding (date_str, status, LZ4 bytes or None) in date order
+        
+        Workers only fetch (from the cache or the network); days are parsed
+        as a stream by the consumer. At most 2 x workers compressed days are
+        in flight or waiting to be consumed, which bounds memory.
+        """
+        pending = deque()
+        remaining = iter(dates)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for date_str in remaining:
+                pending.append((date_str, executor.submit(self._download_day, date_str)))
+                if len(pending) >= 2 * self.workers:
+                    break
+            while pending:
+                date_str, future = pending.popleft()
+                next_date = next(remaining, None)
+                if next_date is not None:
+                    pending.append((next_date, executor.submit(self._download_day, next_date)))
+                yield (date_str,) + future.result()
+        
+    def _count(self, outcome: str):
+        with self._stats_lock:
+            self.fetch_stats[outcome] += 1
+    
+    def _read_day(self, content: bytes, chunksize: int = None) -> Iterator[pd.DataFrame]:
+        """
+        Stream a day file as DataFrame chunks
+        
+        The LZ4 frame is decompressed incrementally straight into the CSV
+        parser, which keeps only FILL_COLUMNS with compact dtypes, so peak
+        memory is about one chunk rather than the whole day in several copies.
         
-    def _download_day(self, date_str: str) -> pd.DataFrame:
+        Args:
+            content: LZ4-compressed CSV bytes
+            chunksize: Rows per chunk (default: config.CSV_CHUNK_ROWS)
+        """
+        with lz4.frame.open(BytesIO(content), 'rb') as f:
+            yield from pd.read_csv(
+                f,
+                usecols=lambda column: column in FILL_COLUMNS,
+                dtype=FILL_DTYPES,
+                chunksize=chunksize or config.CSV_CHUNK_ROWS
+            )
+    
+    def _download_day(self, date_str: str) -> Tuple[str, Optional[bytes]]:
         """
-        Download and decompress a single day's CSV file
+        Download a single day's compressed CSV file
+        
+        Days already in the fill cache (or recently confirmed missing) are
+        served locally without a request.
         
         Args:
             date_str: Date in YYYYMMDD format
             
         Returns:
-            DataFrame with trade data or empty DataFrame
+            (DAY_OK, LZ4-compressed CSV bytes), (DAY_MISSING, None) for a 404,
+            or (DAY_ERROR, None) when the request failed
         """
+        if self.cache is not None:
+            content = self.cache.get(date_str)
+            if content is not None:
+                self._count('cached')
+                return DAY_OK, content
+            if self.cache.is_missing(date_str):
+                self._count('cached_missing')
+                return DAY_MISSING, None
+        
         url = f"{self.base_url}/{self.builder_address}/{date_str}.csv.lz4"
         
         try:
-            response = requests.get(url, timeout=config.TIMEOUT)
+            response = self._session().get(url, timeout=config.TIMEOUT)
             
             if response.status_code == 200:
-                # Decompress LZ4
-                decompressed = lz4.frame.decompress(response.content)
-                csv_data = decompressed.decode('utf-8')
-                
-                # Parse CSV
-                df = pd.read_csv(StringIO(csv_data))
-                return df
+                self._count('downloaded')
+                if self.cache is not None:
+                    self.cache.put(date_str, response.content)
+                return DAY_OK, response.content
             elif response.status_code == 404:
                 # No data for this day (expected for recent dates)
-                return pd.DataFrame()
+                self._count('missing')
+                if self.cache is not None:
+                    self.cache.mark_missing(date_str)
+                return DAY_MISSING, None
             elif response.status_code == 403:
                 print(f"    ⚠️  Access denied for {date_str}")
-                return pd.DataFrame()
+                self._count('failed')
+                return DAY_ERROR, None
             else:
                 print(f"    ⚠️  Failed to fetch {date_str}: Status {response.status_code}")
-                return pd.DataFrame()
+                self._count('failed')
+                return DAY_ERROR, None
                 
         except Exception as e:
             print(f"    ⚠️  Error fetching {date_str}: {e}")
-            return pd.DataFrame()
+            self._count('failed')
+            return DAY_ERROR, None
     
-    def fetch_historical_users(self, days_back: int = None) -> List[Dict[str, Any]]:
+    def fetch_historical_users(self, days_back: int = None, since: Optional[str] = None,
+                               consumers: Sequence[Any] = (), until: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Fetch all unique users from historical CSV files
         
         Args:
             days_back: Number of days to go back (default from config)
+            since: Only fetch days after this YYYYMMDD date (overrides days_back)
+            consumers: Objects with consume(date_str, df), called with every
+                chunk of fills in date order (e.g. a UserRegistry). Optional
+                hooks: commit_day(date_str) once all of a day's chunks
+                parsed, abort_day(date_str) when a later chunk failed (drop
+                the day's chunks), and end_day(date_str, status) for every
+                day, including missing and failed ones
+            until: Last day to fetch, YYYYMMDD (default: today; days_back
+                then counts back from it)
             
         Returns:
             List of user dicts with aggregated statistics
@@ -76,63 +292,71 @@ class CSVScraper:
         if days_back is None:
             days_back = config.DAYS_TO_FETCH
         
-        print(f"\n📥 Fetching historical CSV data for {self.builder_name}...")
-        print(f"  Looking back {days_back} days")
-        
         # Generate date range
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days_back)
+        end_date = datetime.strptime(until, "%Y%m%d") if until is not None else datetime.now()
+        if since is not None:
+            start_date = datetime.strptime(since, "%Y%m%d") + timedelta(days=1)
+            days_back = max((end_date - start_date).days, 0)
+        else:
+            start_date = end_date - timedelta(days=days_back)
+        
+        print(f"\n📥 Fetching historical CSV data for {self.builder_name}...")
+        if since is not None:
+            print(f"  Fetching days after {since}")
+        else:
+            print(f"  Looking back {days_back} days")
         
-        user_addresses = set()
-        user_stats = {}  # Track stats per user
+        table = UserStatsTable()
         
-        # Iterate through dates
+        # Dates to fetch, oldest first
+        dates = []
         current_date = start_date
+        while current_date <= end_date:
+            dates.append(current_date.strftime("%Y%m%d"))
+            current_date += timedelta(days=1)
         successful_days = 0
+        self.day_status = {}
         
+        # Downloads run concurrently; days are aggregated in date order
         with tqdm(total=days_back, desc="Downloading CSV files") as pbar:
-            while current_date <= end_date:
-                date_str = current_date.strftime("%Y%m%d")
-                
-                df = self._download_day(date_str)
-                
-                if not df.empty and 'user' in df.columns:
-                    # Extract unique users from this day
-                    day_users = set(df['user'].unique())
-                    user_addresses.update(day_users)
-                    
-                    # Aggregate stats per user
-                    for user in day_users:
-                        user_trades = df[df['user'] == user]
-                        
-                        if user not in user_stats:
-                            user_stats[user] = {
-                                'address': user,
-                                'total_trades': 0,
-                                'first_trade_date': date_str,
-                                'last_trade_date': date_str,
-                                'total_volume': 0.0
-                            }
-                        
-                        user_stats[user]['total_trades'] += len(user_trades)
-                        user_stats[user]['last_trade_date'] = date_str
-                        
-                        # Sum volume if available
-                        if 'size' in df.columns and 'px' in df.columns:
-                            volume = (user_trades['size'].abs() * user_trades['px']).sum()
-                            user_stats[user]['total_volume'] += float(volume)
-                    
-                    successful_days += 1
+            for date_str, status, content in self._download_days(dates):
+                if content is not None:
+                    # Chunks go to a staging table and to consumers as they
+                    # parse; the day is merged (committed) only if every chunk
+                    # parsed, otherwise consumers drop it (abort)
+                    staged = UserStatsTable()
+                    try:
+                        for df in self._read_day(content):
+                            if not df.empty and 'user' in df.columns:
+                                staged.add_day(date_str, df)
+                                for consumer in consumers:
+                                    consumer.consume(date_str, df)
+                    except Exception as e:
+                        print(f"    ⚠️  Error parsing {date_str}: {e}")
+                        status = DAY_ERROR
+                        notify_consumers(consumers, 'abort_day', date_str)
+                    else:
+                        table.merge(staged)
+                        notify_consumers(consumers, 'commit_day', date_str)
+                        successful_days += len(staged) > 0
                 
-                current_date += timedelta(days=1)
+                self.day_status[date_str] = status
+                notify_consumers(consumers, 'end_day', date_str, status)
                 pbar.update(1)
         
         print(f"\n  ✅ Successfully processed {successful_days}/{days_back} days")
-        print(f"  ✅ Found {len(user_addresses)} unique user addresses")
+        if self.cache is not None:
+            print(f"  📦 Cache: {self.fetch_stats['cached']} days reused, "
+                  f"{self.fetch_stats['cached_missing']} known missing, "
+                  f"{self.fetch_stats['downloaded'] + self.fetch_stats['missing'] + self.fetch_stats['failed']} requested")
+        failed = [d for d, status in self.day_status.items() if status == DAY_ERROR]
+        if failed:
+            print(f"  ⚠️  {len(failed)} days failed and will be retried: {', '.join(failed)}")
+        print(f"  ✅ Found {len(table)} unique user addresses")
         
         # Convert to list
-        users_list = list(user_stats.values())
-        self.users_data = user_stats
+        self.users_data = table.to_records()
+        users_list = list(self.users_data.values())
         
         return users_list
     
@@ -150,8 +374,7 @@ class CSVScraper:
             'users': list(self.users_data.values())
         }
         
-        with open(filepath, 'w') as f:
-            json.dump(output, f, indent=2)
+        write_dump(filepath, output)
         
         print(f"💾 Saved to {filepath}")
 
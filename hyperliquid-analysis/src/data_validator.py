@@ -2,12 +2,17 @@
 Data Validator
 Compare and validate results from different scraping methods
 """
-import json
 import sys
 import os
-from typing import Dict, List, Any, Set
+from typing import Dict, List, Any, Optional, Set, Union
 from datetime import datetime
 
+import numpy as np
+
+from .address_registry import AddressRegistry, compare_ids, normalize_address
+from .dump_io import write_dump
+from .json_stream import JSONArrayStream
+
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
 
@@ -15,26 +20,51 @@ import config
 class DataValidator:
     """Validate and merge user data from multiple sources"""
     
-    def __init__(self):
+    def __init__(self, registry: Optional[AddressRegistry] = None):
+        """
+        Args:
+            registry: Address registry for ID-based joins (default: the project registry)
+        """
         self.referral_data = None
         self.csv_data = None
         self.validation_report = {}
+        self.registry = registry if registry is not None else AddressRegistry.default()
         
+    def _load_users_file(self, filepath: str) -> Dict[str, Any]:
+        """Stream a users file (plain or .lz4) into its header fields plus users"""
+        stream = JSONArrayStream(filepath, 'users')
+        users = list(stream)
+        return {**stream.metadata, 'users': users}
+    
     def load_referral_data(self, filepath: str):
         """Load users from referral API output"""
-        with open(filepath, 'r') as f:
-            self.referral_data = json.load(f)
+        self.referral_data = self._load_users_file(filepath)
         print(f"✅ Loaded {len(self.referral_data['users'])} users from referral API")
     
     def load_csv_data(self, filepath: str):
         """Load users from CSV scraper output"""
-        with open(filepath, 'r') as f:
-            self.csv_data = json.load(f)
+        self.csv_data = self._load_users_file(filepath)
         print(f"✅ Loaded {len(self.csv_data['users'])} users from CSV method")
     
     def validate_ethereum_address(self, address: str) -> bool:
         """Check if address is valid Ethereum format"""
-        return address.startswith('0x') and len(address) == 42
+        try:
+            normalize_address(address)
+            return address.startswith('0x')
+        except ValueError:
+            return False
+    
+    def address_keys(self, users: List[Dict]) -> List[Union[int, str]]:
+        """
+        Join key per user: registry ID for valid addresses (case-insensitive),
+        the raw string for invalid ones
+        """
+        valid = [i for i, u in enumerate(users) if self.validate_ethereum_address(u['address'])]
+        keys: List[Union[int, str]] = [u['address'] for u in users]
+        ids = self.registry.ids([users[i]['address'] for i in valid])
+        for i, address_id in zip(valid, ids.tolist()):
+            keys[i] = address_id
+        return keys
     
     def compare_datasets(self) -> Dict[str, Any]:
         """
@@ -45,40 +75,43 @@ class DataValidator:
         """
         print("\n🔍 Comparing datasets...\n")
         
-        # Extract address sets
-        referral_addresses = set(u['address'] for u in self.referral_data['users'])
-        csv_addresses = set(u['address'] for u in self.csv_data['users'])
+        # Extract address IDs; invalid addresses are compared as strings
+        referral_keys = self.address_keys(self.referral_data['users'])
+        csv_keys = self.address_keys(self.csv_data['users'])
+        referral_ids = np.array([k for k in referral_keys if isinstance(k, int)], dtype=np.int64)
+        csv_ids = np.array([k for k in csv_keys if isinstance(k, int)], dtype=np.int64)
+        invalid_referral = set(k for k in referral_keys if isinstance(k, str))
+        invalid_csv = set(k for k in csv_keys if isinstance(k, str))
         
         # Calculate overlaps
-        intersection = referral_addresses & csv_addresses
-        only_referral = referral_addresses - csv_addresses
-        only_csv = csv_addresses - referral_addresses
-        total_unique = referral_addresses | csv_addresses
-        
-        # Data quality checks
-        invalid_referral = [a for a in referral_addresses if not self.validate_ethereum_address(a)]
-        invalid_csv = [a for a in csv_addresses if not self.validate_ethereum_address(a)]
+        overlap = compare_ids(referral_ids, csv_ids)
+        referral_count = len(np.unique(referral_ids)) + len(invalid_referral)
+        csv_count = len(np.unique(csv_ids)) + len(invalid_csv)
+        intersection = len(overlap['intersection']) + len(invalid_referral & invalid_csv)
+        only_referral = len(overlap['only_a']) + len(invalid_referral - invalid_csv)
+        only_csv = len(overlap['only_b']) + len(invalid_csv - invalid_referral)
+        total_unique = len(overlap['union']) + len(invalid_referral | invalid_csv)
         
         report = {
             'timestamp': datetime.now().isoformat(),
             'builder': self.referral_data['builder'],
             'counts': {
-                'referral_api': len(referral_addresses),
-                'csv_method': len(csv_addresses),
-                'intersection': len(intersection),
-                'only_in_referral': len(only_referral),
-                'only_in_csv': len(only_csv),
-                'total_unique': len(total_unique)
+                'referral_api': referral_count,
+                'csv_method': csv_count,
+                'intersection': intersection,
+                'only_in_referral': only_referral,
+                'only_in_csv': only_csv,
+                'total_unique': total_unique
             },
             'data_quality': {
                 'invalid_addresses_referral': len(invalid_referral),
                 'invalid_addresses_csv': len(invalid_csv),
                 'duplicate_check_passed': (
-                    len(referral_addresses) == len(self.referral_data['users']) and
-                    len(csv_addresses) == len(self.csv_data['users'])
+                    referral_count == len(self.referral_data['users']) and
+                    csv_count == len(self.csv_data['users'])
                 )
             },
-            'overlap_percentage': (len(intersection) / len(total_unique) * 100) if total_unique else 0
+            'overlap_percentage': (intersection / total_unique * 100) if total_unique else 0
         }
         
         # Print summary
@@ -106,25 +139,25 @@ class DataValidator:
         """
         print("\n🔄 Merging datasets...")
         
-        # Create lookup dict from referral data
-        referral_lookup = {u['address']: u for u in self.referral_data['users']}
-        csv_lookup = {u['address']: u for u in self.csv_data['users']}
+        # Create lookup dicts keyed by address ID
+        referral_lookup = dict(zip(self.address_keys(self.referral_data['users']), self.referral_data['users']))
+        csv_lookup = dict(zip(self.address_keys(self.csv_data['users']), self.csv_data['users']))
         
         # Merge
-        all_addresses = set(referral_lookup.keys()) | set(csv_lookup.keys())
+        all_keys = set(referral_lookup.keys()) | set(csv_lookup.keys())
         merged_users = []
         
-        for address in all_addresses:
-            user = {'address': address}
+        for key in all_keys:
+            user = {'address': (csv_lookup.get(key) or referral_lookup[key])['address']}
             
             # Add data from CSV if available
-            if address in csv_lookup:
-                user.update(csv_lookup[address])
+            if key in csv_lookup:
+                user.update(csv_lookup[key])
                 user['source'] = 'csv'
             
             # Enrich with referral API data if available
-            if address in referral_lookup:
-                ref_user = referral_lookup[address]
+            if key in referral_lookup:
+                ref_user = referral_lookup[key]
                 if 'source' in user:
                     user['source'] = 'both'
                 else:
@@ -145,8 +178,7 @@ class DataValidator:
         """Save validation report"""
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
         
-        with open(filepath, 'w') as f:
-            json.dump(self.validation_report, f, indent=2)
+        write_dump(filepath, self.validation_report)
         
         print(f"💾 Validation report saved to {filepath}")
     
@@ -163,8 +195,7 @@ class DataValidator:
             'users': merged_users
         }
         
-        with open(filepath, 'w') as f:
-            json.dump(output, f, indent=2)
+        write_dump(filepath, output)
         
         print(f"💾 Merged dataset saved to {filepath}")
 
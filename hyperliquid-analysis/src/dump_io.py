@@ -0,0 +1,149 @@
+"""
+Dump IO
+Read and write JSON dumps as plain files or LZ4-framed streams
+"""
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Union
+
+import lz4.frame
+
+
+LZ4_SUFFIX = '.lz4'
+
+# Decompressed size read/written per step when streaming
+CHUNK_SIZE = 1024 * 1024
+
+PathLike = Union[str, Path]
+
+
+def is_compressed(path: PathLike) -> bool:
+    return str(path).endswith(LZ4_SUFFIX)
+
+
+def dump_path(path: PathLike, compress: bool = True) -> Path:
+    """The on-disk name for a .json dump (adds .lz4 when compressing)"""
+    path = Path(path)
+    if compress and not is_compressed(path):
+        return path.with_name(path.name + LZ4_SUFFIX)
+    return path
+
+
+def dump_stem(path: PathLike) -> str:
+    """File name without .json/.csv and .lz4 (positions_raw_hypercore_20260209)"""
+    name = Path(path).name
+    if name.endswith(LZ4_SUFFIX):
+        name = name[:-len(LZ4_SUFFIX)]
+    return os.path.splitext(name)[0]
+
+
+def resolve_dump(path: PathLike) -> Path:
+    """Return path if it exists, else its .lz4 (or uncompressed) sibling"""
+    path = Path(path)
+    if path.exists():
+        return path
+    if is_compressed(path):
+        alternative = path.with_name(path.name[:-len(LZ4_SUFFIX)])
+    else:
+        alternative = path.with_name(path.name + LZ4_SUFFIX)
+    return alternative if alternative.exists() else path
+
+
+def open_dump(path: PathLike, mode: str = 'rt'):
+    """
+    Open a dump for streaming, decompressing .lz4 files transparently
+
+    Args:
+        path: File path; a .lz4 suffix selects LZ4 framing
+        mode: 'rt', 'rb', 'wt' or 'wb'
+
+    Returns:
+        File object
+    """
+    if is_compressed(path):
+        return lz4.frame.open(str(path), mode)
+    return open(path, mode)
+
+
+@contextmanager
+def atomic_open(path: PathLike, mode: str = 'wt'):
+    """
+    Open a dump for writing so readers only ever see complete files
+
+    Data goes to a temporary file beside path (LZ4-framed if path ends in
+    .lz4), which replaces path via os.replace() once the block exits
+    cleanly. On error the temporary file is removed and path is untouched.
+
+    Args:
+        path: Final file path
+        mode: 'wt' or 'wb' (newline='' is used for text so csv writers work)
+    """
+    path = Path(path)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    os.close(fd)
+    # mkstemp creates 0600; give the file the mode open() would have
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temp_path, 0o666 & ~umask)
+    try:
+        if is_compressed(path):
+            f = lz4.frame.open(temp_path, mode)
+        else:
+            f = open(temp_path, mode, newline='' if 't' in mode else None)
+        with f:
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def load_dump(path: PathLike) -> Any:
+    """Load a JSON dump (plain or .lz4)"""
+    with open_dump(path, 'rt') as f:
+        return json.load(f)
+
+
+def write_dump(path: PathLike, data: Any, indent: int = 2):
+    """Write a JSON dump atomically (LZ4-framed if path ends in .lz4)"""
+    with atomic_open(path, 'wt') as f:
+        json.dump(data, f, indent=indent)
+
+
+def compress_file(src: PathLike, dst: PathLike):
+    """Stream a plain file into an LZ4-framed file"""
+    with open(src, 'rb') as fin, atomic_open(dst, 'wb') as fout:
+        shutil.copyfileobj(fin, fout, CHUNK_SIZE)
+
+
+@contextmanager
+def plain_file(path: PathLike) -> Iterator[str]:
+    """
+    Path to an uncompressed copy of a dump, for readers that mmap
+
+    Plain files are used in place. .lz4 files are stream-decompressed into
+    a hidden temporary file on disk beside the dump (not in RAM-backed
+    /dev/shm), so mmap readers page it in and out like any file; the copy
+    is removed on exit.
+    """
+    if not is_compressed(path):
+        yield str(path)
+        return
+
+    path = Path(path)
+    try:
+        fd, temp_path = tempfile.mkstemp(prefix=f'.{path.name}.', suffix='.plain.tmp', dir=path.parent)
+    except OSError:
+        # Read-only snapshot directory: fall back to the system temp directory
+        fd, temp_path = tempfile.mkstemp(prefix='dump_', suffix='.json')
+    try:
+        with os.fdopen(fd, 'wb') as fout, lz4.frame.open(str(path), 'rb') as fin:
+            shutil.copyfileobj(fin, fout, CHUNK_SIZE)
+        yield temp_path
+    finally:
+        os.remove(temp_path)
@@ -0,0 +1,271 @@
+"""
+Fill Archive
+Partitioned Parquet storage of builder fills (builder/date), dictionary-encoded
+"""
+import os
+import sys
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .csv_scraper import DAY_ERROR, DAY_OK, FILL_COLUMNS, notify_consumers
+from .dump_io import atomic_open
+from .fill_cache import FillCache
+from .snapshot_archive import PART_FILE, partition_files, write_partition
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+# Repeated strings are dictionary-encoded; one file per builder x day
+FILLS_SCHEMA = pa.schema([
+    ('time', pa.timestamp('ms')),
+    ('user', pa.dictionary(pa.int32(), pa.string())),
+    ('coin', pa.dictionary(pa.int32(), pa.string())),
+    ('side', pa.dictionary(pa.int8(), pa.string())),
+    ('px', pa.float64()),
+    ('size', pa.float64()),
+    ('fee', pa.float64())
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('builder', pa.string()), ('date', pa.string())]),
+    flavor='hive'
+)
+
+# Last day (YYYYMMDD) up to which a builder's archive has no failed days
+HIGH_WATER_FILE = 'high_water_mark'
+
+# Rows per Parquet row group; days are sorted by (coin, user) so row group
+# min/max statistics let coin and user filters skip most groups
+ROW_GROUP_SIZE = 64 * 1024
+
+
+def _time_column(column: pd.Series) -> pd.Series:
+    """Fill times as UTC timestamps (epoch milliseconds or date strings)"""
+    if pd.api.types.is_numeric_dtype(column):
+        return pd.to_datetime(column, unit='ms')
+    return pd.to_datetime(column, utc=True, errors='coerce').dt.tz_localize(None)
+
+
+def fills_to_table(df: pd.DataFrame) -> pa.Table:
+    """Coerce a parsed fills frame to FILLS_SCHEMA, sorted by (coin, user, time)"""
+    df = df.reindex(columns=FILLS_SCHEMA.names)
+    frame = pd.DataFrame({
+        'time': _time_column(df['time']),
+        'user': df['user'].astype(object).str.lower(),
+        'coin': df['coin'].astype(object),
+        'side': df['side'].astype(object),
+        'px': pd.to_numeric(df['px'], errors='coerce'),
+        'size': pd.to_numeric(df['size'], errors='coerce'),
+        'fee': pd.to_numeric(df['fee'], errors='coerce')
+    })
+    frame = frame.sort_values(['coin', 'user', 'time'], kind='stable', ignore_index=True)
+    return pa.Table.from_pandas(frame, schema=FILLS_SCHEMA, preserve_index=False)
+
+
+class FillArchive:
+    """
+    Columnar archive of builder fills
+
+    Layout: <root>/fills/builder=<b>/date=<YYYYMMDD>/part-0.parquet with
+    FILLS_SCHEMA columns. Readers prune partitions from directory names,
+    skip row groups by coin/user statistics and read only requested
+    columns, so no CSV is parsed again.
+
+    A CSVScraper consumer: chunks of a day are buffered and the day is
+    written when the next day starts or on flush(). Like UserRegistry it
+    keeps a high-water mark, the last day before the first failed or
+    unfinished one, so a resumed run fetches every day after it again.
+    """
+
+    def __init__(self, builder: Optional[str] = None, root: Optional[str] = None, compression: str = 'zstd'):
+        """
+        Args:
+            builder: Builder the consume() hook archives for
+            root: Archive directory (default: config.ARCHIVE_DIR under the project)
+            compression: Parquet compression codec
+        """
+        if root is None:
+            project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            root = os.path.join(project_dir, config.ARCHIVE_DIR)
+        self.builder = builder
+        self.base = os.path.join(str(root), 'fills')
+        self.compression = compression
+        self._day: Optional[str] = None
+        self._chunks: List[pd.DataFrame] = []
+        # Last day ended without a failed or unfinished day before it
+        self._confirmed = ''
+        self._stopped = False
+
+    def _partition_dir(self, builder: str, date: str) -> str:
+        return os.path.join(self.base, f'builder={builder}', f'date={date}')
+
+    def write_day(self, builder: str, date: str, fills: pd.DataFrame) -> int:
+        """
+        Archive one day of fills (replaces an existing partition)
+
+        Args:
+            builder: Builder name
+            date: Fill date (YYYYMMDD)
+            fills: Parsed fills (FILL_COLUMNS; missing ones are stored as null)
+
+        Returns:
+            Rows written
+        """
+        table = fills_to_table(fills)
+        directory = self._partition_dir(builder, date)
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        write_partition(directory, table, compression=self.compression, row_group_size=ROW_GROUP_SIZE)
+        return table.num_rows
+
+    def consume(self, date_str: str, df: pd.DataFrame):
+        """
+        Buffer fills of one day (or a chunk of it), CSVScraper consumer hook
+
+        Days not over yet (UTC) are ignored.
+        """
+        if self.builder is None:
+            raise ValueError("FillArchive needs a builder to consume fills")
+        if not FillCache.is_final(date_str):
+            return
+        if self._day is not None and date_str != self._day:
+            self.flush()
+        self._day = date_str
+        self._chunks.append(df[[c for c in FILL_COLUMNS if c in df.columns]])
+
+    def flush(self):
+        """Write the buffered day and move the high-water mark to the last confirmed day"""
+        if self._day is not None:
+            self.write_day(self.builder, self._day, pd.concat(self._chunks, ignore_index=True))
+            self._day = None
+            self._chunks = []
+        if self.builder is not None and self._confirmed > (self.high_water_mark(self.builder) or ''):
+            path = os.path.join(self.base, f'builder={self.builder}', HIGH_WATER_FILE)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with atomic_open(path) as f:
+                f.write(self._confirmed)
+
+    def end_day(self, date_str: str, status: str):
+        """
+        Advance past a fetched day, CSVScraper consumer hook
+
+        Args:
+            date_str: Date in YYYYMMDD format
+            status: csv_scraper DAY_OK, DAY_MISSING or DAY_ERROR
+        """
+        if status == DAY_ERROR or not FillCache.is_final(date_str):
+            self._stopped = True
+        if not self._stopped and status == DAY_OK:
+            self._confirmed = max(self._confirmed, date_str)
+
+    def abort_day(self, date_str: str):
+        """Drop the buffered day, CSVScraper consumer hook"""
+        if self._day == date_str:
+            self._day = None
+            self._chunks = []
+
+    def days(self, builder: str) -> List[str]:
+        """Archived days (YYYYMMDD) of a builder"""
+        directory = os.path.join(self.base, f'builder={builder}')
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            name.split('=', 1)[1] for name in os.listdir(directory)
+            if name.startswith('date=') and not name.endswith('.tmp')
+            and os.path.exists(os.path.join(directory, name, PART_FILE))
+        )
+
+    def high_water_mark(self, builder: str) -> Optional[str]:
+        """Last day (YYYYMMDD) with no failed day at or before it, None if unknown"""
+        path = os.path.join(self.base, f'builder={builder}', HIGH_WATER_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return f.read().strip() or None
+
+    def has_day(self, builder: str, date: str) -> bool:
+        return os.path.exists(os.path.join(self._partition_dir(builder, date), PART_FILE))
+
+    def scan(
+        self,
+        columns: Optional[Sequence[str]] = None,
+        builders: Optional[Sequence[str]] = None,
+        date_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
+        coins: Optional[Sequence[str]] = None,
+        users: Optional[Sequence[str]] = None,
+        where: Optional[ds.Expression] = None
+    ) -> pd.DataFrame:
+        """
+        Read archived fills, scanning only matching partitions, row groups and columns
+
+        Args:
+            columns: Columns to read, may include builder/date (default: all)
+            builders: Builder names to include (default: all)
+            date_range: Inclusive (start, end) dates; either end may be None
+            coins: Coins to include
+            users: User addresses to include (any case)
+            where: Extra pyarrow.dataset filter
+
+        Returns:
+            DataFrame with the requested columns (user/coin/side as categoricals)
+        """
+        files = partition_files(self.base) if os.path.isdir(self.base) else []
+        if not files:
+            names = list(columns) if columns else FILLS_SCHEMA.names + ['builder', 'date']
+            return pd.DataFrame(columns=names)
+
+        # Explicit file list: staging and leftover .tmp directories are not partitions
+        dataset = ds.dataset(files, format='parquet', partitioning=PARTITIONING, partition_base_dir=self.base)
+
+        conditions = []
+        if builders:
+            conditions.append(ds.field('builder').isin(list(builders)))
+        if date_range:
+            start, end = date_range
+            if start:
+                conditions.append(ds.field('date') >= start)
+            if end:
+                conditions.append(ds.field('date') <= end)
+        if coins:
+            conditions.append(ds.field('coin').isin(list(coins)))
+        if users:
+            conditions.append(ds.field('user').isin([u.lower() for u in users]))
+        if where is not None:
+            conditions.append(where)
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        return dataset.to_table(columns=list(columns) if columns else None, filter=expression).to_pandas()
+
+    def feed(self, builder: str, consumers: Iterable, start: Optional[str] = None, end: Optional[str] = None) -> int:
+        """
+        Replay archived days into CSVScraper consumers (consume(date_str, df))
+
+        Args:
+            builder: Builder name
+            consumers: e.g. UserRegistry, FillFeatures, FillPositionBook
+            start: First day (inclusive)
+            end: Last day (inclusive)
+
+        Returns:
+            Number of days fed
+        """
+        consumers = list(consumers)
+        days = [d for d in self.days(builder) if (start is None or d >= start) and (end is None or d <= end)]
+        for date in days:
+            table = pq.read_table(os.path.join(self._partition_dir(builder, date), PART_FILE))
+            df = table.to_pandas()
+            # Back to file order so consumers see fills chronologically
+            df = df.iloc[np.argsort(df['time'].to_numpy(), kind='stable')].reset_index(drop=True)
+            for consumer in consumers:
+                consumer.consume(date, df)
+            notify_consumers(consumers, 'commit_day', date)
+            notify_consumers(consumers, 'end_day', date, DAY_OK)
+        return len(days)
@@ -0,0 +1,97 @@
+"""
+Fill Cache
+Local store of downloaded builder_fills day files with negative caching
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+class FillCache:
+    """
+    Downloaded day files of one builder, kept exactly as served (LZ4)
+
+    Layout under <root>/builder_fills/<builder address>/:
+        <YYYYMMDD>.csv.lz4   a published day; never changes, kept forever
+        <YYYYMMDD>.missing   a confirmed 404; its mtime is when it was checked
+
+    Missing markers expire after negative_ttl seconds, so unpublished recent
+    days are retried on a later run. One file per day means concurrent
+    download threads never share state.
+    """
+
+    def __init__(self, builder_address: str, root: Optional[str] = None, negative_ttl: Optional[int] = None):
+        """
+        Args:
+            builder_address: Builder address (lowercase)
+            root: Cache directory (default: config.CACHE_DIR under the project)
+            negative_ttl: Seconds a 404 is trusted (default: config.FILL_CACHE_NEGATIVE_TTL)
+        """
+        if root is None:
+            project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            root = os.path.join(project_dir, config.CACHE_DIR)
+        self.directory = os.path.join(str(root), 'builder_fills', builder_address.lower())
+        self.negative_ttl = config.FILL_CACHE_NEGATIVE_TTL if negative_ttl is None else negative_ttl
+
+    def _path(self, date_str: str, suffix: str) -> str:
+        return os.path.join(self.directory, f'{date_str}{suffix}')
+
+    @staticmethod
+    def is_final(date_str: str) -> bool:
+        """True for days that are over (UTC), whose files can no longer change"""
+        return date_str < datetime.now(timezone.utc).strftime('%Y%m%d')
+
+    def get(self, date_str: str) -> Optional[bytes]:
+        """Cached LZ4 bytes of a day, or None"""
+        try:
+            with open(self._path(date_str, '.csv.lz4'), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, date_str: str, content: bytes) -> bool:
+        """
+        Store a downloaded day file (only for finished days)
+
+        Returns:
+            True if it was cached
+        """
+        if not self.is_final(date_str):
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+        # Write-then-rename so an interrupted run never leaves a truncated day
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, self._path(date_str, '.csv.lz4'))
+        self.clear_missing(date_str)
+        return True
+
+    def is_missing(self, date_str: str) -> bool:
+        """True if the day 404'd less than negative_ttl seconds ago"""
+        try:
+            checked = os.path.getmtime(self._path(date_str, '.missing'))
+        except FileNotFoundError:
+            return False
+        return time.time() - checked < self.negative_ttl
+
+    def mark_missing(self, date_str: str):
+        """Record a 404 for a day (refreshes the check time)"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(date_str, '.missing')
+        with open(path, 'w'):
+            pass
+        os.utime(path)
+
+    def clear_missing(self, date_str: str):
+        """Forget a recorded 404"""
+        try:
+            os.remove(self._path(date_str, '.missing'))
+        except FileNotFoundError:
+            pass
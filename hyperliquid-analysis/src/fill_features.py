@@ -0,0 +1,261 @@
+"""
+Fill Features
+Per-user x coin x day activity arrays aggregated from builder fills
+"""
+import json
+import os
+import sys
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .address_registry import AddressRegistry, remap_ids
+from .coin_series import assign_coin_ids
+from .dump_io import atomic_open
+from .fill_cache import FillCache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+# One record per user x coin with fills that day, sorted by (user, coin)
+FEATURE_DTYPE = np.dtype([
+    ('user', '<i8'),
+    ('coin', '<u4'),
+    ('trades', '<u4'),
+    ('volume', '<f8'),
+    ('net_size', '<f8'),
+    ('fees', '<f8'),
+])
+
+FEATURE_FIELDS = FEATURE_DTYPE.names[2:]
+
+COINS_FILE = 'coins.json'
+
+# Coin IDs occupy the low bits of the (user, coin) sort key
+COIN_BITS = 20
+
+
+class FillFeatures:
+    """
+    Daily activity features of one builder's users
+
+    Layout under <root>/<builder>/:
+        <YYYYMMDD>.npy   FEATURE_DTYPE records of one day (memory-mappable)
+        coins.json       coin names; a record's 'coin' is an index into it
+
+    'user' is the AddressRegistry ID. Only user x coin pairs that traded are
+    stored: a user trades a handful of coins on few days, so a dense
+    users x coins x days cube would be almost all zeros. Each day is sorted
+    by (user, coin).
+
+    A CSVScraper consumer: chunks of a day are reduced with bincount as they
+    arrive and the day is written when the next day starts or on flush().
+    """
+
+    def __init__(self, builder: str, registry: Optional[AddressRegistry] = None, root: Optional[str] = None):
+        """
+        Args:
+            builder: Builder name
+            registry: Address registry for user IDs (default: the project registry;
+                saved before each day is written, so stored IDs are final)
+            root: Features directory (default: config.FEATURES_DIR under the project)
+        """
+        if root is None:
+            project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            root = os.path.join(project_dir, config.FEATURES_DIR)
+        self.builder = builder
+        self.registry = registry if registry is not None else AddressRegistry.default()
+        self.directory = os.path.join(str(root), builder)
+        self.coins_path = os.path.join(self.directory, COINS_FILE)
+        self._day: Optional[str] = None
+        self._parts: List[np.ndarray] = []
+
+    def coins(self) -> List[str]:
+        """Coin names, indexed by record 'coin' ID"""
+        if not os.path.exists(self.coins_path):
+            return []
+        with open(self.coins_path, 'r') as f:
+            return json.load(f)
+
+    def _coin_ids(self, names: Sequence[str]) -> np.ndarray:
+        return np.array(assign_coin_ids(self.coins_path, names), dtype=np.int64)
+
+    def _user_ids(self, addresses: Sequence[str]) -> np.ndarray:
+        """Registry IDs, -1 for malformed addresses"""
+        ids = np.full(len(addresses), -1, dtype=np.int64)
+        valid = [i for i, address in enumerate(addresses)
+                 if isinstance(address, str) and len(address) == 42 and address[:2] in ('0x', '0X')]
+        try:
+            ids[valid] = self.registry.ids([addresses[i] for i in valid])
+        except ValueError:
+            for i in valid:
+                try:
+                    ids[i] = self.registry.id(addresses[i])
+                except ValueError:
+                    pass
+        return ids
+
+    @staticmethod
+    def _reduce(keys: np.ndarray, trades: np.ndarray, volume: np.ndarray,
+                net_size: np.ndarray, fees: np.ndarray) -> np.ndarray:
+        """Sum values per (user, coin) key into sorted FEATURE_DTYPE records"""
+        unique, inverse = np.unique(keys, return_inverse=True)
+        records = np.zeros(len(unique), dtype=FEATURE_DTYPE)
+        records['user'] = unique >> COIN_BITS
+        records['coin'] = unique & ((1 << COIN_BITS) - 1)
+        records['trades'] = np.bincount(inverse, weights=trades, minlength=len(unique))
+        records['volume'] = np.bincount(inverse, weights=volume, minlength=len(unique))
+        records['net_size'] = np.bincount(inverse, weights=net_size, minlength=len(unique))
+        records['fees'] = np.bincount(inverse, weights=fees, minlength=len(unique))
+        return records
+
+    def consume(self, date_str: str, df: pd.DataFrame):
+        """
+        Aggregate fills of one day (or a chunk of it), CSVScraper consumer hook
+
+        Days not over yet (UTC) are ignored.
+
+        Args:
+            date_str: Date in YYYYMMDD format
+            df: Fills with 'user' and 'coin'; 'size', 'px', 'side' and 'fee' when present
+        """
+        if not FillCache.is_final(date_str) or 'coin' not in df.columns:
+            return
+        if self._day is not None and date_str != self._day:
+            self.flush()
+        self._day = date_str
+
+        user_codes, users = pd.factorize(df['user'])
+        coin_codes, coins = pd.factorize(df['coin'])
+        if not len(users) or not len(coins):
+            return
+        user_ids = self._user_ids(list(users))[user_codes]
+        coin_ids = self._coin_ids(list(coins))[coin_codes]
+        valid = (user_codes >= 0) & (coin_codes >= 0) & (user_ids >= 0)
+
+        n = len(df)
+        size = df['size'].to_numpy(dtype=np.float64) if 'size' in df.columns else np.zeros(n)
+        px = df['px'].to_numpy(dtype=np.float64) if 'px' in df.columns else np.zeros(n)
+        if 'side' in df.columns:
+            # Hyperliquid sides: B = buy, A = sell
+            side = df['side'].astype(object).to_numpy()
+            signed = np.abs(size) * np.where(side == 'B', 1.0, np.where(side == 'A', -1.0, 0.0))
+        else:
+            signed = size
+        fees = df['fee'].to_numpy(dtype=np.float64) if 'fee' in df.columns else np.zeros(n)
+
+        keys = (user_ids[valid] << COIN_BITS) | coin_ids[valid]
+        self._parts.append(self._reduce(
+            keys,
+            np.ones(len(keys)),
+            np.nan_to_num(np.abs(size[valid]) * px[valid]),
+            np.nan_to_num(signed[valid]),
+            np.nan_to_num(fees[valid])
+        ))
+
+    def flush(self):
+        """Write the day being aggregated (call after the last chunk)"""
+        if self._day is None:
+            return
+        parts = np.concatenate(self._parts) if self._parts else np.zeros(0, dtype=FEATURE_DTYPE)
+        if self.registry.path is not None:
+            # IDs registered this run may move when another writer saved first
+            parts['user'] = remap_ids(parts['user'], self.registry.save())
+        records = self._reduce(
+            (parts['user'] << COIN_BITS) | parts['coin'].astype(np.int64),
+            parts['trades'], parts['volume'], parts['net_size'], parts['fees']
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        with atomic_open(os.path.join(self.directory, f'{self._day}.npy'), 'wb') as f:
+            np.save(f, records)
+        self._day = None
+        self._parts = []
+
+    def abort_day(self, date_str: str):
+        """Drop the day being aggregated, CSVScraper consumer hook"""
+        if self._day == date_str:
+            self._day = None
+            self._parts = []
+
+    def days(self, start: Optional[str] = None, end: Optional[str] = None) -> List[str]:
+        """Stored days (YYYYMMDD) between start and end inclusive"""
+        if not os.path.isdir(self.directory):
+            return []
+        days = sorted(name[:-4] for name in os.listdir(self.directory)
+                      if name.endswith('.npy') and name[:-4].isdigit())
+        return [d for d in days if (start is None or d >= start) and (end is None or d <= end)]
+
+    def load_day(self, date_str: str) -> np.ndarray:
+        """One day's records (memory-mapped)"""
+        return np.load(os.path.join(self.directory, f'{date_str}.npy'), mmap_mode='r')
+
+    def select(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        addresses: Optional[Sequence[str]] = None,
+        coins: Optional[Sequence[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Feature rows over a date range, optionally for some users and coins
+
+        Args:
+            start: First day (YYYYMMDD, inclusive)
+            end: Last day (YYYYMMDD, inclusive)
+            addresses: Only these users
+            coins: Only these coins
+
+        Returns:
+            DataFrame with date, address, coin and FEATURE_FIELDS columns
+        """
+        coin_names = self.coins()
+        user_ids = None
+        if addresses is not None:
+            user_ids = np.unique(self.registry.lookup_many(list(addresses)))
+            user_ids = user_ids[user_ids >= 0]
+        coin_ids = None
+        if coins is not None:
+            coin_ids = [coin_names.index(c) for c in coins if c in coin_names]
+
+        frames = []
+        for day in self.days(start, end):
+            records = self.load_day(day)
+            if user_ids is not None:
+                records = records[np.isin(records['user'], user_ids)]
+            if coin_ids is not None:
+                records = records[np.isin(records['coin'], coin_ids)]
+            if len(records):
+                frame = pd.DataFrame(np.asarray(records))
+                frame.insert(0, 'date', day)
+                frames.append(frame)
+
+        if not frames:
+            return pd.DataFrame(columns=['date', 'address', 'coin', *FEATURE_FIELDS])
+        result = pd.concat(frames, ignore_index=True)
+        result['coin'] = [coin_names[i] for i in result['coin']]
+        result.insert(1, 'address', self.registry.addresses(result.pop('user').to_numpy()))
+        return result
+
+    def active_users(self, start: Optional[str] = None, end: Optional[str] = None) -> np.ndarray:
+        """Sorted registry IDs of users with fills between start and end"""
+        ids = [np.unique(self.load_day(day)['user']) for day in self.days(start, end)]
+        return np.unique(np.concatenate(ids)) if ids else np.zeros(0, dtype=np.int64)
+
+    def new_traders(self, start: str, end: Optional[str] = None) -> List[str]:
+        """
+        Users whose first stored fill day falls between start and end
+
+        Args:
+            start: First day of the cohort window (YYYYMMDD)
+            end: Last day of the window (default: latest stored day)
+
+        Returns:
+            Lowercase addresses
+        """
+        days = self.days()
+        earlier = [day for day in days if day < start]
+        seen = self.active_users(earlier[0], earlier[-1]) if earlier else np.zeros(0, dtype=np.int64)
+        cohort = np.setdiff1d(self.active_users(start, end), seen, assume_unique=True)
+        return self.registry.addresses(cohort)
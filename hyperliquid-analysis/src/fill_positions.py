@@ -0,0 +1,261 @@
+"""
+Fill Positions
+Builder-attributed positions, entry prices and realized PnL replayed from fills
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .fill_cache import FillCache
+
+
+# Positions smaller than this are treated as flat (float residue of cumsums)
+FLAT_EPSILON = 1e-9
+
+STATE_COLUMNS = ['position', 'avg_entry', 'realized_pnl', 'fills', 'last_fill_date']
+
+
+def coin_market(coin: str) -> str:
+    """Market of a fill coin: 'hip3' for dex:COIN, 'spot' for @N or BASE/QUOTE, else 'hypercore'"""
+    if ':' in coin:
+        return 'hip3'
+    if coin.startswith('@') or '/' in coin:
+        return 'spot'
+    return 'hypercore'
+
+
+class FillPositionBook:
+    """
+    Net position per (user, coin) from builder fills alone
+
+    Days are replayed in order; each day is one vectorized pass: fills are
+    sorted by (user, coin, time) and running positions are grouped
+    cumulative sums of signed sizes. Entry prices are average cost: within
+    a "leg" (fills from the position opening until it goes flat or flips
+    side) the cost basis grows by size x price on opens and scales with the
+    position on reductions, a linear recurrence solved with grouped
+    cumulative products and sums. Realized PnL is the closed size times
+    (price - entry before the fill). Positions carried from the previous
+    day enter the pass as one opening fill at their entry price.
+
+    Only builder-routed fills are seen, so positions opened or changed
+    without the builder (or before the first replayed day) are not
+    reflected; compare() measures that gap against API snapshots.
+    """
+
+    def __init__(self, until: Optional[str] = None):
+        """
+        Args:
+            until: Ignore fills of days after this date (YYYYMMDD)
+        """
+        self.until = until
+        self.state = pd.DataFrame(
+            {column: pd.Series(dtype=dtype) for column, dtype in zip(
+                STATE_COLUMNS, ['float64', 'float64', 'float64', 'int64', 'object']
+            )},
+            index=pd.MultiIndex.from_arrays([[], []], names=['address', 'coin'])
+        )
+        self.last_date: Optional[str] = None
+        self._day: Optional[str] = None
+        self._chunks: List[pd.DataFrame] = []
+
+    def consume(self, date_str: str, df: pd.DataFrame):
+        """
+        Buffer fills of one day (or a chunk of it), CSVScraper consumer hook
+
+        A day is replayed once the next day starts or on flush(). Days not
+        over yet (UTC) and days after until are ignored.
+
+        Args:
+            date_str: Date in YYYYMMDD format
+            df: Fills with 'user', 'coin', 'side', 'px', 'size' (and 'time' for ordering)
+        """
+        if not FillCache.is_final(date_str) or (self.until is not None and date_str > self.until):
+            return
+        if not {'user', 'coin', 'side', 'px', 'size'} <= set(df.columns):
+            return
+        if self._day is not None and date_str != self._day:
+            self.flush()
+        self._day = date_str
+        columns = [c for c in ('time', 'user', 'coin', 'side', 'px', 'size') if c in df.columns]
+        self._chunks.append(df[columns])
+
+    def flush(self):
+        """Replay the buffered day"""
+        if self._day is None:
+            return
+        self.apply_day(self._day, pd.concat(self._chunks, ignore_index=True))
+        self._day = None
+        self._chunks = []
+
+    def abort_day(self, date_str: str):
+        """Drop the buffered day, CSVScraper consumer hook"""
+        if self._day == date_str:
+            self._day = None
+            self._chunks = []
+
+    def apply_day(self, date_str: str, fills: pd.DataFrame):
+        """
+        Replay one whole day of fills on top of the current state
+
+        Args:
+            date_str: Date in YYYYMMDD format (days must be applied in order)
+            fills: The day's fills
+        """
+        side = fills['side'].astype(object).to_numpy()
+        # Hyperliquid sides: B = buy, A = sell
+        sign = np.where(side == 'B', 1.0, np.where(side == 'A', -1.0, 0.0))
+        day = pd.DataFrame({
+            'address': fills['user'].astype(object).str.lower().to_numpy(),
+            'coin': fills['coin'].astype(object).to_numpy(),
+            'qty': np.abs(fills['size'].to_numpy(dtype=np.float64)) * sign,
+            'px': fills['px'].to_numpy(dtype=np.float64),
+            'time': fills['time'].to_numpy() if 'time' in fills.columns else np.zeros(len(fills)),
+            'carry': False
+        })
+        day = day[(day['qty'] != 0) & day['address'].notna() & day['coin'].notna() & day['px'].notna()]
+        if day.empty:
+            self.last_date = date_str
+            return
+
+        # Open positions of traded (user, coin) pairs enter as an opening fill
+        touched = pd.MultiIndex.from_frame(day[['address', 'coin']].drop_duplicates())
+        carried = self.state.reindex(touched).dropna(subset=['position'])
+        carried = carried[carried['position'].abs() > FLAT_EPSILON]
+        opening = pd.DataFrame({
+            'address': carried.index.get_level_values('address'),
+            'coin': carried.index.get_level_values('coin'),
+            'qty': carried['position'].to_numpy(),
+            'px': carried['avg_entry'].to_numpy(),
+            'time': day['time'].min(),
+            'carry': True
+        })
+        frames = [opening, day] if len(opening) else [day]
+        replay = pd.concat(frames, ignore_index=True)
+        # Carried rows first, then fills by time (stable keeps file order for ties)
+        replay['order'] = np.where(replay['carry'], 0, 1)
+        replay = replay.sort_values(['address', 'coin', 'order', 'time'], kind='stable', ignore_index=True)
+
+        group = replay.groupby(['address', 'coin'], sort=False).ngroup().to_numpy()
+        qty = replay['qty'].to_numpy()
+        px = replay['px'].to_numpy()
+
+        after = pd.Series(qty).groupby(group).cumsum().to_numpy().copy()
+        after[np.abs(after) < FLAT_EPSILON] = 0.0
+        before = after - qty
+        before[np.abs(before) < FLAT_EPSILON] = 0.0
+
+        flips = (before != 0) & (after != 0) & (np.sign(after) != np.sign(before))
+        reducing = (before != 0) & (np.sign(qty) != np.sign(before))
+        closed = np.where(reducing, np.minimum(np.abs(qty), np.abs(before)), 0.0)
+        opened = np.where(before == 0, np.abs(after), np.where(flips, np.abs(after), np.where(reducing, 0.0, np.abs(qty))))
+
+        # Legs start from flat or on a flip. Cost basis per leg:
+        # basis[k] = scale[k] * basis[k-1] + added[k], with scale = |after| / |before|
+        # on reductions (1 otherwise) and added = opened size x price
+        leg = np.cumsum((before == 0) | flips)
+        partial = reducing & ~flips & (after != 0)
+        scale = np.ones(len(qty))
+        scale[partial] = np.abs(after[partial]) / np.abs(before[partial])
+        scale_product = pd.Series(scale).groupby(leg).cumprod().to_numpy()
+        basis = scale_product * pd.Series(opened * px / scale_product).groupby(leg).cumsum().to_numpy()
+        entry = np.divide(basis, np.abs(after), out=np.zeros(len(basis)), where=after != 0)
+
+        # Entry in force before each fill: the previous row's, within the pair
+        prior = np.roll(entry, 1)
+        first = np.r_[True, group[1:] != group[:-1]]
+        prior[first] = 0.0
+        realized = closed * (px - prior) * np.sign(before)
+
+        replay['after'] = after
+        replay['entry'] = np.where(after != 0, entry, 0.0)
+        replay['realized'] = np.where(replay['carry'], 0.0, realized)
+        replay['fill'] = ~replay['carry']
+        pairs = replay.groupby(['address', 'coin'], sort=False)
+        result = pd.DataFrame({
+            'position': pairs['after'].last(),
+            'avg_entry': pairs['entry'].last(),
+            'realized_pnl': pairs['realized'].sum(),
+            'fills': pairs['fill'].sum().astype(np.int64)
+        })
+
+        previous = self.state.reindex(result.index)
+        result['realized_pnl'] += previous['realized_pnl'].fillna(0.0)
+        result['fills'] += previous['fills'].fillna(0).astype(np.int64)
+        result['last_fill_date'] = date_str
+
+        unchanged = self.state[~self.state.index.isin(result.index)]
+        self.state = pd.concat([unchanged, result[STATE_COLUMNS]])
+        self.last_date = date_str
+
+    def positions(self, open_only: bool = True) -> pd.DataFrame:
+        """
+        Current book
+
+        Args:
+            open_only: Drop flat (user, coin) pairs
+
+        Returns:
+            DataFrame with address, coin, direction, size and STATE_COLUMNS
+        """
+        book = self.state.reset_index()
+        if open_only:
+            book = book[book['position'].abs() > FLAT_EPSILON]
+        book.insert(2, 'direction', np.where(book['position'] > 0, 'LONG', np.where(book['position'] < 0, 'SHORT', 'FLAT')))
+        book.insert(3, 'size', book['position'].abs())
+        return book.sort_values(['address', 'coin'], ignore_index=True)
+
+    def compare(self, api_positions: List[Dict], tolerance: float = 1e-6, market: Optional[str] = None) -> Dict:
+        """
+        Cross-check the book against an API snapshot of the same users
+
+        Args:
+            api_positions: Position rows with address (or user_address), coin,
+                direction and size, e.g. SnapshotDB.positions()
+            tolerance: Relative size difference still counted as a match
+            market: Market of the snapshot ('hypercore' or 'hip3'); book
+                positions in other markets are left out (default: all)
+
+        Returns:
+            Dict with counts (matched, size_mismatch, direction_mismatch,
+            only_in_fills, only_in_api) and the mismatching rows
+        """
+        api = pd.DataFrame([{
+            'address': (row.get('address') or row.get('user_address')).lower(),
+            'coin': row['coin'],
+            'api_position': float(row['size']) * (1 if row['direction'] == 'LONG' else -1)
+        } for row in api_positions], columns=['address', 'coin', 'api_position'])
+        api = api.groupby(['address', 'coin'], as_index=False)['api_position'].sum()
+
+        book = self.positions()[['address', 'coin', 'position']]
+        if market is not None:
+            book = book[book['coin'].map(coin_market) == market]
+        merged = book.merge(api, on=['address', 'coin'], how='outer')
+        fills_side = merged['position'].fillna(0.0)
+        api_side = merged['api_position'].fillna(0.0)
+
+        only_fills = merged['api_position'].isna()
+        only_api = merged['position'].isna()
+        both = ~only_fills & ~only_api
+        direction_mismatch = both & (np.sign(fills_side) != np.sign(api_side))
+        size_mismatch = both & ~direction_mismatch & (
+            (fills_side - api_side).abs() > tolerance * np.maximum(fills_side.abs(), api_side.abs())
+        )
+        matched = both & ~direction_mismatch & ~size_mismatch
+        mismatches = merged[~matched].rename(columns={'position': 'fills_position'})
+
+        return {
+            'as_of': self.last_date,
+            'market': market,
+            'counts': {
+                'fills_positions': int((~only_api).sum()),
+                'api_positions': int((~only_fills).sum()),
+                'matched': int(matched.sum()),
+                'size_mismatch': int(size_mismatch.sum()),
+                'direction_mismatch': int(direction_mismatch.sum()),
+                'only_in_fills': int(only_fills.sum()),
+                'only_in_api': int(only_api.sum())
+            },
+            'mismatches': mismatches.astype(object).where(mismatches.notna(), None).to_dict('records')
+        }
@@ -0,0 +1,397 @@
+"""
+Fill Sketches
+Mergeable per-day summaries of fills: heavy hitters, distinct users, size quantiles
+"""
+import os
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .dump_io import atomic_open
+from .fill_cache import FillCache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+def hash_keys(keys: Sequence) -> np.ndarray:
+    """Stable 64-bit hashes of strings (same value in every run)"""
+    return pd.util.hash_array(np.asarray(keys, dtype=object))
+
+
+class HyperLogLog:
+    """
+    Distinct-count sketch: 2^p one-byte registers, ~1.04 / sqrt(2^p) relative error
+
+    Merging is an element-wise max, so per-day sketches combine into any window.
+    """
+
+    def __init__(self, p: int = 14, registers: Optional[np.ndarray] = None):
+        """
+        Args:
+            p: Index bits (2^p registers)
+            registers: Existing registers (e.g. loaded from disk)
+        """
+        self.p = p
+        self.registers = registers if registers is not None else np.zeros(1 << p, dtype=np.uint8)
+
+    @staticmethod
+    def ranks(hashes: np.ndarray, p: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(register index, rank) per hash: top p bits pick the register, rank is 1 + leading zeros of the rest"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        rest_bits = 64 - p
+        # <= 53 bits convert to float exactly, so frexp gives the exact bit length
+        rest = (hashes & np.uint64((1 << rest_bits) - 1)).astype(np.float64)
+        rank = (rest_bits - np.frexp(rest)[1] + 1).astype(np.uint8)
+        return index, rank
+
+    def add_hashes(self, hashes: np.ndarray):
+        """Add pre-hashed items"""
+        index, rank = self.ranks(hashes, self.p)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> float:
+        """Estimated number of distinct items"""
+        return hll_estimate(self.registers)
+
+
+def hll_estimate(registers: np.ndarray) -> float:
+    """HyperLogLog estimate from registers (linear counting for small cardinalities)"""
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)), axis=-1)
+    zeros = np.count_nonzero(registers == 0, axis=-1)
+    small = (estimate <= 2.5 * m) & (zeros > 0)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where(small, linear, estimate) if np.ndim(estimate) else float(linear if small else estimate)
+
+
+class HeavyHitters:
+    """
+    Weighted Misra-Gries summary of the k heaviest keys
+
+    Stored counts underestimate true weights by at most .error (which is
+    at most total weight / (k + 1)); every key heavier than that is kept.
+    Merging adds the two summaries and trims back to k (Agarwal et al.).
+    Counters are matched on 64-bit key hashes (integer sorts keep merges
+    fast); the keys themselves ride along for reporting.
+    """
+
+    def __init__(self, k: int = 1000, keys: Optional[np.ndarray] = None,
+                 counts: Optional[np.ndarray] = None, error: float = 0.0):
+        """
+        Args:
+            k: Counters kept
+            keys: Existing keys (e.g. loaded from disk)
+            counts: Their counts
+            error: Existing error bound
+        """
+        self.k = k
+        self.keys = np.asarray(keys, dtype=object) if keys is not None else np.zeros(0, dtype=object)
+        self.hashes = hash_keys(self.keys) if len(self.keys) else np.zeros(0, dtype=np.uint64)
+        self.counts = counts if counts is not None else np.zeros(0, dtype=np.float64)
+        self.error = error
+
+    def add_counts(self, keys: np.ndarray, counts: np.ndarray, hashes: Optional[np.ndarray] = None):
+        """Merge exact (key, weight) totals of a batch (hashes: hash_keys(keys), if already known)"""
+        keys = np.asarray(keys, dtype=object)
+        self._combine(keys, hash_keys(keys) if hashes is None else hashes,
+                      np.asarray(counts, dtype=np.float64), 0.0)
+
+    def merge(self, other: 'HeavyHitters') -> 'HeavyHitters':
+        self._combine(other.keys, other.hashes, other.counts, other.error)
+        return self
+
+    def _combine(self, keys: np.ndarray, hashes: np.ndarray, counts: np.ndarray, error: float):
+        all_keys = np.concatenate([self.keys, keys])
+        unique, first, inverse = np.unique(
+            np.concatenate([self.hashes, hashes]), return_index=True, return_inverse=True
+        )
+        totals = np.bincount(inverse, weights=np.concatenate([self.counts, counts]), minlength=len(unique))
+        labels = all_keys[first]
+        self.error += error
+        if len(unique) > self.k:
+            # Subtract the (k+1)-th largest count and drop what falls to zero
+            cut = np.partition(totals, len(totals) - self.k - 1)[len(totals) - self.k - 1]
+            totals = totals - cut
+            self.error += cut
+            keep = totals > 0
+            unique, labels, totals = unique[keep], labels[keep], totals[keep]
+        self.hashes, self.keys, self.counts = unique, labels, totals
+
+    def top(self, n: int = 10) -> List[Tuple[str, float]]:
+        """Heaviest n keys with their (lower-bound) counts"""
+        order = np.argsort(-self.counts, kind='stable')[:n]
+        return [(self.keys[i], float(self.counts[i])) for i in order]
+
+
+class QuantileSketch:
+    """
+    DDSketch over positive values: log-spaced buckets with relative accuracy alpha
+
+    Any quantile is returned within alpha (relative) of a true value of
+    that rank. Buckets cover MIN_VALUE..MAX_VALUE in a fixed dense array,
+    so merging is one array addition.
+    """
+
+    MIN_VALUE = 1e-6
+    MAX_VALUE = 1e12
+
+    def __init__(self, alpha: float = 0.01, counts: Optional[np.ndarray] = None, zero_count: int = 0):
+        """
+        Args:
+            alpha: Relative accuracy
+            counts: Existing bucket counts (e.g. loaded from disk)
+            zero_count: Existing count of values below MIN_VALUE
+        """
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = np.log(self.gamma)
+        self.offset = int(np.ceil(np.log(self.MIN_VALUE) / self._log_gamma))
+        size = int(np.ceil(np.log(self.MAX_VALUE) / self._log_gamma)) - self.offset + 1
+        self.counts = counts if counts is not None else np.zeros(size, dtype=np.int64)
+        self.zero_count = zero_count
+
+    def add(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        small = values < self.MIN_VALUE
+        self.zero_count += int(small.sum())
+        index = np.ceil(np.log(values[~small]) / self._log_gamma).astype(np.int64) - self.offset
+        np.clip(index, 0, len(self.counts) - 1, out=index)
+        self.counts += np.bincount(index, minlength=len(self.counts))
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        self.counts += other.counts
+        self.zero_count += other.zero_count
+        return self
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum()) + self.zero_count
+
+    def quantiles(self, qs: Sequence[float]) -> List[float]:
+        """Values at quantiles qs (0..1); NaN for an empty sketch"""
+        total = self.total
+        if total == 0:
+            return [float('nan')] * len(qs)
+        cumulative = self.zero_count + np.cumsum(self.counts)
+        results = []
+        for q in qs:
+            rank = q * (total - 1)
+            if rank < self.zero_count:
+                results.append(0.0)
+                continue
+            bucket = int(np.searchsorted(cumulative, rank, side='right'))
+            bucket = min(bucket, len(self.counts) - 1)
+            results.append(float(2 * self.gamma ** (bucket + self.offset) / (self.gamma + 1)))
+        return results
+
+
+class FillSketch:
+    """
+    All sketches of a set of fills (one day, or merged days)
+
+    - users:       HyperLogLog of distinct users
+    - coin_users:  HyperLogLog (smaller) of distinct users per coin
+    - traders:     HeavyHitters of users by notional volume
+    - trade_size:  QuantileSketch of fill notional (|size| x px)
+    - coin_volume / coin_trades: exact per-coin totals (coins are few)
+    """
+
+    USER_P = 14
+    COIN_P = 11
+
+    def __init__(self, k: int = 1000):
+        """
+        Args:
+            k: Heavy-hitter counters kept
+        """
+        self.users = HyperLogLog(self.USER_P)
+        self.coins: List[str] = []
+        self.coin_users = np.zeros((0, 1 << self.COIN_P), dtype=np.uint8)
+        self.coin_volume = np.zeros(0, dtype=np.float64)
+        self.coin_trades = np.zeros(0, dtype=np.int64)
+        self.traders = HeavyHitters(k)
+        self.trade_size = QuantileSketch()
+
+    def _coin_rows(self, names: Sequence[str]) -> np.ndarray:
+        index = {coin: i for i, coin in enumerate(self.coins)}
+        new = [name for name in names if name not in index]
+        if new:
+            for name in new:
+                index[name] = len(self.coins)
+                self.coins.append(name)
+            grow = len(new)
+            self.coin_users = np.vstack([self.coin_users, np.zeros((grow, self.coin_users.shape[1]), dtype=np.uint8)])
+            self.coin_volume = np.concatenate([self.coin_volume, np.zeros(grow)])
+            self.coin_trades = np.concatenate([self.coin_trades, np.zeros(grow, dtype=np.int64)])
+        return np.array([index[name] for name in names], dtype=np.int64)
+
+    def add_fills(self, df: pd.DataFrame):
+        """Update every sketch with a chunk of fills (needs user, coin, size, px)"""
+        user_codes, users = pd.factorize(df['user'].astype(object).str.lower())
+        coin_codes, coins = pd.factorize(df['coin'])
+        valid = (user_codes >= 0) & (coin_codes >= 0)
+        if not valid.any():
+            return
+        user_codes, coin_codes = user_codes[valid], coin_codes[valid]
+        notional = np.nan_to_num(
+            np.abs(df['size'].to_numpy(dtype=np.float64)) * df['px'].to_numpy(dtype=np.float64)
+        )[valid]
+
+        # Hash each distinct user once, then spread to fills by code
+        user_hashes = hash_keys(list(users))
+        self.users.add_hashes(user_hashes)
+
+        rows = self._coin_rows(list(coins))[coin_codes]
+        index, rank = HyperLogLog.ranks(user_hashes[user_codes], self.COIN_P)
+        np.maximum.at(self.coin_users, (rows, index), rank)
+        self.coin_volume += np.bincount(rows, weights=notional, minlength=len(self.coins))
+        self.coin_trades += np.bincount(rows, minlength=len(self.coins))
+
+        self.traders.add_counts(np.asarray(users, dtype=object),
+                                np.bincount(user_codes, weights=notional, minlength=len(users)), user_hashes)
+        self.trade_size.add(notional)
+
+    def merge(self, other: 'FillSketch') -> 'FillSketch':
+        """Fold in another day's (or window's) sketch"""
+        self.users.merge(other.users)
+        rows = self._coin_rows(other.coins)
+        np.maximum.at(self.coin_users, rows, other.coin_users)
+        np.add.at(self.coin_volume, rows, other.coin_volume)
+        np.add.at(self.coin_trades, rows, other.coin_trades)
+        self.traders.merge(other.traders)
+        self.trade_size.merge(other.trade_size)
+        return self
+
+    def distinct_users(self, coin: Optional[str] = None) -> float:
+        """Estimated distinct users overall or of one coin"""
+        if coin is None:
+            return self.users.count()
+        if coin not in self.coins:
+            return 0.0
+        return hll_estimate(self.coin_users[self.coins.index(coin)])
+
+    def distinct_users_by_coin(self) -> Dict[str, float]:
+        if not self.coins:
+            return {}
+        return dict(zip(self.coins, np.atleast_1d(hll_estimate(self.coin_users)).tolist()))
+
+    def top_traders(self, n: int = 10) -> List[Tuple[str, float]]:
+        """Largest users by notional volume (lower-bound volumes, see traders.error)"""
+        return self.traders.top(n)
+
+    def volume_quantiles(self, qs: Sequence[float] = (0.5, 0.9, 0.99)) -> Dict[float, float]:
+        """Fill notional at each quantile"""
+        return dict(zip(qs, self.trade_size.quantiles(qs)))
+
+    def save(self, path: str):
+        """Write the sketch atomically as .npz"""
+        with atomic_open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                users=self.users.registers,
+                coins=np.array(self.coins, dtype=str),
+                coin_users=self.coin_users,
+                coin_volume=self.coin_volume,
+                coin_trades=self.coin_trades,
+                trader_keys=np.array(self.traders.keys.tolist(), dtype=str),
+                trader_counts=self.traders.counts,
+                trader_meta=np.array([self.traders.k, self.traders.error]),
+                size_counts=self.trade_size.counts,
+                size_meta=np.array([self.trade_size.alpha, self.trade_size.zero_count])
+            )
+
+    @classmethod
+    def load(cls, path: str) -> 'FillSketch':
+        with np.load(path, allow_pickle=False) as data:
+            k, error = data['trader_meta']
+            sketch = cls(int(k))
+            sketch.users.registers = data['users']
+            sketch.coins = data['coins'].tolist()
+            sketch.coin_users = data['coin_users']
+            sketch.coin_volume = data['coin_volume']
+            sketch.coin_trades = data['coin_trades']
+            sketch.traders = HeavyHitters(int(k), data['trader_keys'].tolist(), data['trader_counts'], float(error))
+            alpha, zero_count = data['size_meta']
+            sketch.trade_size = QuantileSketch(float(alpha), data['size_counts'], int(zero_count))
+        return sketch
+
+
+class FillSketches:
+    """
+    Per-day FillSketch files of one builder
+
+    Layout: <root>/<builder>/<YYYYMMDD>.npz. A CSVScraper consumer: the
+    day's sketch is updated in the fill-parsing loop and written when the
+    next day starts or on flush(). window() merges any range of days.
+    """
+
+    def __init__(self, builder: str, root: Optional[str] = None, k: int = 1000):
+        """
+        Args:
+            builder: Builder name
+            root: Sketch directory (default: config.SKETCH_DIR under the project)
+            k: Heavy-hitter counters per day
+        """
+        if root is None:
+            project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            root = os.path.join(project_dir, config.SKETCH_DIR)
+        self.builder = builder
+        self.directory = os.path.join(str(root), builder)
+        self.k = k
+        self._day: Optional[str] = None
+        self._sketch: Optional[FillSketch] = None
+
+    def consume(self, date_str: str, df: pd.DataFrame):
+        """
+        Update the day's sketch with a chunk of fills, CSVScraper consumer hook
+
+        Days not over yet (UTC) are ignored.
+        """
+        if not FillCache.is_final(date_str) or not {'user', 'coin', 'size', 'px'} <= set(df.columns):
+            return
+        if self._day is not None and date_str != self._day:
+            self.flush()
+        if self._sketch is None:
+            self._day, self._sketch = date_str, FillSketch(self.k)
+        self._sketch.add_fills(df)
+
+    def flush(self):
+        """Write the day being sketched"""
+        if self._sketch is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._sketch.save(os.path.join(self.directory, f'{self._day}.npz'))
+        self._day, self._sketch = None, None
+
+    def abort_day(self, date_str: str):
+        """Drop the day being sketched, CSVScraper consumer hook"""
+        if self._day == date_str:
+            self._day, self._sketch = None, None
+
+    def days(self, start: Optional[str] = None, end: Optional[str] = None) -> List[str]:
+        """Sketched days (YYYYMMDD) between start and end inclusive"""
+        if not os.path.isdir(self.directory):
+            return []
+        days = sorted(name[:-4] for name in os.listdir(self.directory)
+                      if name.endswith('.npz') and name[:-4].isdigit())
+        return [d for d in days if (start is None or d >= start) and (end is None or d <= end)]
+
+    def day(self, date_str: str) -> FillSketch:
+        return FillSketch.load(os.path.join(self.directory, f'{date_str}.npz'))
+
+    def window(self, start: Optional[str] = None, end: Optional[str] = None) -> FillSketch:
+        """Merged sketch of every stored day between start and end"""
+        merged = FillSketch(self.k)
+        for date_str in self.days(start, end):
+            merged.merge(self.day(date_str))
+        return merged
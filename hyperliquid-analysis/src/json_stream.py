@@ -0,0 +1,158 @@
+"""
+JSON Stream
+Incremental reader for the top-level array of large JSON dumps
+"""
+import json
+from typing import Any, Dict, Iterator, Optional, Sequence, Union
+
+from .dump_io import PathLike, open_dump
+
+
+# Characters read per refill (decompressed, for .lz4 dumps)
+READ_SIZE = 256 * 1024
+
+WHITESPACE = ' \t\n\r'
+DELIMITERS = WHITESPACE + ',:]}'
+
+
+class JSONArrayStream:
+    """
+    Yield entries of one top-level array field without loading the document
+
+    Works on documents shaped like {"builder": ..., "users": [{...}, ...]}:
+    entries are decoded one at a time with JSONDecoder.raw_decode over a
+    sliding text buffer, so memory stays at roughly one entry plus one read
+    and the first entry is available as soon as it has been read. Scalar
+    fields around the array are collected in .metadata (fields before the
+    array are present once the first entry is yielded, the rest once
+    iteration finishes).
+    """
+
+    def __init__(
+        self,
+        path: PathLike,
+        array_keys: Union[str, Sequence[str]] = 'users',
+        fields: Optional[Sequence[str]] = None,
+        read_size: int = READ_SIZE
+    ):
+        """
+        Args:
+            path: JSON dump (plain or .lz4)
+            array_keys: Name of the array to stream; with several names the
+                first one present in the document is streamed
+            fields: Keep only these keys of dict entries (None keeps all)
+            read_size: Characters read per refill
+        """
+        self.path = path
+        self.array_keys = (array_keys,) if isinstance(array_keys, str) else tuple(array_keys)
+        self.fields = tuple(fields) if fields is not None else None
+        self.read_size = read_size
+        self.metadata: Dict[str, Any] = {}
+        self.array_key: Optional[str] = None
+        self._decoder = json.JSONDecoder()
+
+    def _project(self, entry: Any) -> Any:
+        if self.fields is None or not isinstance(entry, dict):
+            return entry
+        return {k: entry[k] for k in self.fields if k in entry}
+
+    def __iter__(self) -> Iterator[Any]:
+        with open_dump(self.path, 'rt') as f:
+            self._file = f
+            self._buffer = ''
+            self._pos = 0
+            self._eof = False
+            yield from self._parse_document()
+
+    def _fill(self) -> bool:
+        """Read more text; False at end of file"""
+        if self._eof:
+            return False
+        chunk = self._file.read(self.read_size)
+        if not chunk:
+            self._eof = True
+            return False
+        # Drop consumed text so the buffer stays near one read in size
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> str:
+        """Next non-whitespace character ('' at end of file)"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {self._pos} in {self.path}, got {char!r}")
+        self._pos += 1
+        return char
+
+    def _value(self) -> Any:
+        """Decode the next complete JSON value"""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A number cut by the end of a read ('1.' or '12' of '12.5') decodes
+                # short, so a value counts only when a delimiter follows it
+                if self._eof or (end < len(self._buffer) and self._buffer[end] in DELIMITERS):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def _parse_document(self) -> Iterator[Any]:
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if self.array_key is None and key in self.array_keys and self._peek() == '[':
+                self.array_key = key
+                yield from self._parse_array()
+            else:
+                self.metadata[key] = self._value()
+            if self._expect(',}') == '}':
+                return
+
+    def _parse_array(self) -> Iterator[Any]:
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._project(self._value())
+            if self._expect(',]') == ']':
+                return
+
+
+def iter_users(path: PathLike, fields: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+    """Stream the users[] entries of a dump, optionally projected to fields"""
+    return iter(JSONArrayStream(path, 'users', fields))
+
+
+def iter_addresses(path: PathLike) -> Iterator[str]:
+    """
+    Stream addresses from a users file
+
+    Accepts {'addresses': [...]} files and {'users': [...]} files whose
+    entries are address strings or dicts with an 'address' key.
+
+    Raises:
+        ValueError: If the file has neither key
+    """
+    stream = JSONArrayStream(path, ('addresses', 'users'), fields=('address',))
+    for entry in stream:
+        yield entry['address'] if isinstance(entry, dict) else entry
+    if stream.array_key is None:
+        raise ValueError("Invalid file format. Expected 'addresses' or 'users' key.")
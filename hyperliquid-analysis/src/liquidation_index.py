@@ -0,0 +1,331 @@
+"""
+Liquidation Index
+Per-coin sorted liquidation prices with prefix sums of notional
+"""
+import json
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .dump_io import atomic_open, dump_stem, load_dump
+
+
+class CoinLiquidationBook:
+    """Sorted liquidation levels for one coin, longs and shorts kept apart"""
+
+    def __init__(
+        self,
+        coin: str,
+        mark_price: float,
+        long_prices: np.ndarray,
+        long_notional: np.ndarray,
+        long_refs: np.ndarray,
+        short_prices: np.ndarray,
+        short_notional: np.ndarray,
+        short_refs: np.ndarray
+    ):
+        """
+        Args:
+            coin: Coin name
+            mark_price: Mark price at snapshot time
+            *_prices: Liquidation prices sorted ascending
+            *_notional: Position value for each level (same order)
+            *_refs: Row ids into the parent index's position table
+        """
+        self.coin = coin
+        self.mark_price = mark_price
+        self.long_prices = long_prices
+        self.long_refs = long_refs
+        self.short_prices = short_prices
+        self.short_refs = short_refs
+        self.long_cum = np.concatenate([[0.0], np.cumsum(long_notional)])
+        self.short_cum = np.concatenate([[0.0], np.cumsum(short_notional)])
+
+    def _range(self, prices: np.ndarray, low: float, high: float):
+        """[start, end) of levels with low <= price <= high"""
+        return (
+            int(np.searchsorted(prices, low, 'left')),
+            int(np.searchsorted(prices, high, 'right'))
+        )
+
+    def liquidated_between(self, low: float, high: float) -> Dict:
+        """
+        Positions whose liquidation price lies in [low, high]
+
+        Args:
+            low: Lower price bound
+            high: Upper price bound
+
+        Returns:
+            Dict with long/short counts and notional in the range
+        """
+        low, high = min(low, high), max(low, high)
+        ls, le = self._range(self.long_prices, low, high)
+        ss, se = self._range(self.short_prices, low, high)
+        long_notional = float(self.long_cum[le] - self.long_cum[ls])
+        short_notional = float(self.short_cum[se] - self.short_cum[ss])
+        return {
+            'coin': self.coin,
+            'low': low,
+            'high': high,
+            'longs': le - ls,
+            'shorts': se - ss,
+            'long_notional': round(long_notional, 2),
+            'short_notional': round(short_notional, 2),
+            'total_notional': round(long_notional + short_notional, 2)
+        }
+
+    def liquidated_at(self, price: float) -> Dict:
+        """
+        Positions liquidated if the coin trades from mark to price
+
+        A move down sweeps long levels in [price, mark]; a move up sweeps
+        short levels in [mark, price]. Levels already past mark are
+        included on their side.
+        """
+        if price <= self.mark_price:
+            start = int(np.searchsorted(self.long_prices, price, 'left'))
+            end = len(self.long_prices)
+            notional = float(self.long_cum[end] - self.long_cum[start])
+            return {'coin': self.coin, 'price': price, 'direction': 'LONG',
+                    'positions': end - start, 'notional': round(notional, 2)}
+
+        end = int(np.searchsorted(self.short_prices, price, 'right'))
+        notional = float(self.short_cum[end])
+        return {'coin': self.coin, 'price': price, 'direction': 'SHORT',
+                'positions': end, 'notional': round(notional, 2)}
+
+    def refs_between(self, low: float, high: float) -> np.ndarray:
+        """Position row ids with a liquidation price in [low, high]"""
+        low, high = min(low, high), max(low, high)
+        ls, le = self._range(self.long_prices, low, high)
+        ss, se = self._range(self.short_prices, low, high)
+        return np.concatenate([self.long_refs[ls:le], self.short_refs[ss:se]])
+
+    def nearest_levels(self, n: int, price: Optional[float] = None) -> List[Dict]:
+        """
+        The n liquidation levels closest to a price
+
+        Walks outward from the insertion point in both sorted arrays, so
+        cost is O(log m + n).
+
+        Args:
+            n: Number of levels
+            price: Reference price (default: mark)
+
+        Returns:
+            List of {'ref', 'direction', 'liquidation_price', 'distance_pct'}
+        """
+        price = self.mark_price if price is None else price
+        # Frontier per side: (prices, refs, next index below, next index above)
+        sides = []
+        for direction, prices, refs in (
+            ('LONG', self.long_prices, self.long_refs),
+            ('SHORT', self.short_prices, self.short_refs)
+        ):
+            i = int(np.searchsorted(prices, price))
+            sides.append([direction, prices, refs, i - 1, i])
+
+        levels = []
+        while len(levels) < n:
+            best = None
+            for side in sides:
+                _, prices, _, below, above = side
+                if below >= 0:
+                    d = price - prices[below]
+                    if best is None or d < best[0]:
+                        best = (d, side, 'below')
+                if above < len(prices):
+                    d = prices[above] - price
+                    if best is None or d < best[0]:
+                        best = (d, side, 'above')
+            if best is None:
+                break
+
+            distance, side, which = best
+            direction, prices, refs = side[0], side[1], side[2]
+            i = side[3] if which == 'below' else side[4]
+            if which == 'below':
+                side[3] -= 1
+            else:
+                side[4] += 1
+            levels.append({
+                'ref': int(refs[i]),
+                'direction': direction,
+                'liquidation_price': float(prices[i]),
+                'distance_pct': round(distance / price * 100, 2) if price else None
+            })
+        return levels
+
+    def ladder(self, moves: Sequence[float] = (0.05, 0.10, 0.20)) -> Dict:
+        """Notional liquidated by moves of each size down and up from mark"""
+        return {
+            'mark_price': self.mark_price,
+            'down': {f'{m * 100:g}%': self.liquidated_at(self.mark_price * (1 - m))['notional'] for m in moves},
+            'up': {f'{m * 100:g}%': self.liquidated_at(self.mark_price * (1 + m))['notional'] for m in moves}
+        }
+
+
+class LiquidationIndex:
+    """Liquidation-price index over every position in a processed snapshot"""
+
+    def __init__(self):
+        # Position table; books refer to rows by index
+        self.addresses: List[str] = []
+        self.positions: List[Dict] = []
+        self.books: Dict[str, CoinLiquidationBook] = {}
+        # Row ids by each position's stored risk_level
+        self.risk_refs: Dict[str, np.ndarray] = {}
+
+    @classmethod
+    def from_processed(cls, processed_data: List[Dict]) -> 'LiquidationIndex':
+        """
+        Build the index from processed user position data
+
+        Args:
+            processed_data: List of processed user position data
+
+        Returns:
+            LiquidationIndex
+        """
+        index = cls()
+        by_coin: Dict[str, List[int]] = {}
+        for user_data in processed_data:
+            for position in user_data.get('positions', []):
+                if not position.get('liquidation_price') or not position.get('size'):
+                    continue
+                ref = len(index.positions)
+                index.addresses.append(user_data['address'])
+                index.positions.append(position)
+                by_coin.setdefault(position['coin'], []).append(ref)
+
+        for coin, refs in by_coin.items():
+            index.books[coin] = index._build_book(coin, np.asarray(refs, dtype=np.int64))
+        index._index_risk()
+        return index
+
+    def _index_risk(self):
+        by_risk: Dict[str, List[int]] = {}
+        for ref, position in enumerate(self.positions):
+            by_risk.setdefault(position.get('risk_level'), []).append(ref)
+        self.risk_refs = {level: np.asarray(refs, dtype=np.int64) for level, refs in by_risk.items()}
+
+    def _build_book(self, coin: str, refs: np.ndarray) -> CoinLiquidationBook:
+        positions = [self.positions[r] for r in refs]
+        prices = np.array([p['liquidation_price'] for p in positions], dtype=np.float64)
+        notional = np.array([abs(p['position_value']) for p in positions], dtype=np.float64)
+        is_long = np.array([p['direction'] == 'LONG' for p in positions])
+        marks = notional / np.array([p['size'] for p in positions], dtype=np.float64)
+
+        sides = []
+        for mask in (is_long, ~is_long):
+            order = np.argsort(prices[mask], kind='stable')
+            sides.extend([prices[mask][order], notional[mask][order], refs[mask][order]])
+        return CoinLiquidationBook(coin, float(np.median(marks)), *sides)
+
+    def book(self, coin: str) -> Optional[CoinLiquidationBook]:
+        return self.books.get(coin)
+
+    def record(self, ref: int) -> Dict:
+        """Flattened position record for a row id"""
+        return {'address': self.addresses[ref], **self.positions[ref]}
+
+    def liquidated_between(self, coin: str, low: float, high: float) -> Dict:
+        book = self.books.get(coin)
+        if book is None:
+            return {'coin': coin, 'low': low, 'high': high, 'longs': 0, 'shorts': 0,
+                    'long_notional': 0, 'short_notional': 0, 'total_notional': 0}
+        return book.liquidated_between(low, high)
+
+    def nearest_levels(self, coin: str, n: int, price: Optional[float] = None) -> List[Dict]:
+        book = self.books.get(coin)
+        if book is None:
+            return []
+        return [
+            {**level, 'address': self.addresses[level['ref']],
+             'position_value': self.positions[level['ref']]['position_value']}
+            for level in book.nearest_levels(n, price)
+        ]
+
+    def refs_at_risk(self, levels: Sequence[str] = ('CRITICAL', 'HIGH')) -> List[int]:
+        """Row ids of positions whose own risk_level is one of levels"""
+        return [ref for level in levels for ref in self.risk_refs.get(level, np.zeros(0, dtype=np.int64)).tolist()]
+
+    def refs_within_pct(self, pct: float) -> List[int]:
+        """Row ids of positions with liquidation within pct of their coin's mark"""
+        refs = []
+        for book in self.books.values():
+            mark = book.mark_price
+            # Longs liquidate below mark, shorts above; levels already past
+            # mark count as within range
+            ls = int(np.searchsorted(book.long_prices, mark * (1 - pct / 100), 'left'))
+            se = int(np.searchsorted(book.short_prices, mark * (1 + pct / 100), 'right'))
+            refs.extend(book.long_refs[ls:].tolist())
+            refs.extend(book.short_refs[:se].tolist())
+        return refs
+
+    def save(self, filepath: str):
+        """Save the index next to its snapshot for reuse"""
+        os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+        arrays = {}
+        for i, (coin, book) in enumerate(self.books.items()):
+            arrays[f'{i}_long_prices'] = book.long_prices
+            arrays[f'{i}_long_refs'] = book.long_refs
+            arrays[f'{i}_short_prices'] = book.short_prices
+            arrays[f'{i}_short_refs'] = book.short_refs
+        meta = {
+            'coins': [[coin, book.mark_price] for coin, book in self.books.items()],
+            'addresses': self.addresses,
+            'positions': self.positions
+        }
+        arrays['meta'] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+        with atomic_open(filepath, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, filepath: str) -> 'LiquidationIndex':
+        """Load an index written by save()"""
+        index = cls()
+        with np.load(filepath) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            index.addresses = meta['addresses']
+            index.positions = meta['positions']
+            for i, (coin, mark) in enumerate(meta['coins']):
+                sides = []
+                for side in ('long', 'short'):
+                    refs = data[f'{i}_{side}_refs']
+                    sides.extend([
+                        data[f'{i}_{side}_prices'],
+                        np.array([abs(index.positions[r]['position_value']) for r in refs], dtype=np.float64),
+                        refs
+                    ])
+                index.books[coin] = CoinLiquidationBook(coin, mark, *sides)
+        index._index_risk()
+        return index
+
+    @classmethod
+    def for_snapshot(cls, snapshot_path: str, processed_data: Optional[List[Dict]] = None) -> 'LiquidationIndex':
+        """
+        Load the cached index for a snapshot, building it on first use
+
+        The cache lives beside the snapshot as liquidation_index_<stem>.npz
+        and is rebuilt when the snapshot is newer.
+
+        Args:
+            snapshot_path: Path to a positions_summary JSON (or .json.lz4) file
+            processed_data: Already-loaded users from that file, if any
+        """
+        directory = os.path.dirname(snapshot_path)
+        stem = dump_stem(snapshot_path)
+        cache_path = os.path.join(directory, f'liquidation_index_{stem}.npz')
+
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(snapshot_path):
+            return cls.load(cache_path)
+
+        if processed_data is None:
+            processed_data = load_dump(snapshot_path).get('users', [])
+
+        index = cls.from_processed(processed_data)
+        index.save(cache_path)
+        return index
@@ -0,0 +1,437 @@
+"""
+Monte Carlo VaR
+Correlated multi-coin price scenarios over processed position books
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .dump_io import load_dump
+
+
+# Scenario batch size is chosen so one batch holds at most this many
+# (scenario, account) or (scenario, coin) cells per worker
+CELLS_PER_BATCH = 8_000_000
+
+# Set in each worker process by _init_worker
+_WORKER_STATE = {}
+
+
+class PositionBook:
+    """Flat array view of every account and position in one or more snapshots"""
+
+    def __init__(self):
+        self.addresses: List[str] = []
+        self.account_value: List[float] = []
+        self.account_groups: List[Dict[str, str]] = []
+        self.coins: List[str] = []
+        self._coin_ids: Dict[str, int] = {}
+
+        # One entry per position
+        self.pos_account: List[int] = []
+        self.pos_coin: List[int] = []
+        self.pos_size: List[float] = []  # signed: longs > 0, shorts < 0
+        self.pos_mark: List[float] = []
+        self.pos_liq: List[float] = []  # nan when no liquidation price
+
+    def _coin_id(self, coin: str) -> int:
+        if coin not in self._coin_ids:
+            self._coin_ids[coin] = len(self.coins)
+            self.coins.append(coin)
+        return self._coin_ids[coin]
+
+    def add_account(
+        self,
+        address: str,
+        account_value: float,
+        positions: List[Dict],
+        groups: Dict[str, str]
+    ):
+        """
+        Add one account and its positions
+
+        Args:
+            address: User wallet address
+            account_value: Account equity in USD
+            positions: Processed position dicts (coin, direction, size,
+                position_value, liquidation_price)
+            groups: Grouping name -> label (e.g. {'builder': 'basedapp'})
+        """
+        account_id = len(self.addresses)
+        self.addresses.append(address)
+        self.account_value.append(float(account_value or 0))
+        self.account_groups.append(groups)
+
+        for pos in positions:
+            size = float(pos.get('size', 0))
+            if size <= 0:
+                continue
+            mark = float(pos.get('position_value', 0)) / size
+            liq = pos.get('liquidation_price')
+
+            self.pos_account.append(account_id)
+            self.pos_coin.append(self._coin_id(pos['coin']))
+            self.pos_size.append(size if pos.get('direction') == 'LONG' else -size)
+            self.pos_mark.append(mark)
+            self.pos_liq.append(float(liq) if liq else np.nan)
+
+    def load_snapshot(self, filepath: str):
+        """
+        Add every account from a processed snapshot file
+
+        Accepts positions_summary_* files (grouped by their 'builder') and
+        positions_by_category_* files (grouped by each trader's 'category').
+        """
+        data = load_dump(filepath)
+
+        if 'traders' in data:
+            for trader in data['traders']:
+                self.add_account(
+                    trader['address'],
+                    trader.get('account_value', 0),
+                    trader.get('positions', []),
+                    {'category': trader.get('category', 'Unknown')}
+                )
+        else:
+            builder = data.get('builder', 'unknown')
+            for user in data.get('users', []):
+                self.add_account(
+                    user['address'],
+                    user.get('account_summary', {}).get('account_value', 0),
+                    user.get('positions', []),
+                    {'builder': builder}
+                )
+
+    @property
+    def num_positions(self) -> int:
+        return len(self.pos_size)
+
+    def group_index(self, grouping: str):
+        """Return (labels, per-account label index) for a grouping, -1 when unset"""
+        labels = sorted({g[grouping] for g in self.account_groups if grouping in g})
+        lookup = {label: i for i, label in enumerate(labels)}
+        index = np.array(
+            [lookup.get(g.get(grouping), -1) for g in self.account_groups],
+            dtype=np.int64
+        )
+        return labels, index
+
+
+class MonteCarloVaR:
+    """Simulate correlated price shocks and measure account-level losses"""
+
+    def __init__(
+        self,
+        book: PositionBook,
+        covariance: Sequence[Sequence[float]],
+        coins: Sequence[str],
+        default_vol: float = 0.05
+    ):
+        """
+        Args:
+            book: Position book to shock
+            covariance: Covariance matrix of log returns over the VaR horizon
+            coins: Coin names for the rows/columns of the covariance matrix
+            default_vol: Horizon volatility for book coins missing from the
+                matrix (treated as uncorrelated)
+        """
+        self.book = book
+        self.cov = self._expand_covariance(np.asarray(covariance, dtype=np.float64), list(coins), default_vol)
+        self.chol = np.linalg.cholesky(self.cov)
+
+    def _expand_covariance(self, cov: np.ndarray, coins: List[str], default_vol: float) -> np.ndarray:
+        """Reorder the supplied matrix onto the book's coins"""
+        n = len(self.book.coins)
+        full = np.eye(n) * default_vol ** 2
+        src = {coin: i for i, coin in enumerate(coins)}
+        known = [(i, src[c]) for i, c in enumerate(self.book.coins) if c in src]
+        if known:
+            dst_idx, src_idx = map(np.array, zip(*known))
+            full[np.ix_(dst_idx, dst_idx)] = cov[np.ix_(src_idx, src_idx)]
+        return full
+
+    def _build_arrays(self, groupings: List[str]) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        Pack the book into the arrays shared with workers
+
+        Returns:
+            (shared arrays, parent-only index arrays for mapping results back)
+        """
+        book = self.book
+        n_coins = len(book.coins)
+
+        pos_account = np.asarray(book.pos_account, dtype=np.int64)
+        pos_coin = np.asarray(book.pos_coin, dtype=np.int64)
+        size = np.asarray(book.pos_size, dtype=np.float64)
+        mark = np.asarray(book.pos_mark, dtype=np.float64)
+        liq = np.asarray(book.pos_liq, dtype=np.float64)
+        notional = size * mark
+
+        # Only accounts holding positions can move; renumber them 0..A-1
+        active, pos_active = np.unique(pos_account, return_inverse=True)
+
+        # PnL is linear in each coin's return, so it collapses into a
+        # (coins x accounts) exposure matrix and a BLAS matmul per batch
+        exposure = np.zeros((n_coins, len(active)))
+        np.add.at(exposure, (pos_coin, pos_active), notional)
+
+        arrays = {
+            'chol': self.chol,
+            'exposure': exposure,
+            'abs_exposure': np.abs(exposure),
+            'equity': np.asarray(book.account_value, dtype=np.float64)[active],
+        }
+
+        onehots = {}
+        for grouping in groupings:
+            labels, index = book.group_index(grouping)
+            index = index[active]
+            onehot = np.zeros((len(active), len(labels)))
+            member = index >= 0
+            onehot[np.nonzero(member)[0], index[member]] = 1.0
+            onehots[grouping] = onehot
+            arrays[f'group_{grouping}'] = onehot
+            arrays[f'group_exposure_{grouping}'] = exposure @ onehot
+
+        # Liquidatable positions, sorted by (coin, side, log-return threshold)
+        # so a batch of moves maps to dead positions with one searchsorted
+        has_liq = ~np.isnan(liq) & (liq > 0) & (mark > 0)
+        liq_idx = np.nonzero(has_liq)[0]
+        threshold = np.log(liq[liq_idx] / mark[liq_idx])
+        is_short = (size[liq_idx] < 0).astype(np.int64)
+        order = np.lexsort((threshold, is_short, pos_coin[liq_idx]))
+        liq_idx, threshold, is_short = liq_idx[order], threshold[order], is_short[order]
+        liq_coin = pos_coin[liq_idx]
+        liq_account = pos_active[liq_idx]
+
+        # segments[c, side] = [start, end) in the sorted liquidation arrays
+        keys = liq_coin * 2 + is_short
+        bounds = np.searchsorted(keys, np.arange(n_coins * 2 + 1))
+        arrays['liq_segments'] = np.stack([bounds[:-1], bounds[1:]], axis=1).reshape(n_coins, 2, 2)
+        arrays['liq_threshold'] = threshold
+        arrays['liq_coin'] = liq_coin
+        arrays['liq_is_short'] = is_short
+
+        abs_notional = np.abs(notional[liq_idx])
+        for grouping, onehot in onehots.items():
+            cum = np.zeros((len(liq_idx) + 1, onehot.shape[1]))
+            np.cumsum(abs_notional[:, None] * onehot[liq_account], axis=0, out=cum[1:])
+            arrays[f'liq_cum_{grouping}'] = cum
+
+        # Accounts with one liquidatable position die exactly when it does;
+        # accounts with several need the joint check, done per scenario
+        per_account = np.bincount(liq_account, minlength=len(active))
+        multi = np.nonzero(per_account[liq_account] > 1)[0]
+        multi = multi[np.argsort(liq_account[multi], kind='stable')]
+        multi_accounts, multi_starts, multi_member = np.unique(
+            liq_account[multi], return_index=True, return_inverse=True
+        )
+        direction = np.where(is_short[multi] == 1, -1.0, 1.0)
+        arrays['multi_coin'] = liq_coin[multi]
+        arrays['multi_direction'] = direction.astype(np.float32)
+        arrays['multi_threshold'] = (direction * threshold[multi]).astype(np.float32)
+        arrays['multi_account'] = multi_member.astype(np.int64)
+        arrays['multi_slot'] = np.arange(len(multi)) - multi_starts[multi_member]
+
+        index = {
+            'active': active,
+            'liq_account': liq_account,
+            'single': per_account[liq_account] == 1,
+            'multi_accounts': multi_accounts,
+        }
+        return arrays, index
+
+    def run(
+        self,
+        n_scenarios: int = 100_000,
+        workers: Optional[int] = None,
+        seed: Optional[int] = None,
+        confidence: Sequence[float] = (0.95, 0.99),
+        groupings: Sequence[str] = ('builder', 'category')
+    ) -> Dict:
+        """
+        Run the simulation across a process pool
+
+        Args:
+            n_scenarios: Number of correlated price scenarios
+            workers: Worker processes (default: CPU count)
+            seed: Base random seed for reproducible runs
+            confidence: VaR/ES confidence levels
+            groupings: Account groupings to report VaR/ES for
+
+        Returns:
+            Dict with per-group VaR/ES and per-account liquidation probabilities
+        """
+        workers = workers or os.cpu_count() or 1
+        groupings = [g for g in groupings if any(g in ag for ag in self.book.account_groups)]
+        arrays, index = self._build_arrays(groupings)
+
+        width = max(1, arrays['exposure'].shape[1], len(arrays['multi_coin']), len(self.book.coins))
+        batch = max(1, min(CELLS_PER_BATCH // width, -(-n_scenarios // workers)))
+        seeds = np.random.SeedSequence(seed).spawn(-(-n_scenarios // batch))
+        tasks = [(child, min(batch, n_scenarios - i * batch)) for i, child in enumerate(seeds)]
+
+        blocks, spec = _share_arrays(arrays)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(spec,)
+            ) as executor:
+                results = list(executor.map(_simulate_batch, tasks))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        total_pnl = np.concatenate([r['total'] for r in results])
+
+        # Scenario counts in which each account had a position liquidated
+        liq_counts = np.zeros(len(self.book.addresses), dtype=np.int64)
+        position_dead = sum(r['position_dead'] for r in results)
+        single = index['single']
+        np.add.at(liq_counts, index['active'][index['liq_account'][single]], position_dead[single])
+        if len(index['multi_accounts']):
+            liq_counts[index['active'][index['multi_accounts']]] += sum(r['multi_dead'] for r in results)
+
+        report = {
+            'scenarios': n_scenarios,
+            'accounts': len(self.book.addresses),
+            'positions': self.book.num_positions,
+            'coins': len(self.book.coins),
+            'total': _risk_stats(total_pnl, confidence),
+            'groups': {},
+            'account_liquidation_prob': {
+                self.book.addresses[i]: round(float(liq_counts[i]) / n_scenarios, 6)
+                for i in np.nonzero(liq_counts)[0]
+            }
+        }
+        for grouping in groupings:
+            labels, _ = self.book.group_index(grouping)
+            pnl = np.concatenate([r['groups'][grouping] for r in results])
+            liquidated = np.concatenate([r['liquidated'][grouping] for r in results])
+            report['groups'][grouping] = {
+                label: {
+                    **_risk_stats(pnl[:, j], confidence),
+                    'expected_liquidated_notional': round(float(liquidated[:, j].mean()), 2)
+                }
+                for j, label in enumerate(labels)
+            }
+        return report
+
+
+def _risk_stats(pnl: np.ndarray, confidence: Sequence[float]) -> Dict:
+    """VaR/ES of a PnL sample, reported as positive losses"""
+    losses = -pnl
+    stats = {
+        'mean_pnl': round(float(pnl.mean()), 2),
+        'worst_pnl': round(float(pnl.min()), 2)
+    }
+    for level in confidence:
+        var = float(np.quantile(losses, level))
+        tail = losses[losses >= var]
+        pct = f'{level * 100:g}'
+        stats[f'var_{pct}'] = round(var, 2)
+        stats[f'es_{pct}'] = round(float(tail.mean()) if len(tail) else var, 2)
+    return stats
+
+
+def _share_arrays(arrays: Dict[str, np.ndarray]):
+    """Copy arrays into shared memory blocks and return (blocks, spec)"""
+    blocks = []
+    spec = {}
+    for name, array in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        view[...] = array
+        blocks.append(block)
+        spec[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, spec
+
+
+def _init_worker(spec: Dict):
+    """Attach the shared position arrays once per worker process"""
+    _WORKER_STATE.clear()
+    _WORKER_STATE['blocks'] = []
+    _WORKER_STATE['groupings'] = [
+        name[len('group_'):] for name in spec
+        if name.startswith('group_') and not name.startswith('group_exposure_')
+    ]
+    for name, (shm_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=shm_name)
+        _WORKER_STATE['blocks'].append(block)
+        _WORKER_STATE[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+    slot = _WORKER_STATE['multi_slot']
+    account = _WORKER_STATE['multi_account']
+    _WORKER_STATE['multi_slots'] = [
+        (np.nonzero(slot == k)[0], account[slot == k])
+        for k in range(int(slot.max()) + 1 if len(slot) else 0)
+    ]
+
+
+def _simulate_batch(task) -> Dict:
+    """Simulate one batch of scenarios against the shared book"""
+    seed, n = task
+    s = _WORKER_STATE
+    rng = np.random.default_rng(seed)
+
+    log_returns = rng.standard_normal((n, s['chol'].shape[0])) @ s['chol'].T
+    returns = np.expm1(log_returns)
+
+    result = {
+        'total': returns @ s['exposure'].sum(axis=1),
+        'groups': {g: returns @ s[f'group_exposure_{g}'] for g in s['groupings']},
+        'liquidated': {g: np.zeros((n, s[f'group_{g}'].shape[1])) for g in s['groupings']},
+    }
+
+    # An account cannot lose more than its equity. Only accounts whose
+    # worst-case move in this batch could breach it need their own PnL.
+    bound = np.abs(returns).max(axis=0) @ s['abs_exposure']
+    breach = np.nonzero(bound > s['equity'])[0]
+    if len(breach):
+        account_pnl = returns @ s['exposure'][:, breach]
+        shortfall = np.minimum(account_pnl + s['equity'][breach], 0)
+        result['total'] -= shortfall.sum(axis=1)
+        for g in s['groupings']:
+            result['groups'][g] -= shortfall @ s[f'group_{g}'][breach]
+
+    # Per coin: longs die at or below their threshold, shorts at or above
+    threshold = s['liq_threshold']
+    position_dead = np.zeros(len(threshold), dtype=np.int64)
+    for coin in np.nonzero(s['liq_segments'][:, :, 1] > s['liq_segments'][:, :, 0])[0]:
+        moves = log_returns[:, coin]
+        sorted_moves = np.sort(moves)
+        (ls, le), (ss, se) = s['liq_segments'][coin]
+
+        if le > ls:
+            first_dead = ls + np.searchsorted(threshold[ls:le], moves, 'left')
+            for g in s['groupings']:
+                cum = s[f'liq_cum_{g}']
+                result['liquidated'][g] += cum[le] - cum[first_dead]
+            position_dead[ls:le] = np.searchsorted(sorted_moves, threshold[ls:le], 'right')
+        if se > ss:
+            last_dead = ss + np.searchsorted(threshold[ss:se], moves, 'right')
+            for g in s['groupings']:
+                cum = s[f'liq_cum_{g}']
+                result['liquidated'][g] += cum[last_dead] - cum[ss]
+            position_dead[ss:se] = n - np.searchsorted(sorted_moves, threshold[ss:se], 'left')
+    result['position_dead'] = position_dead
+
+    # Joint check for accounts with several liquidatable positions: the
+    # account dies when its smallest direction-adjusted distance to a
+    # threshold reaches zero. Rows are positions so the per-account fold
+    # over each position slot moves contiguous rows.
+    if len(s['multi_coin']):
+        coin_moves = np.ascontiguousarray(log_returns.T, dtype=np.float32)
+        distance = coin_moves[s['multi_coin']]
+        distance *= s['multi_direction'][:, None]
+        distance -= s['multi_threshold'][:, None]
+        nearest = distance[s['multi_slots'][0][0]]
+        for pos, account in s['multi_slots'][1:]:
+            nearest[account] = np.minimum(nearest[account], distance[pos])
+        result['multi_dead'] = (nearest <= 0).sum(axis=1)
+    return result
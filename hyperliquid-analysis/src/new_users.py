@@ -0,0 +1,226 @@
+"""
+New User Detection
+Bloom filter plus exact ID set of a builder's known addresses, checked on the fill stream
+"""
+import os
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from .address_registry import AddressRegistry
+from .dump_io import PathLike, atomic_open, write_dump
+from .fill_sketches import hash_keys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+class BloomFilter:
+    """
+    Bit-array membership filter: no false negatives, false positives at rate ~p
+
+    Uses k bit positions per key from double hashing of one 64-bit hash.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001, bits: Optional[np.ndarray] = None, k: Optional[int] = None):
+        """
+        Args:
+            capacity: Keys the filter is sized for
+            error_rate: False-positive rate at capacity
+            bits: Existing bit array (packed uint8, e.g. loaded from disk)
+            k: Hash count of the existing bits
+        """
+        m = int(np.ceil(-capacity * np.log(error_rate) / np.log(2) ** 2))
+        self.size = len(bits) * 8 if bits is not None else (m + 7) // 8 * 8
+        self.k = k if k is not None else max(1, int(round(self.size / capacity * np.log(2))))
+        self.capacity = capacity
+        self.bits = bits if bits is not None else np.zeros(self.size // 8, dtype=np.uint8)
+
+    def _positions(self, hashes: np.ndarray) -> np.ndarray:
+        """(n, k) bit positions"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        h1 = (hashes & np.uint64(0xFFFFFFFF)).astype(np.int64)
+        h2 = (hashes >> np.uint64(32)).astype(np.int64) | 1
+        return (h1[:, None] + np.arange(self.k, dtype=np.int64)[None, :] * h2[:, None]) % self.size
+
+    def add_hashes(self, hashes: np.ndarray):
+        positions = self._positions(hashes).ravel()
+        np.bitwise_or.at(self.bits, positions >> 3, (1 << (positions & 7)).astype(np.uint8))
+
+    def contains_hashes(self, hashes: np.ndarray) -> np.ndarray:
+        """Boolean array: False means definitely absent"""
+        positions = self._positions(hashes)
+        return ((self.bits[positions >> 3] >> (positions & 7)) & 1).all(axis=1)
+
+
+class NewUserDetector:
+    """
+    Known addresses of one builder, and the new ones seen in fills
+
+    The Bloom filter answers "definitely new" for most unseen addresses
+    without touching the exact set; its positives are confirmed against a
+    sorted array of AddressRegistry IDs, so no new user is missed. Stored
+    as <root>/<builder>.npz (bits, hash count, known IDs) and rebuilt
+    larger when the known set outgrows the filter's capacity. Addresses
+    learned this run are kept as strings and turned into IDs only after
+    save() has saved the registry, so stored IDs are final.
+
+    A CSVScraper consumer: each chunk's distinct users are staged for the
+    day and checked when the day commits, so a day that fails to parse
+    leaves nothing behind; first sightings are collected in .new_users.
+    """
+
+    def __init__(self, builder: str, registry: Optional[AddressRegistry] = None,
+                 root: Optional[PathLike] = None, capacity: Optional[int] = None):
+        """
+        Args:
+            builder: Builder name
+            registry: Address registry for IDs (default: the project registry;
+                saved by save())
+            root: Detector directory (default: config.KNOWN_USERS_DIR under the project)
+            capacity: Initial Bloom capacity (default: config.KNOWN_USERS_CAPACITY)
+        """
+        if root is None:
+            project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            root = os.path.join(project_dir, config.KNOWN_USERS_DIR)
+        self.builder = builder
+        self.registry = registry if registry is not None else AddressRegistry.default()
+        self.path = os.path.join(str(root), f'{builder}.npz')
+        # Seeding without emitting (e.g. while backfilling history)
+        self.bootstrapping = False
+        self.new_users: Dict[str, str] = {}
+        # Known addresses not in self.known yet (lowercase)
+        self._pending: Set[str] = set()
+        # Distinct users of the day being streamed, checked on commit_day()
+        self._staged: Dict[str, None] = {}
+        self.checked = 0
+        self.exact_lookups = 0
+
+        if os.path.exists(self.path):
+            with np.load(self.path, allow_pickle=False) as data:
+                self.known = data['known']
+                self.bloom = BloomFilter(int(data['capacity']), bits=data['bits'], k=int(data['k']))
+        else:
+            self.known = np.zeros(0, dtype=np.int64)
+            self.bloom = BloomFilter(capacity or config.KNOWN_USERS_CAPACITY)
+
+    def __len__(self) -> int:
+        return len(self.known) + len(self._pending)
+
+    def _known_mask(self, addresses: np.ndarray) -> np.ndarray:
+        """Exact membership of lowercase addresses"""
+        ids = self.registry.lookup_many(list(addresses))
+        position = np.minimum(np.searchsorted(self.known, ids), max(len(self.known) - 1, 0))
+        found = (ids >= 0) & (self.known[position] == ids) if len(self.known) else np.zeros(len(ids), dtype=bool)
+        if self._pending:
+            found |= np.fromiter((a in self._pending for a in addresses), dtype=bool, count=len(addresses))
+        return found
+
+    def _remember(self, addresses: np.ndarray, hashes: np.ndarray):
+        self._pending.update(addresses)
+        if len(self) > self.bloom.capacity:
+            # Grow: rebuild from the exact set at twice the size
+            self.bloom = BloomFilter(2 * len(self))
+            known = self.registry.addresses(self.known) + list(self._pending)
+            self.bloom.add_hashes(hash_keys(known))
+        else:
+            self.bloom.add_hashes(hashes)
+
+    def _normalize(self, addresses: Iterable[str]) -> np.ndarray:
+        return pd.unique(np.array(
+            [a.lower() for a in addresses if isinstance(a, str) and len(a) == 42], dtype=object
+        ))
+
+    def seed(self, addresses: Iterable[str]) -> int:
+        """
+        Mark addresses as known without reporting them
+
+        Returns:
+            Number of addresses that were not known yet
+        """
+        addresses = self._normalize(addresses)
+        if not len(addresses):
+            return 0
+        fresh = addresses[~self._known_mask(addresses)]
+        self._remember(fresh, hash_keys(fresh))
+        return len(fresh)
+
+    def check(self, addresses: Iterable[str], date_str: Optional[str] = None) -> list:
+        """
+        New addresses among a batch; they are remembered and collected in .new_users
+
+        Args:
+            addresses: Distinct addresses (any case)
+            date_str: Day they were seen (YYYYMMDD)
+
+        Returns:
+            Lowercase addresses not known before
+        """
+        addresses = self._normalize(addresses)
+        if not len(addresses):
+            return []
+        self.checked += len(addresses)
+        hashes = hash_keys(addresses)
+
+        # Bloom negatives are certainly new; positives need the exact set
+        maybe = self.bloom.contains_hashes(hashes)
+        new = ~maybe
+        if maybe.any():
+            self.exact_lookups += int(maybe.sum())
+            found = self._known_mask(addresses[maybe])
+            new[np.flatnonzero(maybe)[~found]] = True
+
+        if not new.any():
+            return []
+        fresh = addresses[new]
+        self._remember(fresh, hashes[new])
+        if not self.bootstrapping:
+            for address in fresh:
+                self.new_users.setdefault(address, date_str)
+        return list(fresh)
+
+    def consume(self, date_str: str, df: pd.DataFrame):
+        """Stage a chunk's distinct users, CSVScraper consumer hook"""
+        if 'user' in df.columns:
+            self._staged.update(dict.fromkeys(pd.unique(df['user'].astype(object))))
+
+    def commit_day(self, date_str: str):
+        """Check the day's staged users, CSVScraper consumer hook"""
+        staged, self._staged = list(self._staged), {}
+        self.check(staged, date_str)
+
+    def abort_day(self, date_str: str):
+        """Drop the day's staged users, CSVScraper consumer hook"""
+        self._staged = {}
+
+    def save(self):
+        """Persist the filter and the exact set (saves the address registry first)"""
+        if self._pending:
+            pending = list(self._pending)
+            self.registry.ids(pending)
+            self.registry.save()
+            self.known = np.union1d(self.known, self.registry.lookup_many(pending))
+            self._pending = set()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with atomic_open(self.path, 'wb') as f:
+            np.savez(f, bits=self.bloom.bits, k=self.bloom.k, capacity=self.bloom.capacity, known=self.known)
+
+    def save_new_users(self, filepath: PathLike) -> int:
+        """
+        Write the new users as an {'addresses': [...]} file for the position fetchers
+
+        Returns:
+            Number of addresses written
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        write_dump(filepath, {
+            'builder': self.builder,
+            'detected_at': datetime.now().isoformat(),
+            'total_users': len(self.new_users),
+            'addresses': list(self.new_users),
+            'users': [{'address': a, 'first_seen': d} for a, d in self.new_users.items()]
+        })
+        return len(self.new_users)
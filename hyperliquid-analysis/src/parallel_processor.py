@@ -0,0 +1,315 @@
+"""
+Parallel Position Processor
+Processes large raw position dumps across worker processes
+"""
+import json
+import mmap
+import os
+import re
+import shutil
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .dump_io import atomic_open, plain_file
+from .position_processor import PositionProcessor
+from .top_k import TopK
+
+
+# Number of top positions (by absolute position value) kept per run
+TOP_POSITIONS = 50
+
+# Set in each worker process by _init_worker
+_WORKER_STATE = {}
+
+
+def _line_indent(buf, pos: int) -> int:
+    """Number of leading spaces on the line containing pos"""
+    line_start = buf.rfind(b'\n', 0, pos) + 1
+    i = line_start
+    while buf[i:i + 1] == b' ':
+        i += 1
+    return i - line_start
+
+
+def split_array(buf, n_chunks: int, key: str = 'users') -> Optional[Tuple[int, int, List[Tuple[int, int]]]]:
+    """
+    Split a top-level array of a pretty-printed JSON dump into byte spans
+
+    json.dump(indent=n) writes each array item on its own line at one fixed
+    indent, and never writes raw newlines inside strings, so item starts are
+    found with a byte search instead of parsing the document.
+
+    Args:
+        buf: Bytes-like view of the whole document (e.g. an mmap)
+        n_chunks: Target number of spans
+        key: Top-level key holding the array
+
+    Returns:
+        (offset of '[', offset past ']', [(start, end), ...]) where each span
+        holds whole items separated by commas, or None if the document is
+        not pretty-printed
+    """
+    marker = f'"{key}": ['.encode('utf-8')
+    pos = buf.find(marker)
+    if pos < 0:
+        raise ValueError(f"No '{key}' array found")
+    start = pos + len(marker) - 1
+
+    if buf[start + 1:start + 2] == b']':
+        return start, start + 2, []
+    if buf[start + 1:start + 2] != b'\n':
+        return None
+
+    # The array closes on a line at the key's own indent
+    closing = b'\n' + b' ' * _line_indent(buf, pos) + b']'
+    end = buf.find(closing, start) + len(closing)
+
+    # Item lines at this indent either open an item or close one ('}'/']')
+    item_indent = b'\n' + b' ' * _line_indent(buf, start + 2)
+    item_start = re.compile(re.escape(item_indent) + rb'[^ }\]]')
+
+    body_start, body_end = start + 1, end - len(closing)
+    step = max(1, (body_end - body_start) // max(1, n_chunks))
+    bounds = [body_start]
+    for target in range(body_start + step, body_end, step):
+        match = item_start.search(buf, target, body_end)
+        if match is None:
+            break
+        if match.start() > bounds[-1]:
+            bounds.append(match.start())
+    bounds.append(body_end)
+
+    return start, end, list(zip(bounds[:-1], bounds[1:]))
+
+
+def _parse_span(buf, span: Tuple[int, int]) -> List[Dict]:
+    """Parse the items in one span as a JSON list"""
+    text = bytes(buf[span[0]:span[1]]).strip().rstrip(b',')
+    return json.loads(b'[' + text + b']') if text else []
+
+
+class ChunkAggregate:
+    """Mergeable per-chunk statistics over processed users"""
+
+    def __init__(self):
+        self.users = 0
+        self.users_with_positions = 0
+        self.total_positions = 0
+        self.errors = 0
+        self.risk_distribution = defaultdict(int)
+        self.by_coin = defaultdict(lambda: defaultdict(int))
+        self.top_positions = TopK(TOP_POSITIONS, key=lambda x: abs(x['position_value']))
+
+    def add(self, processed: Dict):
+        self.users += 1
+        if processed.get('error'):
+            self.errors += 1
+        if not processed['has_positions']:
+            return
+
+        self.users_with_positions += 1
+        self.total_positions += processed['num_positions']
+        for position in processed['positions']:
+            coin = self.by_coin[position['coin']]
+            side = 'longs' if position['direction'] == 'LONG' else 'shorts'
+            coin['count'] += 1
+            coin['total_value'] += position['position_value']
+            coin['total_unrealized_pnl'] += position['unrealized_pnl']
+            coin['total_margin_used'] += position['margin_used']
+            coin[side] += 1
+            coin[f'{side}_total_size'] += position['size']
+            coin[f'{side}_unrealized_pnl'] += position['unrealized_pnl']
+            self.risk_distribution[position.get('risk_level', 'UNKNOWN')] += 1
+            self.top_positions.push({'user_address': processed['address'], **position})
+
+    def merge(self, other: 'ChunkAggregate') -> 'ChunkAggregate':
+        self.users += other.users
+        self.users_with_positions += other.users_with_positions
+        self.total_positions += other.total_positions
+        self.errors += other.errors
+        for level, n in other.risk_distribution.items():
+            self.risk_distribution[level] += n
+        for coin, stats in other.by_coin.items():
+            for field, value in stats.items():
+                self.by_coin[coin][field] += value
+        self.top_positions.merge(other.top_positions)
+        return self
+
+    def to_dict(self) -> Dict:
+        return {
+            'users': self.users,
+            'users_with_positions': self.users_with_positions,
+            'total_positions': self.total_positions,
+            'errors': self.errors,
+            'risk_distribution': dict(self.risk_distribution),
+            'by_coin': {coin: dict(stats) for coin, stats in self.by_coin.items()},
+            'top_positions': self.top_positions.results()
+        }
+
+    def __getstate__(self):
+        # TopK and defaultdict factories hold lambdas; pickle as plain data
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.users = state['users']
+        self.users_with_positions = state['users_with_positions']
+        self.total_positions = state['total_positions']
+        self.errors = state['errors']
+        self.risk_distribution.update(state['risk_distribution'])
+        for coin, stats in state['by_coin'].items():
+            self.by_coin[coin].update(stats)
+        self.top_positions.extend(state['top_positions'])
+
+
+class ParallelPositionProcessor:
+    """Run PositionProcessor over a raw dump in worker processes"""
+
+    def __init__(self, workers: Optional[int] = None, chunks_per_worker: int = 4):
+        """
+        Args:
+            workers: Worker processes (default: CPU count)
+            chunks_per_worker: Chunks per worker, for load balancing
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.chunks_per_worker = chunks_per_worker
+
+    def process_raw_file(self, raw_path: str, output_path: Optional[str] = None) -> Dict:
+        """
+        Process a positions_raw_* dump
+
+        Workers map the file and parse only their own byte span, so raw
+        records are never pickled between processes. Processed users go to
+        per-chunk part files that are stitched into output_path in order.
+        .lz4 inputs are decompressed once into a temporary file for the workers
+        to map; a .lz4 output_path is written LZ4-framed.
+
+        Args:
+            raw_path: Path to positions_raw_* JSON (or .json.lz4) file
+            output_path: Where to write the positions_summary_* JSON (optional)
+
+        Returns:
+            Dict with the raw header, merged aggregates and output path
+        """
+        with plain_file(raw_path) as plain_path:
+            return self._process_plain(plain_path, output_path)
+
+    def _process_plain(self, raw_path: str, output_path: Optional[str]) -> Dict:
+        with open(raw_path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                layout = split_array(buf, self.workers * self.chunks_per_worker)
+                if layout is None:
+                    # Compact dump: item boundaries need a real parse, so
+                    # parse once here and hand workers the records
+                    data = json.loads(bytes(buf))
+                    header = {k: v for k, v in data.items() if k != 'users'}
+                    return self._run(header, [('records', chunk) for chunk in self._chunk(data['users'])], output_path)
+
+                start, end, spans = layout
+                header = json.loads(bytes(buf[:start]) + b'[]' + bytes(buf[end:]))
+                header.pop('users', None)
+            finally:
+                buf.close()
+
+        return self._run(header, [('span', span) for span in spans], output_path, raw_path)
+
+    def _chunk(self, records: List[Dict]) -> List[List[Dict]]:
+        n = max(1, self.workers * self.chunks_per_worker)
+        size = max(1, -(-len(records) // n))
+        return [records[i:i + size] for i in range(0, len(records), size)]
+
+    def _run(self, header: Dict, tasks: List, output_path: Optional[str], raw_path: Optional[str] = None) -> Dict:
+        part_dir = tempfile.mkdtemp(prefix='positions_parts_') if output_path else None
+        tasks = [(i, kind, payload, part_dir) for i, (kind, payload) in enumerate(tasks)]
+
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(raw_path,)
+            ) as executor:
+                results = list(executor.map(_process_chunk, tasks))
+
+            aggregate = ChunkAggregate()
+            for result in results:
+                aggregate.merge(result['aggregate'])
+
+            if output_path:
+                summary_header = {
+                    'fetched_at': header.get('fetched_at'),
+                    'fetch_date': header.get('fetch_date'),
+                    'total_users_queried': aggregate.users,
+                    'users_with_positions': aggregate.users_with_positions,
+                    'total_positions': aggregate.total_positions,
+                    'errors': aggregate.errors,
+                    'markets': header.get('markets'),
+                    'builder': header.get('builder')
+                }
+                _stitch_parts(output_path, summary_header, [r['part'] for r in results])
+        finally:
+            if part_dir:
+                shutil.rmtree(part_dir, ignore_errors=True)
+
+        return {
+            'header': header,
+            'aggregate': aggregate.to_dict(),
+            'output_path': output_path
+        }
+
+
+def _init_worker(raw_path: Optional[str]):
+    """Map the raw dump once per worker process"""
+    _WORKER_STATE.clear()
+    _WORKER_STATE['processor'] = PositionProcessor()
+    if raw_path:
+        f = open(raw_path, 'rb')
+        _WORKER_STATE['file'] = f
+        _WORKER_STATE['buf'] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _process_chunk(task) -> Dict:
+    """Process one chunk; returns its aggregate and part file path"""
+    index, kind, payload, part_dir = task
+    records = _parse_span(_WORKER_STATE['buf'], payload) if kind == 'span' else payload
+
+    processor = _WORKER_STATE['processor']
+    aggregate = ChunkAggregate()
+    part_path = None
+
+    if part_dir:
+        part_path = os.path.join(part_dir, f'part_{index:05d}.json')
+        with open(part_path, 'w') as f:
+            for i, raw_data in enumerate(records):
+                processed = processor.process_user_positions(raw_data)
+                aggregate.add(processed)
+                if i:
+                    f.write(',\n')
+                f.write('    ' + json.dumps(processed, indent=2).replace('\n', '\n    '))
+    else:
+        for raw_data in records:
+            aggregate.add(processor.process_user_positions(raw_data))
+
+    return {'aggregate': aggregate, 'part': part_path if records else None}
+
+
+def _stitch_parts(output_path: str, header: Dict, parts: List[Optional[str]]):
+    """Write the summary JSON, streaming part files into its users array"""
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with atomic_open(output_path, 'wt') as out:
+        out.write('{\n')
+        for key, value in header.items():
+            out.write(f'  {json.dumps(key)}: {json.dumps(value)},\n')
+        out.write('  "users": [\n')
+        first = True
+        for part in parts:
+            if part is None:
+                continue
+            if not first:
+                out.write(',\n')
+            with open(part, 'r') as f:
+                shutil.copyfileobj(f, out)
+            first = False
+        out.write('\n  ]\n}' if not first else '  ]\n}')
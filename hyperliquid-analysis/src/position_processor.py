@@ -3,9 +3,13 @@ Position Processor
 Processes raw position data and generates structured outputs
 """
 
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional
 from datetime import datetime
 
+from .liquidation_index import LiquidationIndex
+from .position_set import PositionSet
+from .top_k import MultiTopK, TopK
+
 
 class PositionProcessor:
     """Processes and analyzes position data"""
@@ -155,87 +159,94 @@ class PositionProcessor:
         Returns:
             List of BTC position records (one per position)
         """
-        btc_positions = []
-        
-        for user_data in processed_data:
-            address = user_data['address']
-            account_summary = user_data.get('account_summary', {})
-            
-            for position in user_data.get('positions', []):
-                if position['coin'] == 'BTC':
-                    # Flatten for CSV export
-                    btc_record = {
-                        'address': address,
-                        'account_value': account_summary.get('account_value', 0),
-                        **position
-                    }
-                    btc_positions.append(btc_record)
-        
-        return btc_positions
+        # Flattened for CSV export: {'address', 'account_value', **position}
+        return PositionSet.from_processed(processed_data).where(coin='BTC').records()
     
-    def sort_btc_positions(self, btc_positions: List[Dict]) -> Dict[str, List[Dict]]:
+    def sort_btc_positions(self, btc_positions: Iterable[Dict], limit: Optional[int] = None) -> Dict[str, List[Dict]]:
         """
         Sort BTC positions by direction and size
         
         Args:
-            btc_positions: List of BTC position records
+            btc_positions: BTC position records (list or stream)
+            limit: Keep only the largest N per direction (default: all)
             
         Returns:
             Dict with 'longs' and 'shorts' sorted by size descending
         """
-        longs = [p for p in btc_positions if p['direction'] == 'LONG']
-        shorts = [p for p in btc_positions if p['direction'] == 'SHORT']
-        
-        # Sort by position value (largest first)
-        longs.sort(key=lambda x: x['position_value'], reverse=True)
-        shorts.sort(key=lambda x: x['position_value'], reverse=True)
+        # Rank both directions by position value (largest first) in one pass
+        ranked = MultiTopK({
+            'longs': {'k': limit, 'key': lambda x: x['position_value'], 'where': lambda x: x['direction'] == 'LONG'},
+            'shorts': {'k': limit, 'key': lambda x: x['position_value'], 'where': lambda x: x['direction'] == 'SHORT'}
+        })
+        totals = {'LONG': [0, 0], 'SHORT': [0, 0]}
+        
+        for position in btc_positions:
+            ranked.push(position)
+            if position['direction'] in totals:
+                totals[position['direction']][0] += 1
+                totals[position['direction']][1] += position['position_value']
+        
+        top = ranked.results()
+        total_longs, total_long_value = totals['LONG']
+        total_shorts, total_short_value = totals['SHORT']
         
         return {
-            'longs': longs,
-            'shorts': shorts,
+            'longs': top['longs'],
+            'shorts': top['shorts'],
             'summary': {
-                'total_longs': len(longs),
-                'total_shorts': len(shorts),
-                'total_long_value': sum(p['position_value'] for p in longs),
-                'total_short_value': sum(p['position_value'] for p in shorts),
-                'long_short_ratio': len(longs) / len(shorts) if shorts else float('inf')
+                'total_longs': total_longs,
+                'total_shorts': total_shorts,
+                'total_long_value': total_long_value,
+                'total_short_value': total_short_value,
+                'long_short_ratio': total_longs / total_shorts if total_shorts else float('inf')
             }
         }
     
-    def generate_at_risk_report(self, processed_data: List[Dict]) -> List[Dict]:
+    def generate_at_risk_report(
+        self,
+        processed_data: List[Dict],
+        liquidation_index: Optional[LiquidationIndex] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
         """
         Generate report of positions at high risk of liquidation
         
         Args:
             processed_data: List of processed user position data
+            liquidation_index: Prebuilt index for this snapshot; when given,
+                only HIGH/CRITICAL positions are visited
+            limit: Keep only the N positions closest to liquidation (default: all)
             
         Returns:
             List of at-risk positions sorted by risk level
         """
-        at_risk = []
+        # Most at risk first: smallest distance to liquidation
+        at_risk = TopK(limit, key=lambda x: x.get('distance_to_liq_pct', 100), smallest=True)
+        
+        if liquidation_index is not None:
+            # Positions are looked up by their own stored risk level, so the
+            # result matches the scan below
+            account_values = {
+                u['address']: u.get('account_summary', {}).get('account_value', 0)
+                for u in processed_data
+            }
+            for ref in liquidation_index.refs_at_risk(['CRITICAL', 'HIGH']):
+                address = liquidation_index.addresses[ref]
+                at_risk.push({
+                    'address': address,
+                    'account_value': account_values.get(address, 0),
+                    **liquidation_index.positions[ref]
+                })
+            return at_risk.results()
         
         for user_data in processed_data:
             for position in user_data.get('positions', []):
                 risk_level = position.get('risk_level')
                 if risk_level in ['CRITICAL', 'HIGH']:
-                    at_risk.append({
+                    at_risk.push({
                         'address': user_data['address'],
                         'account_value': user_data.get('account_summary', {}).get('account_value', 0),
                         **position
                     })
         
-        # Sort by distance to liquidation (most at risk first)
-        at_risk.sort(key=lambda x: x.get('distance_to_liq_pct', 100))
-        
-        return at_risk
-
-
-
-
-
-
-
-
-
-
-
+        return at_risk.results()
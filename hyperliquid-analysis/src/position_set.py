@@ -0,0 +1,255 @@
+"""
+Position Set
+Indexed, chainable queries over flattened position records
+"""
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .top_k import TopK
+
+
+# Fields with a hash index; where() on these is a lookup, not a scan
+INDEXED_FIELDS = ('address', 'coin', 'risk_level', 'direction', 'market_type')
+
+AGGREGATIONS = ('count', 'sum', 'mean', 'min', 'max')
+
+
+class _Indexes:
+    """Position table plus value -> row ids maps, shared by derived sets"""
+
+    def __init__(self, records: List[Dict]):
+        self.records = records
+        self.fields: Dict[str, Dict[Any, List[int]]] = {}
+        for field in INDEXED_FIELDS:
+            index = defaultdict(list)
+            for row, record in enumerate(records):
+                index[record.get(field)].append(row)
+            self.fields[field] = dict(index)
+
+
+class PositionSet:
+    """
+    A selection of position records over a shared set of indexes
+
+    Each record is a flattened position: {'address', 'account_value',
+    **position}. Filtering returns a new PositionSet over the same table,
+    so calls chain, e.g.
+
+        positions.where(coin='ETH', direction='SHORT').filter(lambda p: p['position_value'] > 100_000)
+        positions.where(market_type='HIP-3', risk_level='HIGH').group_by('coin').aggregate(value=('position_value', 'sum'))
+    """
+
+    def __init__(self, indexes: _Indexes, rows: Optional[List[int]] = None):
+        """
+        Args:
+            indexes: Shared position table and indexes
+            rows: Selected row ids in table order (None selects every row)
+        """
+        self._indexes = indexes
+        self._rows = rows
+
+    @classmethod
+    def from_processed(cls, processed_data: Iterable[Dict]) -> 'PositionSet':
+        """
+        Build a PositionSet from processed user position data
+
+        Args:
+            processed_data: Processed user position data (the 'users' list
+                of a positions_summary_* file)
+
+        Returns:
+            PositionSet selecting every position
+        """
+        records = []
+        for user_data in processed_data:
+            address = user_data['address']
+            account_value = user_data.get('account_summary', {}).get('account_value', 0)
+            for position in user_data.get('positions', []):
+                records.append({
+                    'address': address,
+                    'account_value': account_value,
+                    **position
+                })
+        return cls(_Indexes(records))
+
+    @property
+    def rows(self) -> Sequence[int]:
+        return range(len(self._indexes.records)) if self._rows is None else self._rows
+
+    def _derive(self, rows: List[int]) -> 'PositionSet':
+        return PositionSet(self._indexes, rows)
+
+    def _lookup(self, field: str, value: Any) -> List[int]:
+        """Row ids matching field == value (or any of value if a list/tuple/set)"""
+        index = self._indexes.fields[field]
+        if isinstance(value, (list, tuple, set, frozenset)):
+            if len(value) == 1:
+                return index.get(next(iter(value)), [])
+            return sorted(row for v in value for row in index.get(v, []))
+        return index.get(value, [])
+
+    def where(self, **conditions) -> 'PositionSet':
+        """
+        Select positions whose fields equal the given values
+
+        Indexed fields (address, coin, risk_level, direction, market_type)
+        are answered from the indexes, smallest match first; other fields
+        are checked against the remaining rows. A list/tuple/set value
+        matches any of its members.
+
+        Returns:
+            New PositionSet
+        """
+        indexed = [(f, v) for f, v in conditions.items() if f in self._indexes.fields]
+        scanned = [(f, v) for f, v in conditions.items() if f not in self._indexes.fields]
+
+        if indexed:
+            matches = sorted((self._lookup(f, v) for f, v in indexed), key=len)
+            rows = matches[0]
+            keep = [set(m) for m in matches[1:]]
+            if self._rows is not None:
+                keep.append(set(self._rows))
+            if keep:
+                rows = [row for row in rows if all(row in k for k in keep)]
+            else:
+                rows = list(rows)
+        else:
+            rows = list(self.rows)
+
+        if scanned:
+            records = self._indexes.records
+            rows = [
+                row for row in rows
+                if all(_matches(records[row].get(f), v) for f, v in scanned)
+            ]
+        return self._derive(rows)
+
+    def filter(self, predicate: Callable[[Dict], bool]) -> 'PositionSet':
+        """Select positions for which predicate(record) is true"""
+        records = self._indexes.records
+        return self._derive([row for row in self.rows if predicate(records[row])])
+
+    def group_by(self, field: str) -> 'PositionGroups':
+        """
+        Split the selection by a field's value
+
+        Indexed fields reuse the index buckets; other fields are grouped in
+        one pass over the selection.
+        """
+        groups: Dict[Any, List[int]] = {}
+        if field in self._indexes.fields:
+            if self._rows is None:
+                groups = {value: rows for value, rows in self._indexes.fields[field].items()}
+            else:
+                selected = set(self._rows)
+                for value, rows in self._indexes.fields[field].items():
+                    rows = [row for row in rows if row in selected]
+                    if rows:
+                        groups[value] = rows
+        else:
+            records = self._indexes.records
+            for row in self.rows:
+                groups.setdefault(records[row].get(field), []).append(row)
+        return PositionGroups({value: self._derive(rows) for value, rows in groups.items()})
+
+    def aggregate(self, **specs: Tuple[str, str]) -> Dict[str, Any]:
+        """
+        Aggregate the selection
+
+        Args:
+            specs: Output name -> (field, op) with op one of count, sum,
+                mean, min, max. With no specs, returns the position count
+                and total value.
+
+        Returns:
+            Dict of output name -> value
+        """
+        if not specs:
+            specs = {'count': ('position_value', 'count'), 'total_value': ('position_value', 'sum')}
+        for name, (_, op) in specs.items():
+            if op not in AGGREGATIONS:
+                raise ValueError(f"Unknown aggregation '{op}' for '{name}'")
+
+        records = self._indexes.records
+        columns = {field: [] for field, _ in specs.values()}
+        for row in self.rows:
+            record = records[row]
+            for field, values in columns.items():
+                value = record.get(field)
+                if value is not None:
+                    values.append(value)
+
+        result = {}
+        for name, (field, op) in specs.items():
+            values = columns[field]
+            if op == 'count':
+                result[name] = len(values)
+            elif op == 'sum':
+                result[name] = sum(values)
+            elif op == 'mean':
+                result[name] = sum(values) / len(values) if values else None
+            elif op == 'min':
+                result[name] = min(values) if values else None
+            else:
+                result[name] = max(values) if values else None
+        return result
+
+    def top(self, n: Optional[int], key: Callable[[Dict], float], smallest: bool = False) -> List[Dict]:
+        """The n best records by key, best first (ties keep table order)"""
+        return TopK(n, key, smallest).extend(self).results()
+
+    def values(self, field: str) -> List[Any]:
+        """Distinct values of a field in the selection, in first-seen order"""
+        if field in self._indexes.fields and self._rows is None:
+            return list(self._indexes.fields[field])
+        return list(dict.fromkeys(record.get(field) for record in self))
+
+    def records(self) -> List[Dict]:
+        """Selected records in table order (shared dicts; copy before mutating)"""
+        records = self._indexes.records
+        return [records[row] for row in self.rows]
+
+    def __iter__(self) -> Iterator[Dict]:
+        records = self._indexes.records
+        return (records[row] for row in self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __repr__(self) -> str:
+        return f'PositionSet({len(self):,} positions)'
+
+
+class PositionGroups:
+    """Result of PositionSet.group_by: value -> PositionSet"""
+
+    def __init__(self, groups: Dict[Any, PositionSet]):
+        self.groups = groups
+
+    def aggregate(self, **specs: Tuple[str, str]) -> Dict[Any, Dict[str, Any]]:
+        """Aggregate each group (see PositionSet.aggregate)"""
+        return {value: group.aggregate(**specs) for value, group in self.groups.items()}
+
+    def where(self, **conditions) -> 'PositionGroups':
+        return PositionGroups({value: group.where(**conditions) for value, group in self.groups.items()})
+
+    def filter(self, predicate: Callable[[Dict], bool]) -> 'PositionGroups':
+        return PositionGroups({value: group.filter(predicate) for value, group in self.groups.items()})
+
+    def __getitem__(self, value: Any) -> PositionSet:
+        return self.groups[value]
+
+    def __iter__(self):
+        return iter(self.groups)
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def items(self):
+        return self.groups.items()
+
+
+def _matches(actual: Any, expected: Any) -> bool:
+    if isinstance(expected, (list, tuple, set, frozenset)):
+        return actual in expected
+    return actual == expected
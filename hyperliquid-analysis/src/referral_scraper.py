@@ -2,7 +2,6 @@
 Referral API Scraper
 Extract user addresses using Hyperliquid's referral endpoint
 """
-import json
 import sys
 import os
 from typing import List, Dict, Any
@@ -11,6 +10,7 @@ from datetime import datetime
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config
 from src.api_client import HyperliquidClient
+from src.dump_io import write_dump
 
 
 class ReferralScraper:
@@ -160,8 +160,7 @@ class ReferralScraper:
             'users': self.users
         }
         
-        with open(filepath, 'w') as f:
-            json.dump(output, f, indent=2)
+        write_dump(filepath, output)
         
         print(f"💾 Saved to {filepath}")
 
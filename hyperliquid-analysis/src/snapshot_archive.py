@@ -0,0 +1,299 @@
+"""
+Snapshot Archive
+Partitioned Parquet storage for position snapshots (builder/date/market)
+"""
+import os
+import re
+import shutil
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .snapshot_db import flatten_processed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+# One row per user (same columns as users_summary_*.csv)
+ACCOUNTS_SCHEMA = pa.schema([
+    ('address', pa.string()),
+    ('fetched_at', pa.timestamp('us')),
+    ('has_positions', pa.bool_()),
+    ('num_positions', pa.int32()),
+    ('account_value', pa.float64()),
+    ('total_margin_used', pa.float64()),
+    ('total_unrealized_pnl', pa.float64()),
+    ('total_position_value', pa.float64()),
+    ('error', pa.string())
+])
+
+# One row per position (same columns as positions_detail_*.csv)
+POSITIONS_SCHEMA = pa.schema([
+    ('user_address', pa.string()),
+    ('coin', pa.string()),
+    ('market_type', pa.string()),
+    ('direction', pa.string()),
+    ('size', pa.float64()),
+    ('entry_price', pa.float64()),
+    ('liquidation_price', pa.float64()),
+    ('position_value', pa.float64()),
+    ('unrealized_pnl', pa.float64()),
+    ('pnl_percent', pa.float64()),
+    ('leverage_type', pa.string()),
+    ('leverage_value', pa.float64()),
+    ('margin_used', pa.float64()),
+    ('distance_to_liq_pct', pa.float64()),
+    ('distance_to_liq_usd', pa.float64()),
+    ('risk_level', pa.string())
+])
+
+SCHEMAS = {'accounts': ACCOUNTS_SCHEMA, 'positions': POSITIONS_SCHEMA}
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('builder', pa.string()), ('date', pa.string()), ('market', pa.string())]),
+    flavor='hive'
+)
+
+# Each partition directory holds one file
+PART_FILE = 'part-0.parquet'
+
+# positions_summary_hypercore_20260209.json(.lz4) -> ('hypercore', '20260209')
+SNAPSHOT_NAME = re.compile(r'_(hypercore|hip3)_(\d{8})\.(?:json|csv)(?:\.lz4)?$')
+
+
+def parse_snapshot_name(filename: str) -> Optional[Tuple[str, str]]:
+    """(market, date) from a snapshot file name, or None"""
+    match = SNAPSHOT_NAME.search(filename)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def write_partition(directory: str, table: pa.Table, **write_options):
+    """
+    Write a one-file partition, replacing it atomically
+
+    The file is staged in a hidden sibling directory, which dataset scans
+    skip, then moved in with one rename: the directory for a new partition,
+    the file over the old one otherwise. Readers see the old or the new
+    partition, never both or neither.
+    """
+    parent, name = os.path.split(directory)
+    staging = os.path.join(parent, f'.{name}.{os.getpid()}.tmp')
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    try:
+        pq.write_table(table, os.path.join(staging, PART_FILE), **write_options)
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            # Partition exists: swap the file in
+            os.replace(os.path.join(staging, PART_FILE), os.path.join(directory, PART_FILE))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def partition_files(base: str) -> List[str]:
+    """Partition files under a dataset directory, skipping staging and leftover .tmp directories"""
+    files = []
+    for directory, subdirectories, names in os.walk(base):
+        subdirectories[:] = sorted(d for d in subdirectories if not d.startswith('.') and not d.endswith('.tmp'))
+        if PART_FILE in names:
+            files.append(os.path.join(directory, PART_FILE))
+    return files
+
+
+def _float(value) -> Optional[float]:
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def _rows_to_table(rows: List[Dict], schema: pa.Schema) -> pa.Table:
+    """Coerce flattened snapshot rows (snapshot_db.flatten_processed) to an archive schema"""
+    columns = {}
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        if pa.types.is_timestamp(field.type):
+            columns[field.name] = [pd.Timestamp(v) if v else None for v in values]
+        elif pa.types.is_integer(field.type):
+            columns[field.name] = [int(v) if v is not None and v != '' else None for v in values]
+        elif pa.types.is_floating(field.type):
+            columns[field.name] = [_float(v) for v in values]
+        elif pa.types.is_boolean(field.type):
+            columns[field.name] = [bool(v) if v is not None else None for v in values]
+        else:
+            columns[field.name] = [v or None for v in values]
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+def _frame_to_table(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """Coerce a CSV-loaded frame to an archive schema"""
+    df = df.reindex(columns=schema.names)
+    for field in schema:
+        column = df[field.name]
+        if pa.types.is_timestamp(field.type):
+            df[field.name] = pd.to_datetime(column, errors='coerce')
+        elif pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+            # float() parses the CSV's repr() output exactly; pandas' fast
+            # parser can be off by an ulp
+            df[field.name] = [_float(v) if not pd.isna(v) else None for v in column]
+        elif pa.types.is_boolean(field.type):
+            df[field.name] = column.astype(str).str.lower() == 'true'
+        else:
+            df[field.name] = column.where(column.notna() & (column.astype(str) != ''), None).astype(object)
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+class SnapshotArchive:
+    """
+    Columnar archive of position snapshots
+
+    Layout: <root>/<table>/builder=<b>/date=<YYYYMMDD>/market=<m>/part-0.parquet
+    with tables 'accounts' and 'positions'. Readers prune partitions from
+    directory names and read only the requested columns.
+    """
+
+    def __init__(self, root: Optional[str] = None, compression: str = 'zstd'):
+        """
+        Args:
+            root: Archive directory (default: config.ARCHIVE_DIR under the project)
+            compression: Parquet compression codec
+        """
+        if root is None:
+            project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            root = os.path.join(project_dir, config.ARCHIVE_DIR)
+        self.root = str(root)
+        self.compression = compression
+
+    def _partition_dir(self, table: str, builder: str, date: str, market: str) -> str:
+        return os.path.join(self.root, table, f'builder={builder}', f'date={date}', f'market={market}')
+
+    def _write_table(self, name: str, table: pa.Table, builder: str, date: str, market: str):
+        # Replace the partition wholesale so re-archiving a snapshot is idempotent
+        directory = self._partition_dir(name, builder, date, market)
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        write_partition(directory, table, compression=self.compression)
+
+    def write_snapshot(self, builder: str, date: str, market: str, processed_results: List[Dict]) -> Dict:
+        """
+        Archive one processed snapshot
+
+        Args:
+            builder: Builder name
+            date: Snapshot date (YYYYMMDD)
+            market: 'hypercore' or 'hip3'
+            processed_results: The 'users' list of a positions_summary_* file
+
+        Returns:
+            Dict with row counts written per table
+        """
+        accounts, positions = flatten_processed(processed_results)
+        self._write_table('accounts', _rows_to_table(accounts, ACCOUNTS_SCHEMA), builder, date, market)
+        self._write_table('positions', _rows_to_table(positions, POSITIONS_SCHEMA), builder, date, market)
+        return {'accounts': len(accounts), 'positions': len(positions)}
+
+    def write_frames(
+        self,
+        builder: str,
+        date: str,
+        market: str,
+        accounts: Optional[pd.DataFrame] = None,
+        positions: Optional[pd.DataFrame] = None
+    ) -> Dict:
+        """
+        Archive a snapshot from users_summary_*/positions_detail_* CSV frames
+
+        Args:
+            builder: Builder name
+            date: Snapshot date (YYYYMMDD)
+            market: 'hypercore' or 'hip3'
+            accounts: users_summary_* rows (optional)
+            positions: positions_detail_* rows (optional)
+
+        Returns:
+            Dict with row counts written per table
+        """
+        counts = {}
+        for name, df in (('accounts', accounts), ('positions', positions)):
+            if df is None:
+                continue
+            self._write_table(name, _frame_to_table(df, SCHEMAS[name]), builder, date, market)
+            counts[name] = len(df)
+        return counts
+
+    def partitions(self, table: str = 'positions') -> List[Dict]:
+        """List archived (builder, date, market) partitions of a table"""
+        found = []
+        base = os.path.join(self.root, table)
+        if not os.path.isdir(base):
+            return found
+        for builder_dir in sorted(os.listdir(base)):
+            for date_dir in sorted(os.listdir(os.path.join(base, builder_dir))):
+                for market_dir in sorted(os.listdir(os.path.join(base, builder_dir, date_dir))):
+                    if market_dir.startswith('.') or market_dir.endswith('.tmp'):
+                        continue
+                    found.append({
+                        'builder': builder_dir.split('=', 1)[1],
+                        'date': date_dir.split('=', 1)[1],
+                        'market': market_dir.split('=', 1)[1]
+                    })
+        return found
+
+    def has_partition(self, table: str, builder: str, date: str, market: str) -> bool:
+        return os.path.exists(os.path.join(self._partition_dir(table, builder, date, market), PART_FILE))
+
+    def read(
+        self,
+        table: str = 'positions',
+        columns: Optional[Sequence[str]] = None,
+        builders: Optional[Sequence[str]] = None,
+        dates: Optional[Sequence[str]] = None,
+        date_range: Optional[Tuple[str, str]] = None,
+        markets: Optional[Sequence[str]] = None,
+        where: Optional[ds.Expression] = None
+    ) -> pd.DataFrame:
+        """
+        Read archived rows, scanning only matching partitions and columns
+
+        Args:
+            table: 'positions' or 'accounts'
+            columns: Columns to read, may include builder/date/market (default: all)
+            builders: Builder names to include (default: all)
+            dates: Exact snapshot dates (YYYYMMDD) to include
+            date_range: Inclusive (start, end) dates to include
+            markets: Markets to include
+            where: Extra pyarrow.dataset filter, pushed down to row groups
+                (e.g. ds.field('coin') == 'BTC')
+
+        Returns:
+            DataFrame with the requested columns
+        """
+        base = os.path.join(self.root, table)
+        files = partition_files(base) if os.path.isdir(base) else []
+        if not files:
+            names = list(columns) if columns else SCHEMAS[table].names + ['builder', 'date', 'market']
+            return pd.DataFrame(columns=names)
+
+        dataset = ds.dataset(files, format='parquet', partitioning=PARTITIONING, partition_base_dir=base)
+
+        conditions = []
+        if builders:
+            conditions.append(ds.field('builder').isin(list(builders)))
+        if dates:
+            conditions.append(ds.field('date').isin(list(dates)))
+        if date_range:
+            conditions.append((ds.field('date') >= date_range[0]) & (ds.field('date') <= date_range[1]))
+        if markets:
+            conditions.append(ds.field('market').isin(list(markets)))
+        if where is not None:
+            conditions.append(where)
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        return dataset.to_table(columns=list(columns) if columns else None, filter=expression).to_pandas()
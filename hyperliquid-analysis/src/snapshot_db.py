@@ -0,0 +1,461 @@
+"""
+Snapshot Database
+Indexed SQLite store of builder users, account snapshots and positions
+"""
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    builder TEXT NOT NULL,
+    address TEXT NOT NULL,
+    source TEXT,
+    in_csv INTEGER NOT NULL DEFAULT 0,
+    in_referral INTEGER NOT NULL DEFAULT 0,
+    total_trades INTEGER,
+    first_trade_date TEXT,
+    last_trade_date TEXT,
+    total_volume REAL,
+    api_volume REAL,
+    api_fees_paid REAL,
+    api_joined_date TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (builder, address)
+);
+CREATE INDEX IF NOT EXISTS idx_users_address ON users (address);
+
+CREATE TABLE IF NOT EXISTS account_snapshots (
+    builder TEXT NOT NULL,
+    market TEXT NOT NULL,
+    snapshot_date TEXT NOT NULL,
+    address TEXT NOT NULL,
+    fetched_at TEXT,
+    has_positions INTEGER,
+    num_positions INTEGER,
+    account_value REAL,
+    total_margin_used REAL,
+    total_unrealized_pnl REAL,
+    total_position_value REAL,
+    error TEXT,
+    PRIMARY KEY (builder, market, snapshot_date, address)
+);
+CREATE INDEX IF NOT EXISTS idx_accounts_address ON account_snapshots (address, snapshot_date);
+CREATE INDEX IF NOT EXISTS idx_accounts_date ON account_snapshots (snapshot_date);
+
+CREATE TABLE IF NOT EXISTS positions (
+    builder TEXT NOT NULL,
+    market TEXT NOT NULL,
+    snapshot_date TEXT NOT NULL,
+    address TEXT NOT NULL,
+    coin TEXT NOT NULL,
+    market_type TEXT,
+    direction TEXT,
+    size REAL,
+    entry_price REAL,
+    liquidation_price REAL,
+    position_value REAL,
+    unrealized_pnl REAL,
+    pnl_percent REAL,
+    leverage_type TEXT,
+    leverage_value REAL,
+    margin_used REAL,
+    distance_to_liq_pct REAL,
+    distance_to_liq_usd REAL,
+    risk_level TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_positions_address ON positions (address, snapshot_date);
+CREATE INDEX IF NOT EXISTS idx_positions_coin ON positions (coin, snapshot_date, risk_level);
+CREATE INDEX IF NOT EXISTS idx_positions_risk ON positions (risk_level, snapshot_date);
+CREATE INDEX IF NOT EXISTS idx_positions_snapshot ON positions (builder, market, snapshot_date);
+"""
+
+# Columns positions() may sort by (ORDER BY cannot be a bound parameter)
+POSITION_SORT_COLUMNS = (
+    'builder', 'market', 'snapshot_date', 'address', 'coin', 'market_type', 'direction',
+    'size', 'entry_price', 'liquidation_price', 'position_value', 'unrealized_pnl',
+    'pnl_percent', 'leverage_type', 'leverage_value', 'margin_used',
+    'distance_to_liq_pct', 'distance_to_liq_usd', 'risk_level'
+)
+
+ACCOUNT_COLUMNS = [
+    'builder', 'market', 'snapshot_date', 'address', 'fetched_at', 'has_positions',
+    'num_positions', 'account_value', 'total_margin_used', 'total_unrealized_pnl',
+    'total_position_value', 'error'
+]
+
+POSITION_COLUMNS = [
+    'builder', 'market', 'snapshot_date', 'address', 'coin', 'market_type', 'direction',
+    'size', 'entry_price', 'liquidation_price', 'position_value', 'unrealized_pnl',
+    'pnl_percent', 'leverage_type', 'leverage_value', 'margin_used',
+    'distance_to_liq_pct', 'distance_to_liq_usd', 'risk_level'
+]
+
+USER_COLUMNS = [
+    'builder', 'address', 'source', 'in_csv', 'in_referral', 'total_trades',
+    'first_trade_date', 'last_trade_date', 'total_volume', 'api_volume',
+    'api_fees_paid', 'api_joined_date', 'updated_at'
+]
+
+
+def _number(value) -> Optional[float]:
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def _flag(value) -> int:
+    if isinstance(value, str):
+        return 1 if value.lower() == 'true' else 0
+    return 1 if value else 0
+
+
+def flatten_processed(processed_results: Iterable[Dict]):
+    """
+    Split processed users into account rows and position rows
+
+    Rows use the users_summary_*/positions_detail_* CSV column names, so CSV
+    history can be loaded through the same path.
+
+    Returns:
+        (account rows, position rows)
+    """
+    accounts = []
+    positions = []
+    for user in processed_results:
+        account_summary = user.get('account_summary', {})
+        accounts.append({
+            'address': user['address'],
+            'fetched_at': user.get('fetched_at'),
+            'has_positions': user.get('has_positions', False),
+            'num_positions': user.get('num_positions', 0),
+            'account_value': account_summary.get('account_value', 0),
+            'total_margin_used': account_summary.get('total_margin_used', 0),
+            'total_unrealized_pnl': account_summary.get('total_unrealized_pnl', 0),
+            'total_position_value': account_summary.get('total_position_value', 0),
+            'error': user.get('error')
+        })
+        for position in user.get('positions', []):
+            leverage = position.get('leverage')
+            if isinstance(leverage, dict):
+                leverage_type, leverage_value = leverage.get('type'), leverage.get('value')
+            else:
+                leverage_type, leverage_value = None, leverage
+            positions.append({
+                'user_address': user['address'],
+                **position,
+                'leverage_type': leverage_type,
+                'leverage_value': leverage_value
+            })
+    return accounts, positions
+
+
+class SnapshotDB:
+    """SQLite store for users and position snapshots across builders"""
+
+    def __init__(self, db_path: Optional[str] = None, batch_size: int = 5000):
+        """
+        Args:
+            db_path: Database file (default: config.SNAPSHOT_DB under the project)
+            batch_size: Rows per executemany call
+        """
+        if db_path is None:
+            project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            db_path = os.path.join(project_dir, config.SNAPSHOT_DB)
+        self.db_path = str(db_path)
+        self.batch_size = batch_size
+
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self) -> 'SnapshotDB':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _insert_many(self, sql: str, rows: Iterable[Sequence]):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.conn.executemany(sql, batch)
+                batch = []
+        if batch:
+            self.conn.executemany(sql, batch)
+
+    # ------------------------------------------------------------------
+    # Writers
+    # ------------------------------------------------------------------
+
+    def write_users(self, builder: str, users: List[Dict]) -> int:
+        """
+        Upsert a builder's users (DataValidator.merge_datasets output)
+
+        in_csv/in_referral accumulate across runs, so a user seen by the CSV
+        method once stays marked even if a later window misses them.
+
+        Returns:
+            Number of users written
+        """
+        now = datetime.utcnow().isoformat()
+        sql = f"""
+            INSERT INTO users ({', '.join(USER_COLUMNS)})
+            VALUES ({', '.join('?' * len(USER_COLUMNS))})
+            ON CONFLICT (builder, address) DO UPDATE SET
+                in_csv = MAX(in_csv, excluded.in_csv),
+                in_referral = MAX(in_referral, excluded.in_referral),
+                source = CASE
+                    WHEN MAX(in_csv, excluded.in_csv) AND MAX(in_referral, excluded.in_referral) THEN 'both'
+                    ELSE excluded.source END,
+                total_trades = COALESCE(excluded.total_trades, total_trades),
+                first_trade_date = COALESCE(excluded.first_trade_date, first_trade_date),
+                last_trade_date = COALESCE(excluded.last_trade_date, last_trade_date),
+                total_volume = COALESCE(excluded.total_volume, total_volume),
+                api_volume = COALESCE(excluded.api_volume, api_volume),
+                api_fees_paid = COALESCE(excluded.api_fees_paid, api_fees_paid),
+                api_joined_date = COALESCE(excluded.api_joined_date, api_joined_date),
+                updated_at = excluded.updated_at
+        """
+        rows = (
+            (
+                builder,
+                user['address'].lower(),
+                user.get('source'),
+                int(user.get('source') in ('csv', 'both')),
+                int(user.get('source') in ('referral', 'both')),
+                user.get('total_trades'),
+                user.get('first_trade_date'),
+                user.get('last_trade_date'),
+                _number(user.get('total_volume')),
+                _number(user.get('api_volume')),
+                _number(user.get('api_fees_paid')),
+                user.get('api_joined_date'),
+                now
+            )
+            for user in users
+        )
+        with self.conn:
+            self._insert_many(sql, rows)
+        return len(users)
+
+    def write_snapshot_rows(
+        self,
+        builder: str,
+        market: str,
+        snapshot_date: str,
+        accounts: Iterable[Dict],
+        positions: Iterable[Dict]
+    ) -> Dict:
+        """
+        Replace one snapshot's account and position rows in a single transaction
+
+        Args:
+            builder: Builder name
+            market: 'hypercore' or 'hip3'
+            snapshot_date: Snapshot date (YYYYMMDD)
+            accounts: Rows with users_summary_* columns
+            positions: Rows with positions_detail_* columns
+
+        Returns:
+            Dict with row counts written per table
+        """
+        counts = {'accounts': 0, 'positions': 0}
+        key = (builder, market, snapshot_date)
+
+        def account_rows():
+            for row in accounts:
+                counts['accounts'] += 1
+                yield key + (
+                    row['address'].lower(),
+                    row.get('fetched_at') or None,
+                    _flag(row.get('has_positions')),
+                    int(row.get('num_positions') or 0),
+                    _number(row.get('account_value')),
+                    _number(row.get('total_margin_used')),
+                    _number(row.get('total_unrealized_pnl')),
+                    _number(row.get('total_position_value')),
+                    row.get('error') or None
+                )
+
+        def position_rows():
+            for row in positions:
+                counts['positions'] += 1
+                yield key + (
+                    row['user_address'].lower(),
+                    row.get('coin'),
+                    row.get('market_type') or None,
+                    row.get('direction') or None,
+                    _number(row.get('size')),
+                    _number(row.get('entry_price')),
+                    _number(row.get('liquidation_price')),
+                    _number(row.get('position_value')),
+                    _number(row.get('unrealized_pnl')),
+                    _number(row.get('pnl_percent')),
+                    row.get('leverage_type') or None,
+                    _number(row.get('leverage_value')),
+                    _number(row.get('margin_used')),
+                    _number(row.get('distance_to_liq_pct')),
+                    _number(row.get('distance_to_liq_usd')),
+                    row.get('risk_level') or None
+                )
+
+        where = 'builder = ? AND market = ? AND snapshot_date = ?'
+        with self.conn:
+            self.conn.execute(f'DELETE FROM account_snapshots WHERE {where}', key)
+            self.conn.execute(f'DELETE FROM positions WHERE {where}', key)
+            self._insert_many(
+                f"INSERT INTO account_snapshots ({', '.join(ACCOUNT_COLUMNS)}) VALUES ({', '.join('?' * len(ACCOUNT_COLUMNS))})",
+                account_rows()
+            )
+            self._insert_many(
+                f"INSERT INTO positions ({', '.join(POSITION_COLUMNS)}) VALUES ({', '.join('?' * len(POSITION_COLUMNS))})",
+                position_rows()
+            )
+        return counts
+
+    def write_snapshot(self, builder: str, market: str, snapshot_date: str, processed_results: Iterable[Dict]) -> Dict:
+        """
+        Replace one snapshot from processed users (a positions_summary_* 'users' list)
+
+        Returns:
+            Dict with row counts written per table
+        """
+        accounts, positions = flatten_processed(processed_results)
+        return self.write_snapshot_rows(builder, market, snapshot_date, accounts, positions)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _query(self, sql: str, params: Sequence = ()) -> List[Dict]:
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def address_history(self, address: str, builder: Optional[str] = None) -> List[Dict]:
+        """
+        Every account snapshot of an address, oldest first, with its positions
+
+        Args:
+            address: User address
+            builder: Limit to one builder (default: all)
+
+        Returns:
+            List of account snapshot dicts, each with a 'positions' list
+        """
+        address = address.lower()
+        params = [address]
+        builder_clause = ''
+        if builder:
+            builder_clause = ' AND builder = ?'
+            params.append(builder)
+
+        snapshots = self._query(
+            f'SELECT * FROM account_snapshots WHERE address = ?{builder_clause} ORDER BY snapshot_date, builder, market',
+            params
+        )
+        positions = {}
+        for row in self._query(f'SELECT * FROM positions WHERE address = ?{builder_clause}', params):
+            positions.setdefault((row['builder'], row['market'], row['snapshot_date']), []).append(row)
+        for snapshot in snapshots:
+            snapshot['positions'] = positions.get(
+                (snapshot['builder'], snapshot['market'], snapshot['snapshot_date']), []
+            )
+        return snapshots
+
+    def positions(
+        self,
+        snapshot_date: Optional[str] = None,
+        coin: Optional[str] = None,
+        direction: Optional[str] = None,
+        risk_level: Optional[str] = None,
+        builder: Optional[str] = None,
+        market: Optional[str] = None,
+        address: Optional[str] = None,
+        min_value: Optional[float] = None,
+        order_by: str = 'position_value',
+        descending: bool = True
+    ) -> List[Dict]:
+        """
+        Positions matching every given filter
+
+        e.g. all CRITICAL BTC longs across builders on a date:
+            db.positions(snapshot_date='20260209', coin='BTC', direction='LONG', risk_level='CRITICAL')
+
+        Args:
+            order_by: Sort column, one of POSITION_SORT_COLUMNS
+            descending: Sort largest first
+
+        Returns:
+            List of position row dicts
+
+        Raises:
+            ValueError: If order_by is not a position column
+        """
+        if order_by not in POSITION_SORT_COLUMNS:
+            raise ValueError(f"Cannot order positions by {order_by!r}")
+        filters = {
+            'snapshot_date': snapshot_date,
+            'coin': coin,
+            'direction': direction,
+            'risk_level': risk_level,
+            'builder': builder,
+            'market': market,
+            'address': address.lower() if address else None
+        }
+        clauses = [f'{column} = ?' for column, value in filters.items() if value is not None]
+        params = [value for value in filters.values() if value is not None]
+        if min_value is not None:
+            clauses.append('ABS(position_value) >= ?')
+            params.append(min_value)
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        direction_sql = 'DESC' if descending else 'ASC'
+        return self._query(f'SELECT * FROM positions{where} ORDER BY {order_by} {direction_sql}', params)
+
+    def users_by_source(self, builder: str, in_referral: Optional[bool] = None, in_csv: Optional[bool] = None) -> List[Dict]:
+        """
+        Users filtered by which methods have ever seen them
+
+        e.g. users present in referral but never in CSV:
+            db.users_by_source('basedapp', in_referral=True, in_csv=False)
+        """
+        clauses = ['builder = ?']
+        params: List = [builder]
+        if in_referral is not None:
+            clauses.append('in_referral = ?')
+            params.append(int(in_referral))
+        if in_csv is not None:
+            clauses.append('in_csv = ?')
+            params.append(int(in_csv))
+        return self._query(f"SELECT * FROM users WHERE {' AND '.join(clauses)} ORDER BY address", params)
+
+    def snapshot_dates(self, builder: Optional[str] = None, market: Optional[str] = None) -> List[str]:
+        """Distinct snapshot dates, oldest first"""
+        clauses, params = [], []
+        if builder:
+            clauses.append('builder = ?')
+            params.append(builder)
+        if market:
+            clauses.append('market = ?')
+            params.append(market)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        return [row[0] for row in self.conn.execute(
+            f'SELECT DISTINCT snapshot_date FROM account_snapshots{where} ORDER BY snapshot_date', params
+        )]
+
+    def latest_date(self, builder: Optional[str] = None, market: Optional[str] = None) -> Optional[str]:
+        dates = self.snapshot_dates(builder, market)
+        return dates[-1] if dates else None
@@ -0,0 +1,429 @@
+"""
+Snapshot Diff
+Sorted-merge comparison of two position snapshots into change events
+"""
+import csv
+import heapq
+import json
+import mmap
+import os
+import tempfile
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .dump_io import is_compressed, open_dump, plain_file
+from .parallel_processor import split_array, _parse_span
+
+
+EVENT_TYPES = (
+    'opened', 'closed', 'increased', 'reduced', 'flipped',
+    'liquidated_suspected', 'risk_tier_changed'
+)
+
+# Relative size change below which a position counts as unchanged
+SIZE_TOLERANCE = 1e-9
+
+# Bytes of JSON parsed at a time when streaming a summary file
+SPAN_BYTES = 8 * 1024 * 1024
+
+# Columnar layout of change events
+EVENT_SCHEMA = pa.schema([
+    ('type', pa.string()),
+    ('address', pa.string()),
+    ('market_type', pa.string()),
+    ('coin', pa.string()),
+    ('old_direction', pa.string()),
+    ('new_direction', pa.string()),
+    ('old_size', pa.float64()),
+    ('new_size', pa.float64()),
+    ('size_change', pa.float64()),
+    ('old_value', pa.float64()),
+    ('new_value', pa.float64()),
+    ('value_change', pa.float64()),
+    ('old_risk_level', pa.string()),
+    ('new_risk_level', pa.string()),
+    ('old_liquidation_price', pa.float64()),
+    ('mark_price', pa.float64())
+])
+
+
+def _sort_key(record: Dict) -> Tuple[str, str, str]:
+    return (record['address'], record['market_type'] or '', record['coin'])
+
+
+def _number(value) -> Optional[float]:
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def _position_record(address: str, position: Dict) -> Dict:
+    """The fields a diff needs from one position"""
+    size = _number(position.get('size')) or 0.0
+    return {
+        'address': address.lower(),
+        'market_type': position.get('market_type') or '',
+        'coin': position.get('coin'),
+        'direction': position.get('direction'),
+        'size': size if position.get('direction') == 'LONG' else -size,
+        'position_value': _number(position.get('position_value')) or 0.0,
+        'liquidation_price': _number(position.get('liquidation_price')),
+        'risk_level': position.get('risk_level') or None
+    }
+
+
+def iter_snapshot_positions(path: str) -> Iterator[Dict]:
+    """
+    Stream position records from a snapshot file
+
+    Supports positions_summary_* JSON (parsed a span of users at a time when
+    pretty-printed) and positions_detail_* CSV, either optionally .lz4.
+
+    Args:
+        path: Snapshot file path
+
+    Yields:
+        Position records with a signed size
+    """
+    name = path[:-len('.lz4')] if is_compressed(path) else path
+    if name.endswith('.csv'):
+        with open_dump(path, 'rt') as f:
+            for row in csv.DictReader(f):
+                yield _position_record(row['user_address'], row)
+        return
+
+    with plain_file(path) as plain_path:
+        yield from _iter_json_positions(plain_path)
+
+
+def _iter_json_positions(path: str) -> Iterator[Dict]:
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            layout = split_array(buf, max(1, len(buf) // SPAN_BYTES))
+            if layout is None:
+                # Compact JSON has no cheap item boundaries; parse it whole
+                batches = [json.loads(bytes(buf)).get('users', [])]
+            else:
+                batches = (_parse_span(buf, span) for span in layout[2])
+
+            for users in batches:
+                for user in users:
+                    for position in user.get('positions', []):
+                        yield _position_record(user['address'], position)
+        finally:
+            buf.close()
+
+
+class ExternalSorter:
+    """
+    Sort records by (address, market_type, coin) in bounded memory
+
+    Records are buffered up to run_size, sorted and spilled to temporary
+    NDJSON run files, then streamed back through a k-way heap merge.
+    """
+
+    def __init__(self, run_size: int = 200_000, temp_dir: Optional[str] = None):
+        """
+        Args:
+            run_size: Records held in memory per sorted run
+            temp_dir: Directory for run files (default: system temp)
+        """
+        self.run_size = run_size
+        self.temp_dir = temp_dir
+        self.marks = defaultdict(lambda: [0.0, 0.0])
+        self._buffer: List[Dict] = []
+        self._runs = []
+
+    def extend(self, records: Iterable[Dict]) -> 'ExternalSorter':
+        """Consume records, spilling a sorted run every run_size records"""
+        for record in records:
+            mark = self.marks[record['coin']]
+            mark[0] += abs(record['position_value'])
+            mark[1] += abs(record['size'])
+            self._buffer.append(record)
+            if len(self._buffer) >= self.run_size:
+                self._spill()
+        return self
+
+    def sorted(self) -> Iterator[Dict]:
+        """Yield every consumed record in key order, then drop spilled runs"""
+        self._buffer.sort(key=_sort_key)
+        if not self._runs:
+            yield from self._buffer
+            self._buffer = []
+            return
+
+        self._spill()
+        try:
+            yield from heapq.merge(*(self._read_run(f) for f in self._runs), key=_sort_key)
+        finally:
+            for f in self._runs:
+                f.close()
+            self._runs = []
+
+    def _spill(self):
+        self._buffer.sort(key=_sort_key)
+        f = tempfile.TemporaryFile(mode='w+', dir=self.temp_dir)
+        for record in self._buffer:
+            f.write(json.dumps(record) + '\n')
+        f.seek(0)
+        self._runs.append(f)
+        self._buffer = []
+
+    @staticmethod
+    def _read_run(f) -> Iterator[Dict]:
+        for line in f:
+            yield json.loads(line)
+
+    def mark_prices(self) -> Dict[str, float]:
+        """Value-weighted mark per coin (total value / total size)"""
+        return {coin: value / size for coin, (value, size) in self.marks.items() if size}
+
+
+def _crossed(old: Dict, mark: Optional[float]) -> bool:
+    """Whether the new mark is through the old position's liquidation price"""
+    liq = old['liquidation_price']
+    if mark is None or liq is None:
+        return old['risk_level'] == 'CRITICAL'
+    return mark <= liq if old['size'] > 0 else mark >= liq
+
+
+def _event(kind: str, old: Optional[Dict], new: Optional[Dict], mark: Optional[float]) -> Dict:
+    base = new or old
+    old_size = old['size'] if old else 0.0
+    new_size = new['size'] if new else 0.0
+    old_value = old['position_value'] if old else 0.0
+    new_value = new['position_value'] if new else 0.0
+    return {
+        'type': kind,
+        'address': base['address'],
+        'market_type': base['market_type'],
+        'coin': base['coin'],
+        'old_direction': old['direction'] if old else None,
+        'new_direction': new['direction'] if new else None,
+        'old_size': old_size,
+        'new_size': new_size,
+        'size_change': new_size - old_size,
+        'old_value': old_value,
+        'new_value': new_value,
+        'value_change': new_value - old_value,
+        'old_risk_level': old['risk_level'] if old else None,
+        'new_risk_level': new['risk_level'] if new else None,
+        'old_liquidation_price': old['liquidation_price'] if old else None,
+        'mark_price': mark
+    }
+
+
+def diff_positions(old: Optional[Dict], new: Optional[Dict], marks: Dict[str, float]) -> List[Dict]:
+    """
+    Change events for one (address, market, coin) key
+
+    Args:
+        old: Record in the earlier snapshot (None if absent)
+        new: Record in the later snapshot (None if absent)
+        marks: Later snapshot's mark price per coin
+
+    Returns:
+        List of events (empty if nothing changed)
+    """
+    mark = marks.get((new or old)['coin'])
+    if old is None:
+        return [_event('opened', None, new, mark)]
+    if new is None:
+        kind = 'liquidated_suspected' if _crossed(old, mark) else 'closed'
+        return [_event(kind, old, None, mark)]
+
+    events = []
+    if (old['size'] > 0) != (new['size'] > 0):
+        events.append(_event('flipped', old, new, mark))
+    else:
+        change = abs(new['size']) - abs(old['size'])
+        if abs(change) > SIZE_TOLERANCE * max(abs(old['size']), abs(new['size'])):
+            if change > 0:
+                events.append(_event('increased', old, new, mark))
+            else:
+                events.append(_event('liquidated_suspected' if _crossed(old, mark) else 'reduced', old, new, mark))
+        if old['risk_level'] != new['risk_level']:
+            events.append(_event('risk_tier_changed', old, new, mark))
+    return events
+
+
+def merge_diff(old_sorted: Iterator[Dict], new_sorted: Iterator[Dict], marks: Dict[str, float]) -> Iterator[Dict]:
+    """
+    Walk two key-sorted position streams in one linear merge
+
+    Duplicate keys within a snapshot (one user holding the same coin twice
+    in a market) are netted before comparison.
+    """
+    old_iter = _netted(old_sorted)
+    new_iter = _netted(new_sorted)
+    old = next(old_iter, None)
+    new = next(new_iter, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and _sort_key(old) < _sort_key(new)):
+            yield from diff_positions(old, None, marks)
+            old = next(old_iter, None)
+        elif old is None or _sort_key(new) < _sort_key(old):
+            yield from diff_positions(None, new, marks)
+            new = next(new_iter, None)
+        else:
+            yield from diff_positions(old, new, marks)
+            old = next(old_iter, None)
+            new = next(new_iter, None)
+
+
+def _netted(records: Iterator[Dict]) -> Iterator[Dict]:
+    current = None
+    for record in records:
+        if current is not None and _sort_key(record) == _sort_key(current):
+            current = dict(current)
+            current['size'] += record['size']
+            current['position_value'] += record['position_value']
+            current['direction'] = 'LONG' if current['size'] > 0 else 'SHORT'
+            continue
+        if current is not None:
+            yield current
+        current = record
+    if current is not None:
+        yield current
+
+
+class CoinFlows:
+    """
+    Per-coin net-flow rollup over a stream of change events
+
+    Flows value size changes at the later snapshot's mark, so they measure
+    trading (opens, adds, cuts) rather than price moves on held positions.
+    """
+
+    def __init__(self):
+        self.coins = defaultdict(lambda: defaultdict(float))
+
+    def add(self, event: Dict):
+        flows = self.coins[event['coin']]
+        flows[event['type']] += 1
+        if event['type'] == 'risk_tier_changed':
+            return
+
+        price = event['mark_price']
+        if price is None:
+            size = abs(event['old_size']) or abs(event['new_size'])
+            price = abs(event['old_value'] or event['new_value']) / size if size else 0.0
+
+        old_size, new_size = event['old_size'], event['new_size']
+        long_change = max(new_size, 0.0) - max(old_size, 0.0)
+        short_change = min(old_size, 0.0) - min(new_size, 0.0)
+        flows['net_size_change'] += event['size_change']
+        flows['net_notional_flow'] += event['size_change'] * price
+        flows['long_notional_flow'] += long_change * price
+        flows['short_notional_flow'] += short_change * price
+
+    def to_dict(self) -> Dict[str, Dict]:
+        result = {}
+        for coin, flows in sorted(self.coins.items()):
+            result[coin] = {
+                **{kind: int(flows.get(kind, 0)) for kind in EVENT_TYPES},
+                'net_size_change': flows['net_size_change'],
+                'net_notional_flow': round(flows['net_notional_flow'], 2),
+                'long_notional_flow': round(flows['long_notional_flow'], 2),
+                'short_notional_flow': round(flows['short_notional_flow'], 2)
+            }
+        return result
+
+
+class SnapshotDiff:
+    """Diff two snapshot files into change events and per-coin flows"""
+
+    def __init__(self, run_size: int = 200_000, temp_dir: Optional[str] = None):
+        """
+        Args:
+            run_size: Records per in-memory sorted run
+            temp_dir: Directory for spilled runs (default: system temp)
+        """
+        self.run_size = run_size
+        self.temp_dir = temp_dir
+
+    def events(self, old_path: str, new_path: str) -> Iterator[Dict]:
+        """
+        Stream change events between two snapshots
+
+        Both snapshots are consumed into external sorters first, so the
+        later snapshot's per-coin marks are known before any event is
+        emitted.
+        """
+        new_sorter = ExternalSorter(self.run_size, self.temp_dir).extend(iter_snapshot_positions(new_path))
+        old_sorter = ExternalSorter(self.run_size, self.temp_dir).extend(iter_snapshot_positions(old_path))
+        yield from merge_diff(old_sorter.sorted(), new_sorter.sorted(), new_sorter.mark_prices())
+
+    def run(self, old_path: str, new_path: str, output_path: str, output_format: str = 'ndjson') -> Dict:
+        """
+        Write events to output_path and return counts and per-coin flows
+
+        Args:
+            old_path: Earlier snapshot file
+            new_path: Later snapshot file
+            output_path: Events file (.ndjson, or .parquet for columnar)
+            output_format: 'ndjson' or 'parquet'
+
+        Returns:
+            Dict with 'counts' per event type and 'coin_flows'
+        """
+        flows = CoinFlows()
+        counts = defaultdict(int)
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+        with EventWriter(output_path, output_format) as write:
+            for event in self.events(old_path, new_path):
+                counts[event['type']] += 1
+                flows.add(event)
+                write(event)
+
+        return {
+            'counts': {kind: counts.get(kind, 0) for kind in EVENT_TYPES},
+            'coin_flows': flows.to_dict()
+        }
+
+
+class EventWriter:
+    """Context manager yielding a write(event) callable for NDJSON or Parquet"""
+
+    BATCH = 50_000
+
+    def __init__(self, path: str, output_format: str = 'ndjson'):
+        if output_format not in ('ndjson', 'parquet'):
+            raise ValueError(f"Unknown output format '{output_format}'")
+        self.path = path
+        self.format = output_format
+        self._batch: List[Dict] = []
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        if self.format == 'ndjson':
+            self._file = open(self.path, 'w')
+            return lambda event: self._file.write(json.dumps(event) + '\n')
+        self._writer = pq.ParquetWriter(self.path, EVENT_SCHEMA, compression='zstd')
+        return self._write_parquet
+
+    def _write_parquet(self, event: Dict):
+        self._batch.append(event)
+        if len(self._batch) >= self.BATCH:
+            self._flush()
+
+    def _flush(self):
+        if self._batch:
+            self._writer.write_table(pa.Table.from_pylist(self._batch, schema=EVENT_SCHEMA))
+            self._batch = []
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            self._file.close()
+        else:
+            self._flush()
+            self._writer.close()
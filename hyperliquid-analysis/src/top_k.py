@@ -0,0 +1,96 @@
+"""
+Top-K Selection
+Bounded-heap top-N tracking for report generators
+"""
+import heapq
+from itertools import count
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class TopK:
+    """Keep the k best items by key in a bounded heap"""
+
+    def __init__(
+        self,
+        k: Optional[int],
+        key: Callable[[Any], float] = lambda x: x,
+        smallest: bool = False
+    ):
+        """
+        Args:
+            k: Number of items to keep (None keeps everything, sorted at the end;
+                0 keeps nothing)
+            key: Ranking key
+            smallest: Keep the k smallest keys instead of the largest
+        """
+        self.k = k
+        self.key = key
+        self.smallest = smallest
+        self._heap = []
+        self._seq = count()
+
+    def _entry(self, item: Any):
+        # The heap root is the entry evicted next: the worst key and, among
+        # equal keys, the latest arrival (matching a stable sort)
+        value = self.key(item)
+        return (-value if self.smallest else value, -next(self._seq), item)
+
+    def push(self, item: Any):
+        """Offer one item"""
+        entry = self._entry(item)
+        if self.k is None or len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif self._heap and entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def extend(self, items: Iterable[Any]) -> 'TopK':
+        """Offer every item from an iterable (may be a generator)"""
+        for item in items:
+            self.push(item)
+        return self
+
+    def merge(self, other: 'TopK') -> 'TopK':
+        """Fold in another TopK built over a different shard or chunk"""
+        for item in other.results():
+            self.push(item)
+        return self
+
+    def results(self) -> List[Any]:
+        """Kept items, best first"""
+        return [entry[2] for entry in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+class MultiTopK:
+    """Several top-K rankings maintained in a single pass over the data"""
+
+    def __init__(self, rankings: Dict[str, Dict]):
+        """
+        Args:
+            rankings: Name -> {'k', 'key', 'smallest' (optional),
+                'where' (optional predicate an item must pass)}
+        """
+        self.rankings = {
+            name: (TopK(spec['k'], spec['key'], spec.get('smallest', False)), spec.get('where'))
+            for name, spec in rankings.items()
+        }
+
+    def push(self, item: Any):
+        for top, where in self.rankings.values():
+            if where is None or where(item):
+                top.push(item)
+
+    def extend(self, items: Iterable[Any]) -> 'MultiTopK':
+        for item in items:
+            self.push(item)
+        return self
+
+    def merge(self, other: 'MultiTopK') -> 'MultiTopK':
+        for name, (top, _) in self.rankings.items():
+            top.merge(other.rankings[name][0])
+        return self
+
+    def results(self) -> Dict[str, List[Any]]:
+        return {name: top.results() for name, (top, _) in self.rankings.items()}
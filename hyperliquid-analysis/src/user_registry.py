@@ -0,0 +1,131 @@
+"""
+User Registry
+Persistent per-builder lifetime fill stats, extended one finished day at a time
+"""
+import os
+import sys
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .csv_scraper import DAY_ERROR, DAY_OK, UserStatsTable
+from .dump_io import atomic_open
+from .fill_cache import FillCache
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import config
+
+
+class UserRegistry:
+    """
+    Cumulative UserStatsTable of one builder plus a high-water mark
+
+    Stored as <root>/<builder>.npz: the table's columns and the last fill
+    day ingested. It is a CSVScraper consumer: days after the mark are
+    merged as they stream in, and only finished (UTC) days are taken, so a
+    day is never counted twice or cut short. The mark only moves through
+    days the scraper confirmed (parsed, or a 404 in between): it stops at
+    the first failed or unfinished day, and later days are not merged, so
+    the next run fetches them again. It ends at the last day that had a
+    file, so days not published yet are retried too.
+    Columns and mark are written together in one atomic replace.
+    """
+
+    def __init__(self, builder: str, root: Optional[str] = None):
+        """
+        Args:
+            builder: Builder name
+            root: Registry directory (default: config.USER_REGISTRY_DIR under the project)
+        """
+        if root is None:
+            project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            root = os.path.join(project_dir, config.USER_REGISTRY_DIR)
+        self.builder = builder
+        self.path = os.path.join(str(root), f'{builder}.npz')
+        self.reset()
+        if os.path.exists(self.path):
+            self._load()
+
+    def reset(self):
+        """Forget all ingested days (the file is replaced on the next save)"""
+        self.table = UserStatsTable()
+        self.high_water_mark: Optional[str] = None
+        self._last_ingested = ''
+        # Set at the first failed or unfinished day of a fetch
+        self._stopped = False
+        # Chunks of the day being fetched, merged on commit_day
+        self._staged = UserStatsTable()
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def _load(self):
+        with np.load(self.path, allow_pickle=False) as data:
+            self.table.addresses = pd.Index(data['addresses'].tolist(), dtype=object)
+            self.table.total_trades = data['total_trades']
+            self.table.total_volume = data['total_volume']
+            self.table.first_trade_date = data['first_trade_date']
+            self.table.last_trade_date = data['last_trade_date']
+            self.high_water_mark = str(data['high_water_mark']) or None
+
+    def save(self):
+        """Persist columns and move the high-water mark to the last confirmed day"""
+        if self._last_ingested > (self.high_water_mark or ''):
+            self.high_water_mark = self._last_ingested
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with atomic_open(self.path, 'wb') as f:
+            np.savez(
+                f,
+                addresses=np.array(self.table.addresses, dtype=str),
+                total_trades=self.table.total_trades,
+                total_volume=self.table.total_volume,
+                first_trade_date=self.table.first_trade_date,
+                last_trade_date=self.table.last_trade_date,
+                high_water_mark=np.array(self.high_water_mark or '')
+            )
+
+    def consume(self, date_str: str, df: pd.DataFrame):
+        """
+        Stage fills of one day (or a chunk of it), CSVScraper consumer hook
+
+        Staged chunks are merged by commit_day(). Days at or before the
+        high-water mark, and days not over yet, are ignored.
+
+        Args:
+            date_str: Date in YYYYMMDD format
+            df: Fills with 'user' (and 'size'/'px' for volume)
+        """
+        if self.high_water_mark is not None and date_str <= self.high_water_mark:
+            return
+        if self._stopped or not FillCache.is_final(date_str):
+            return
+        self._staged.add_day(date_str, df)
+
+    def commit_day(self, date_str: str):
+        """Merge the day's staged chunks, CSVScraper consumer hook"""
+        self.table.merge(self._staged)
+        self._staged = UserStatsTable()
+
+    def abort_day(self, date_str: str):
+        """Drop the day's staged chunks, CSVScraper consumer hook"""
+        self._staged = UserStatsTable()
+
+    def end_day(self, date_str: str, status: str):
+        """
+        Advance past a fetched day, CSVScraper consumer hook
+
+        Args:
+            date_str: Date in YYYYMMDD format
+            status: csv_scraper DAY_OK, DAY_MISSING or DAY_ERROR
+        """
+        if self.high_water_mark is not None and date_str <= self.high_water_mark:
+            return
+        if status == DAY_ERROR or not FillCache.is_final(date_str):
+            self._stopped = True
+        if not self._stopped and status == DAY_OK:
+            self._last_ingested = max(self._last_ingested, date_str)
+
+    def users(self) -> Dict[str, Dict[str, Any]]:
+        """{address: lifetime user dict} in the CSV scraper's format"""
+        return self.table.to_records()